@@ -0,0 +1,51 @@
+"""
+Authentication overhead per request, with and without the verified-token cache.
+
+Runs Auth.get_current_user for the same access token, the way a polling client presents it.
+The principal is served from the in-process tier in both runs, so the difference is the JWT verification.
+
+    python benchmarks/bench_auth.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.database.models import User
+from src.schemas import UserPrincipal
+from src.services.auth import Auth
+from src.services.cache import LRUCache
+
+
+async def run(auth: Auth, token: str, requests: int, cached: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        if not cached:
+            auth.verified_tokens.clear()
+        await auth.get_current_user(token, db=None)
+    return (time.perf_counter() - start) / requests
+
+
+async def main(requests: int):
+    auth = Auth()
+    auth.verified_tokens = LRUCache(maxsize=1000, ttl=600 * 60)
+    user = User(id=1, username="deadpool", email="deadpool@example.com", avatar=None, confirmed=True)
+    auth.principals.local.set(user.email, UserPrincipal.model_validate(user, from_attributes=True), ttl=3600)
+    token = await auth.create_access_token(data={"sub": user.email})
+
+    await run(auth, token, 100, cached=False)
+    before = await run(auth, token, requests, cached=False)
+    after = await run(auth, token, requests, cached=True)
+    print(f"requests: {requests}")
+    print(f"jwt.decode every request: {before * 1e6:8.2f} us/request")
+    print(f"verified-token cache:     {after * 1e6:8.2f} us/request")
+    print(f"speedup:                  {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    asyncio.run(main(parser.parse_args().requests))
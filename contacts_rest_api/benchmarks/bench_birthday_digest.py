@@ -0,0 +1,71 @@
+"""
+Throughput of the birthday digest job on a generated SQLite database.
+
+Seeds --contacts contacts spread over --users users with random birthdays, then runs
+run_birthday_digest once over the whole table and prints users, contacts and seconds.
+
+    python benchmarks/bench_birthday_digest.py --contacts 1000000 --users 10000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import Base, Contact, User, birth_month_day
+from src.services.birthdays import run_birthday_digest
+
+
+def seed(url: str, contacts: int, users: int):
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        # the job commits while its stream is open, which SQLite only allows in WAL mode
+        connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "password": "x", "confirmed": True}
+            for i in range(1, users + 1)
+        ])
+        batch = []
+        for i in range(1, contacts + 1):
+            birth = date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 50))
+            batch.append({"firstname": f"F{i}", "lastname": f"L{i}", "email": f"c{i}@example.com",
+                          "birth": birth, "birth_md": birth_month_day(birth), "user_id": rng.randint(1, users)})
+            if len(batch) == 50000:
+                connection.execute(insert(Contact.__table__), batch)
+                batch = []
+        if batch:
+            connection.execute(insert(Contact.__table__), batch)
+    engine.dispose()
+
+
+async def main(contacts: int, users: int, days: int):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "digest.db")
+        start = time.perf_counter()
+        seed(f"sqlite:///{path}", contacts, users)
+        print(f"seeded {contacts} contacts for {users} users in {time.perf_counter() - start:.1f}s")
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        stats = await run_birthday_digest(date.today(), days, sessions)
+        print(f"digest: {stats['users']} users, {stats['contacts']} birthdays in {stats['seconds']:.2f}s")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--contacts", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=7)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.contacts, arguments.users, arguments.days))
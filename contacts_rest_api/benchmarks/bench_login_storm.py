@@ -0,0 +1,69 @@
+"""
+Latency of an unrelated endpoint while the worker is busy with logins.
+
+A storm of concurrent password checks, as done by /api/auth/login, runs either inline on the event loop
+(the old behaviour) or on the password worker pool, while GET /openapi.json is probed in a loop.
+Prints p50/p99 of the probe for both modes.
+
+    python benchmarks/bench_login_storm.py --logins 40 --probes 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+from main import app
+from src.services.passwords import hash_password, password_hasher, verify_password
+
+
+async def inline_login(hashed: str):
+    await asyncio.sleep(0)
+    verify_password("secret-password", hashed)
+
+
+async def pooled_login(hashed: str):
+    await password_hasher.verify("secret-password", hashed)
+
+
+async def storm(login, hashed: str, logins: int, probes: int) -> list[float]:
+    latencies = []
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        await client.get("/openapi.json")
+
+        async def probe():
+            for _ in range(probes):
+                start = time.perf_counter()
+                response = await client.get("/openapi.json")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(probe(), *(login(hashed) for _ in range(logins)))
+    return latencies
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+async def main(logins: int, probes: int):
+    hashed = hash_password("secret-password")
+    for name, login in (("inline bcrypt", inline_login), ("worker pool", pooled_login)):
+        latencies = await storm(login, hashed, logins, probes)
+        print(f"{name:14} p50 {percentile(latencies, 50) * 1000:8.2f} ms   "
+              f"p99 {percentile(latencies, 99) * 1000:8.2f} ms   max {max(latencies) * 1000:8.2f} ms")
+    password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--probes", type=int, default=200)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.logins, arguments.probes))
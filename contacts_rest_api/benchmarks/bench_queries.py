@@ -0,0 +1,378 @@
+"""
+Timing and EXPLAIN plans of every repository function, checked against a stored baseline.
+
+Seeds a database (a temporary SQLite file by default, or --database-url, which must be empty), calls every
+function of src/repository with realistic arguments, records the statements each one sends with their query
+plans and the median time over --repeat calls. The run fails, with exit status 1, when a statement scans a table
+the baseline did not scan, or when a function is slower than its baseline by more than --tolerance and --slack-ms.
+
+    python benchmarks/bench_queries.py                      # check against benchmarks/baselines/
+    python benchmarks/bench_queries.py --update-baseline    # accept the current plans and timings
+
+On Postgres the tables are ANALYZEd after seeding; with tiny tables the planner prefers sequential scans,
+so seed enough rows (the defaults) for the plans to mean anything.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from benchmarks.seed_data import FIRST_NAMES, LAST_NAMES, seed
+from src.database.db import async_url
+from src.database.models import Base, Contact, User
+from src.repository import contacts as repository_contacts
+from src.repository import jobs as repository_jobs
+from src.repository import outbox as repository_outbox
+from src.repository import users as repository_users
+from src.schemas import ContactBase, UserBase
+from src.services.contacts_io import ImportRow
+from src.services.profiler import statement_shape
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+SKIPPED = re.compile(r"^\s*(PRAGMA|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|SELECT pg_|SHOW|EXPLAIN)", re.I)
+SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+@dataclass
+class Context:
+    user: User
+    other: User
+    contact_ids: list[int]
+    counter: int = 0
+    # state a setup hands to its case
+    scratch: Contact | User | str | None = None
+
+    def next(self) -> int:
+        self.counter += 1
+        return self.counter
+
+
+@dataclass
+class QueryCase:
+    name: str
+    run: Callable[[AsyncSession, Context], Awaitable]
+    setup: Callable[[AsyncSession, Context], Awaitable] | None = None
+    statements: dict = field(default_factory=dict)
+    timings: list = field(default_factory=list)
+
+
+def contact_body(ctx: Context) -> dict:
+    number = ctx.next()
+    return {"firstname": "Bench", "lastname": "Query", "email": f"bench{number}@queries.example.com",
+            "phone": f"+38050{number:07d}", "birth": date(1990, 5, 17), "additional_details": None}
+
+
+async def stream_all(iterator) -> int:
+    return sum([1 async for _ in iterator])
+
+
+async def create_contact(db: AsyncSession, ctx: Context):
+    ctx.scratch = await repository_contacts.create(contact_body(ctx), db, ctx.user)
+
+
+async def import_rows(db: AsyncSession, ctx: Context):
+    rows = [ImportRow(i, contact_body(ctx), None) for i in range(100)]
+    await repository_contacts.import_contacts(rows, ctx.user, db, chunk_size=50)
+
+
+async def create_user(db: AsyncSession, ctx: Context):
+    number = ctx.next()
+    await repository_users.create_user(
+        UserBase(username=f"bench{number:06d}", email=f"bench{number}@users.example.com", password="secret"), db)
+
+
+async def enqueue_message(db: AsyncSession, ctx: Context):
+    await repository_outbox.enqueue("email_template.html", "Bench", ctx.other.email, {"number": ctx.next()}, db)
+    await db.commit()
+
+
+async def get_user(db: AsyncSession, ctx: Context) -> User:
+    return await repository_users.get_user_by_email(ctx.user.email, db)
+
+
+def build_cases() -> list[QueryCase]:
+    today = date.today()
+    week = today + timedelta(days=7)
+    # a window that wraps over the new year takes the other branch of birthday_window
+    new_year = date(today.year, 12, 28)
+    first_name, last_name = FIRST_NAMES[0], LAST_NAMES[0]
+
+    async def remove_setup(db, ctx):
+        ctx.scratch = await repository_contacts.create(contact_body(ctx), db, ctx.user)
+
+    async def load_other(db, ctx):
+        # the user functions change a user of the caller's session
+        ctx.scratch = await db.get(User, ctx.other.id)
+
+    async def update_run(db, ctx):
+        body = ContactBase(**contact_body(ctx))
+        await repository_contacts.update(ctx.contact_ids[0], body, ctx.user.id, db)
+
+    async def caught_up(db, ctx):
+        changes = await repository_contacts.get_changes(ctx.user, db, limit=1000, lag=0)
+        ctx.scratch = changes["next_cursor"]
+
+    async def contacts_page_two(db, ctx):
+        _, cursor = await repository_contacts.get_contacts(db, ctx.user, 50, None, "lastname")
+        await repository_contacts.get_contacts(db, ctx.user, 50, cursor, "lastname")
+
+    return [
+        QueryCase("contacts.create", create_contact),
+        QueryCase("contacts.update", update_run),
+        QueryCase("contacts.remove",
+                  lambda db, ctx: repository_contacts.remove(ctx.scratch.id, ctx.user.id, db), setup=remove_setup),
+        QueryCase("contacts.get_contacts", lambda db, ctx: repository_contacts.get_contacts(db, ctx.user, 50)),
+        QueryCase("contacts.get_contacts.lastname_cursor", contacts_page_two),
+        QueryCase("contacts.stream_contacts",
+                  lambda db, ctx: stream_all(repository_contacts.stream_contacts(ctx.user, db))),
+        QueryCase("contacts.get_contact_by_id",
+                  lambda db, ctx: repository_contacts.get_contact_by_id(ctx.contact_ids[-1], ctx.user.id, db)),
+        QueryCase("contacts.get_contact_version",
+                  lambda db, ctx: repository_contacts.get_contact_version(ctx.contact_ids[-1], ctx.user.id, db)),
+        QueryCase("contacts.get_contacts_version",
+                  lambda db, ctx: repository_contacts.get_contacts_version(ctx.user, db)),
+        QueryCase("contacts.get_contact_by_lastname_and_email",
+                  lambda db, ctx: repository_contacts.get_contact_by_lastname_and_email(
+                      last_name, "nobody@example.com", ctx.user.id, db)),
+        QueryCase("contacts.search_contacts_by_lastname",
+                  lambda db, ctx: repository_contacts.search_contacts_by_lastname(last_name, ctx.user, db)),
+        QueryCase("contacts.search_contacts_by_firstname",
+                  lambda db, ctx: repository_contacts.search_contacts_by_firstname(first_name, ctx.user, db)),
+        QueryCase("contacts.search_contact_by_email",
+                  lambda db, ctx: repository_contacts.search_contact_by_email("nobody@example.com", ctx.user, db)),
+        QueryCase("contacts.get_contacts_by_phone",
+                  lambda db, ctx: repository_contacts.get_contacts_by_phone("050 123 45 67", ctx.user, db)),
+        QueryCase("contacts.get_contacts_by_phone.suffix",
+                  lambda db, ctx: repository_contacts.get_contacts_by_phone("1234567", ctx.user, db)),
+        QueryCase("contacts.get_changes", lambda db, ctx: repository_contacts.get_changes(ctx.user, db, limit=500)),
+        QueryCase("contacts.get_changes.incremental",
+                  lambda db, ctx: repository_contacts.get_changes(ctx.user, db, ctx.scratch), setup=caught_up),
+        QueryCase("contacts.get_birthdays",
+                  lambda db, ctx: repository_contacts.get_birthdays(today, week, db, ctx.user)),
+        QueryCase("contacts.get_birthdays.new_year",
+                  lambda db, ctx: repository_contacts.get_birthdays(new_year, new_year + timedelta(days=7), db,
+                                                                    ctx.user)),
+        QueryCase("contacts.stream_birthdays_by_user",
+                  lambda db, ctx: stream_all(repository_contacts.stream_birthdays_by_user(today, week, db))),
+        QueryCase("contacts.search_contacts",
+                  lambda db, ctx: repository_contacts.search_contacts(last_name[:4], ctx.user, db)),
+        QueryCase("contacts.search_contacts.short_term",
+                  lambda db, ctx: repository_contacts.search_contacts(last_name[:2], ctx.user, db)),
+        QueryCase("contacts.import_contacts", import_rows),
+        QueryCase("users.get_user_by_email", get_user),
+        QueryCase("users.create_user", create_user),
+        QueryCase("users.update_token",
+                  lambda db, ctx: repository_users.update_token(ctx.scratch, f"token-{ctx.next()}", db),
+                  setup=load_other),
+        QueryCase("users.update_password",
+                  lambda db, ctx: repository_users.update_password(ctx.scratch, f"hash-{ctx.next()}", db),
+                  setup=load_other),
+        QueryCase("users.confirmed_email", lambda db, ctx: repository_users.confirmed_email(ctx.other.email, db)),
+        QueryCase("users.update_avatar",
+                  lambda db, ctx: repository_users.update_avatar(ctx.other.email, f"/avatars/{ctx.next()}.png", db)),
+        QueryCase("outbox.enqueue", enqueue_message),
+        QueryCase("outbox.claim_batch",
+                  lambda db, ctx: repository_outbox.claim_batch(50, datetime.utcnow(), db)),
+        QueryCase("outbox.count_pending", lambda db, ctx: repository_outbox.count_pending(db)),
+        QueryCase("jobs.get_checkpoint",
+                  lambda db, ctx: repository_jobs.get_checkpoint("bench", today, db)),
+    ]
+
+
+def sqlite_seq_scans(plan: list[str]) -> list[str]:
+    scans = []
+    for detail in plan:
+        match = SQLITE_SCAN.match(detail)
+        # "SCAN 50 CONSTANT ROWS" of a multi-row VALUES and "SCAN <fts> VIRTUAL TABLE" are not table scans
+        if match and match.group(1) in Base.metadata.tables and "USING" not in detail and "VIRTUAL" not in detail:
+            scans.append(match.group(1))
+    return scans
+
+
+def postgres_seq_scans(node: dict) -> list[str]:
+    scans = [node["Relation Name"]] if node.get("Node Type") == "Seq Scan" else []
+    for child in node.get("Plans", []):
+        scans.extend(postgres_seq_scans(child))
+    return scans
+
+
+async def explain(engine: AsyncEngine, statement: str, parameters) -> tuple[list[str], list[str]]:
+    """
+    The explain function returns the query plan of a statement, as readable lines, and the tables it scans
+    sequentially. The statement is only planned, never executed.
+
+    :param engine: AsyncEngine: The engine the statement was captured on
+    :param statement: str: The SQL as sent to the driver
+    :param parameters: The parameters sent with it
+    :return: The plan lines and the sequentially scanned tables
+    :doc-author: Trelent
+    """
+    if isinstance(parameters, list):
+        parameters = parameters[0] if parameters else ()
+    async with engine.connect() as connection:
+        if engine.dialect.name == "sqlite":
+            rows = (await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)).all()
+            plan = [row[-1] for row in rows]
+            return plan, sqlite_seq_scans(plan)
+        if engine.dialect.name == "postgresql":
+            row = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar()
+            root = (json.loads(row) if isinstance(row, str) else row)[0]["Plan"]
+            plan = []
+
+            def walk(node, depth=0):
+                relation = f" on {node['Relation Name']}" if "Relation Name" in node else ""
+                index = f" using {node['Index Name']}" if "Index Name" in node else ""
+                plan.append(f"{'  ' * depth}{node['Node Type']}{relation}{index}")
+                for child in node.get("Plans", []):
+                    walk(child, depth + 1)
+
+            walk(root)
+            return plan, postgres_seq_scans(root)
+    return [], []
+
+
+async def run_cases(engine: AsyncEngine, cases: list[QueryCase], repeat: int) -> dict:
+    """
+    The run_cases function times every case and collects the plans of the statements it sent.
+
+    :param engine: AsyncEngine: Engine of the seeded database
+    :param cases: list[QueryCase]: The repository calls to measure
+    :param repeat: int: Number of timed calls per case, the median is reported
+    :return: The report per case, in the baseline format
+    :doc-author: Trelent
+    """
+    sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not SKIPPED.match(statement):
+            captured.append((statement, parameters))
+
+    async with sessions() as db:
+        user = await db.get(User, 1)
+        other = await db.get(User, 2)
+        ids = (await db.execute(select(Contact.id).where(Contact.user_id == user.id).order_by(Contact.id))).scalars()
+        ctx = Context(user, other, list(ids))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        for case in cases:
+            for _ in range(repeat):
+                async with sessions() as db:
+                    if case.setup is not None:
+                        await case.setup(db, ctx)
+                    captured.clear()
+                    start = time.perf_counter()
+                    await case.run(db, ctx)
+                    case.timings.append(time.perf_counter() - start)
+                    for statement, parameters in captured:
+                        case.statements.setdefault(statement_shape(statement), (statement, parameters))
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    report = {}
+    for case in cases:
+        statements = []
+        for shape, (statement, parameters) in case.statements.items():
+            plan, scans = await explain(engine, statement, parameters)
+            statements.append({"sql": shape, "plan": plan, "seq_scans": sorted(set(scans))})
+        report[case.name] = {"median_ms": round(statistics.median(case.timings) * 1000, 3), "statements": statements}
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float, slack_ms: float) -> list[str]:
+    """
+    The compare function lists the regressions of the report against the baseline: tables that are now
+    scanned sequentially and were not before, and medians slower than baseline * (1 + tolerance) + slack_ms.
+
+    :param report: dict: The current run
+    :param baseline: dict: The stored baseline
+    :param tolerance: float: Allowed relative slowdown
+    :param slack_ms: float: Allowed absolute slowdown, so sub-millisecond noise never fails the run
+    :return: One message per regression
+    :doc-author: Trelent
+    """
+    failures = []
+    for name, current in report.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        before = {table for statement in previous["statements"] for table in statement["seq_scans"]}
+        for statement in current["statements"]:
+            new = sorted(set(statement["seq_scans"]) - before)
+            if new:
+                failures.append(f"{name}: sequential scan of {', '.join(new)} in {statement['sql'][:120]}\n"
+                                f"    plan: {' | '.join(statement['plan'])}")
+        limit = previous["median_ms"] * (1 + tolerance) + slack_ms
+        if current["median_ms"] > limit:
+            failures.append(f"{name}: median {current['median_ms']:.2f} ms, baseline {previous['median_ms']:.2f} ms")
+    return failures
+
+
+async def main(arguments: argparse.Namespace) -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        url = arguments.database_url or f"sqlite:///{os.path.join(directory, 'queries.db')}"
+        seeded = seed(url, arguments.users, arguments.contacts, arguments.seed)
+        engine = create_async_engine(async_url(url))
+        if engine.dialect.name == "postgresql":
+            async with engine.begin() as connection:
+                await connection.execute(text("ANALYZE"))
+        try:
+            report = await run_cases(engine, build_cases(), arguments.repeat)
+        finally:
+            await engine.dispose()
+
+    path = arguments.baseline or os.path.join(BASELINE_DIR, f"queries-{engine.dialect.name}.json")
+    width = max(map(len, report))
+    for name, current in report.items():
+        scans = sorted({table for statement in current["statements"] for table in statement["seq_scans"]})
+        print(f"{name:{width}}  {current['median_ms']:9.3f} ms  {len(current['statements']):2d} statements"
+              f"{'  seq scan: ' + ', '.join(scans) if scans else ''}")
+    print(f"seeded {seeded['users']} users and {seeded['contacts']} contacts in {seeded['seconds']:.1f}s")
+
+    if arguments.update_baseline:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+        print(f"baseline written to {path}")
+        return 0
+    if not os.path.exists(path):
+        print(f"no baseline at {path}, run with --update-baseline first")
+        return 1
+    with open(path) as file:
+        baseline = json.load(file)
+    missing = sorted(set(report) - set(baseline))
+    if missing:
+        print(f"not in the baseline yet: {', '.join(missing)}")
+    failures = compare(report, baseline, arguments.tolerance, arguments.slack_ms)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", help="synchronous URL of an empty database, a temporary SQLite by default")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--contacts", type=int, default=500, help="contacts per user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--baseline", help="baseline file, benchmarks/baselines/queries-<dialect>.json by default")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="allowed relative slowdown, 1.0 = twice as slow")
+    parser.add_argument("--slack-ms", type=float, default=2.0, help="allowed absolute slowdown in ms")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,268 @@
+"""
+End-to-end load test of the API on a synthetic database, reported as JSON.
+
+Seeds a temporary SQLite database (see seed_data.py), serves the app with uvicorn on a local port
+(or in-process over ASGI with --transport asgi) and runs --concurrency virtual users, each logged in as a
+seeded user, through a weighted mix of scenarios. Redis, SMTP and avatar storage are in-process stand-ins,
+so nothing leaves the box. Prints p50/p95/p99 latency and throughput per scenario.
+
+    python benchmarks/load_harness.py --users 200 --contacts 100 --concurrency 20 --requests 5000 \
+        --mix list=5,search=3,birthdays=1,create=1,login=1 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+import uvicorn
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from main import app
+from src.conf.config import settings
+from src.database.db import get_db
+from src.services.avatars import avatar_service
+from src.services.cache import contacts_cache, principal_cache
+from src.services.email import OutboxWorker
+from src.services.passwords import password_hasher
+from src.services.ratelimit import rate_limiter
+from src.services.storage import LocalStorage
+
+from seed_data import SEED_PASSWORD, make_contact, search_terms, seed, user_email
+from standins import FakeRedis, SMTPSink
+
+SCENARIOS = ("login", "list", "search", "create", "birthdays", "signup")
+DEFAULT_MIX = "list=5,search=3,birthdays=1,create=1,login=1"
+
+
+class VirtualUser:
+    def __init__(self, number: int, user_id: int, token: str, rng: random.Random):
+        self.number = number
+        self.user_id = user_id
+        self.token = token
+        self.rng = rng
+        self.created = 0
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+async def login(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    return await client.post("/api/auth/login", data={"username": user_email(user.user_id), "password": SEED_PASSWORD})
+
+
+async def list_contacts(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    order_by = user.rng.choice(["id", "lastname"])
+    return await client.get("/api/contacts/", params={"limit": 50, "order_by": order_by}, headers=user.headers)
+
+
+async def search(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    return await client.get("/api/contacts/search", params={"q": user.rng.choice(search_terms())},
+                            headers=user.headers)
+
+
+async def create(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    user.created += 1
+    contact = make_contact(user.rng, user.user_id, 0, date.today())
+    body = {key: contact[key] for key in ("firstname", "lastname", "phone", "additional_details")}
+    body["email"] = f"load{user.number}.{user.created}@bench.example.com"
+    body["birth"] = contact["birth"].isoformat()
+    return await client.post("/api/contacts/", json=body, headers=user.headers)
+
+
+async def birthdays(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    return await client.get("/api/contacts/birthdays", params={"days": 7}, headers=user.headers)
+
+
+async def signup(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    user.created += 1
+    name = f"s{user.number}x{user.created}"[:16].ljust(5, "0")
+    return await client.post("/api/auth/signup", json={"username": name, "email": f"{name}@signup.example.com",
+                                                       "password": "secret1"})
+
+
+RUNNERS = {"login": login, "list": list_contacts, "search": search, "create": create, "birthdays": birthdays,
+           "signup": signup}
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in RUNNERS:
+            raise ValueError(f"unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(values: list[float], q: float) -> float:
+    # nearest rank
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+def summarize(latencies: list[float], statuses: Counter, elapsed: float) -> dict:
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    summary = {"count": len(latencies), "errors": errors, "rps": round(len(latencies) / elapsed, 2),
+               "statuses": {str(status): count for status, count in sorted(statuses.items())}}
+    if latencies:
+        summary.update({f"p{q}_ms": round(percentile(latencies, q) * 1000, 3) for q in (50, 95, 99)})
+        summary["max_ms"] = round(max(latencies) * 1000, 3)
+    return summary
+
+
+async def drive(client: httpx.AsyncClient, users: list[VirtualUser], weights: dict[str, float], requests: int,
+                duration: float | None, warmup: int) -> dict:
+    """
+    The drive function runs the virtual users concurrently until requests are made or duration has passed.
+
+    :param client: httpx.AsyncClient: Client bound to the app
+    :param users: list[VirtualUser]: One logged-in user per concurrent worker
+    :param weights: dict[str, float]: Relative weight of every scenario
+    :param requests: int: Total number of measured requests
+    :param duration: float | None: Stop after this many seconds instead
+    :param warmup: int: Requests per virtual user made before measuring
+    :return: The report per scenario and in total
+    :doc-author: Trelent
+    """
+    names, scenario_weights = list(weights), list(weights.values())
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    remaining = requests
+
+    async def warm(user: VirtualUser):
+        for _ in range(warmup):
+            await RUNNERS[user.rng.choices(names, scenario_weights)[0]](client, user)
+
+    async def worker(user: VirtualUser):
+        nonlocal remaining
+        while (time.perf_counter() < deadline) if duration else remaining > 0:
+            remaining -= 1
+            name = user.rng.choices(names, scenario_weights)[0]
+            begin = time.perf_counter()
+            try:
+                response = await RUNNERS[name](client, user)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 599
+            latencies[name].append(time.perf_counter() - begin)
+            statuses[name][status] += 1
+
+    await asyncio.gather(*(warm(user) for user in users))
+    start = time.perf_counter()
+    deadline = start + (duration or 0)
+    await asyncio.gather(*(worker(user) for user in users))
+    elapsed = time.perf_counter() - start
+
+    report = {name: summarize(latencies[name], statuses[name], elapsed) for name in names}
+    every = [latency for values in latencies.values() for latency in values]
+    total = sum((statuses[name] for name in names), Counter())
+    return {"elapsed_s": round(elapsed, 3), "total": summarize(every, total, elapsed), "scenarios": report}
+
+
+async def serve(transport: str):
+    if transport == "asgi":
+        return None, httpx.AsyncClient(app=app, base_url="http://load", timeout=60)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, lifespan="off", log_level="warning",
+                                           access_log=False))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+    return (server, task), httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits)
+
+
+async def main(arguments: argparse.Namespace):
+    weights = parse_mix(arguments.mix)
+    rng = random.Random(arguments.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "load.db")
+        seeded = seed(f"sqlite:///{path}", arguments.users, arguments.contacts, arguments.seed)
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+        async def override_get_db():
+            async with sessions() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = override_get_db
+        redis = FakeRedis()
+        contacts_cache.client = principal_cache.client = rate_limiter.client = redis
+        settings.contacts_cache_enabled = not arguments.no_cache
+        settings.rate_limit_enabled = arguments.rate_limits
+        settings.profiler_sample_rate = arguments.profile_rate
+        avatar_service.storage = LocalStorage(os.path.join(directory, "avatars"), "/avatars")
+        smtp = SMTPSink()
+        smtp.start()
+        for name, value in {"mail_server": "127.0.0.1", "mail_port": smtp.port, "mail_ssl_tls": False,
+                            "mail_starttls": False, "mail_use_credentials": False, "outbox_poll_interval": 0.2}.items():
+            setattr(settings, name, value)
+        stop = asyncio.Event()
+        outbox = asyncio.create_task(OutboxWorker(session_factory=sessions).run(stop))
+
+        server, client = await serve(arguments.transport)
+        try:
+            users = []
+            for number in range(arguments.concurrency):
+                user_id = rng.randint(1, arguments.users)
+                user = VirtualUser(number, user_id, "", random.Random(rng.random()))
+                response = await login(client, user)
+                response.raise_for_status()
+                user.token = response.json()["access_token"]
+                users.append(user)
+            report = await drive(client, users, weights, arguments.requests, arguments.duration, arguments.warmup)
+        finally:
+            await client.aclose()
+            if server is not None:
+                server[0].should_exit = True
+                await server[1]
+            stop.set()
+            await outbox
+            smtp.stop()
+            password_hasher.shutdown()
+            avatar_service.shutdown()
+            await engine.dispose()
+
+    report["config"] = {
+        "users": arguments.users, "contacts_per_user": arguments.contacts, "seeded_in_s": round(seeded["seconds"], 2),
+        "concurrency": arguments.concurrency, "requests": arguments.requests, "duration": arguments.duration,
+        "warmup": arguments.warmup, "mix": weights, "transport": arguments.transport, "seed": arguments.seed,
+        "contacts_cache": not arguments.no_cache, "rate_limits": arguments.rate_limits,
+        "emails_sent": smtp.messages,
+    }
+    output = json.dumps(report, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--contacts", type=int, default=100, help="contacts per user")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000, help="total measured requests")
+    parser.add_argument("--duration", type=float, default=None, help="run for seconds instead of --requests")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per virtual user")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted scenarios out of {', '.join(SCENARIOS)}")
+    parser.add_argument("--transport", choices=("http", "asgi"), default="http")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-cache", action="store_true", help="disable the contacts cache")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the rate limits on")
+    parser.add_argument("--profile-rate", type=float, default=0.0, help="profiler sample rate")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(parser.parse_args()))
@@ -1,5 +1,5 @@
+import asyncio
 from typing import List
-import redis.asyncio as redis
 import uvicorn
 import time
 from pathlib import Path
@@ -10,15 +10,20 @@ from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from pydantic import EmailStr, BaseModel
 
-from fastapi_limiter import FastAPILimiter
 
-
-from src.database.db import get_db
-from src.routes import contacts, auth, users
+from src.database.db import engine, get_db
+from src.routes import contacts, auth, users, admin, metrics
+from src.conf.config import settings
+from src.services.avatars import AvatarUploadLimit, avatar_service
+from src.services.metrics import IN_PROGRESS, mark_worker_dead, observe_pool, observe_request, route_template
+from src.services.cache import principal_cache
+from src.services.passwords import password_hasher
+from src.services.profiler import finish_profile, start_profile
+from src.services.ratelimit import rate_limiter
 
 class EmailSchema(BaseModel):
     email: EmailStr
@@ -49,6 +54,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(AvatarUploadLimit)
 
 
 @app.post("/send-email")
@@ -82,22 +88,39 @@ async def custom_middleware(request: Request, call_next):
     """
     The custom_middleware function is a middleware function that adds the time it took to process the request
     to the response headers. This can be used for performance monitoring.
+    A sample of the requests, settings.profiler_sample_rate, is profiled: their Server-Timing header also has
+    the query count, database and Redis time, the slowest statement and statements repeated like N+1 loads.
+    Every request is counted in the Prometheus metrics served at /metrics.
     
     :param request: Request: Access the request object
     :param call_next: Call the next middleware in the chain
     :return: A response object
     :doc-author: Trelent
     """
-    start_time = time.time()
-    response = await call_next(request)
-    during = time.time() - start_time
+    start_time = time.perf_counter()
+    profile, token = start_profile()
+    IN_PROGRESS.inc()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        during = time.perf_counter() - start_time
+        IN_PROGRESS.dec()
+        observe_request(request.method, route_template(request.scope), status_code, during)
+        observe_pool(engine.pool)
+        server_timing = finish_profile(profile, token, f"{request.method} {request.url.path}", during)
     response.headers["performance"] = str(during)
+    response.headers["Server-Timing"] = server_timing
     return response
 
 
 templates = Jinja2Templates(directory="templates")
 BASE_DIR = Path(__file__).parent
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
+if settings.avatar_storage == "local":
+    app.mount(settings.avatar_local_url, StaticFiles(directory=settings.avatar_local_dir, check_dir=False),
+              name="avatars")
 
 
 @app.get("/", response_class=HTMLResponse, description="Main Page")
@@ -118,9 +141,9 @@ async def root(request: Request):
 
 
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     try:
-        result = db.execute(text("SELECT 1")).fetchone() # Make request
+        result = (await db.execute(text("SELECT 1"))).fetchone() # Make request
         if result is None:
             raise HTTPException(
                 status_code=500, detail="Database is not configured correctly"
@@ -134,6 +157,8 @@ def healthchecker(db: Session = Depends(get_db)):
 app.include_router(contacts.router, prefix="/api")
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
+app.include_router(admin.router, prefix='/api')
+app.include_router(metrics.router)
 
 
 @app.on_event("startup")
@@ -145,8 +170,26 @@ async def startup():
     :return: A dictionary with the name of the class and an instance
     :doc-author: Trelent
     """
-    r = await redis.Redis(host='localhost', port=6379, db=0, encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(r)
+    app.state.principal_listener = asyncio.create_task(principal_cache.listen())
+    app.state.rate_limit_sync = asyncio.create_task(rate_limiter.run())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function is called when the application stops.
+    It stops listening for principal cache invalidations from the other workers, reports the last
+    rate-limited requests and releases the password hashing and avatar resizing pools.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    app.state.principal_listener.cancel()
+    app.state.rate_limit_sync.cancel()
+    await rate_limiter.sync()
+    password_hasher.shutdown()
+    avatar_service.shutdown()
+    mark_worker_dead()
 
 
 @app.get("/")
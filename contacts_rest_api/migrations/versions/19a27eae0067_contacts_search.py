@@ -0,0 +1,72 @@
+"""contacts_search
+
+Revision ID: 19a27eae0067
+Revises: 222cea86c183
+Create Date: 2026-10-17 11:02:09.544371
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '19a27eae0067'
+down_revision: Union[str, None] = '222cea86c183'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ("firstname", "lastname", "email", "phone", "additional_details")
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        document = " || ' ' || ".join(f"coalesce({name}, '')" for name in COLUMNS)
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(f"ALTER TABLE contacts ADD COLUMN search_document text GENERATED ALWAYS AS ({document}) STORED")
+        op.execute(
+            "ALTER TABLE contacts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple'::regconfig, coalesce(firstname, '') || ' ' || coalesce(lastname, '')), 'A') || "
+            "setweight(to_tsvector('simple'::regconfig, coalesce(email, '') || ' ' || coalesce(phone, '')), 'B') || "
+            "setweight(to_tsvector('simple'::regconfig, coalesce(additional_details, '')), 'C')) STORED"
+        )
+        op.execute("CREATE INDEX ix_contacts_search_vector ON contacts USING gin (search_vector)")
+        op.execute("CREATE INDEX ix_contacts_search_document ON contacts USING gin (search_document gin_trgm_ops)")
+    elif dialect == "sqlite":
+        columns = ", ".join(COLUMNS)
+        new = ", ".join(f"new.{name}" for name in COLUMNS)
+        old = ", ".join(f"old.{name}" for name in COLUMNS)
+        op.execute(
+            f"CREATE VIRTUAL TABLE contacts_fts USING fts5({columns}, "
+            f"content='contacts', content_rowid='id', tokenize='trigram')"
+        )
+        op.execute(
+            f"CREATE TRIGGER contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+            f"INSERT INTO contacts_fts(rowid, {columns}) VALUES (new.id, {new}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+            f"INSERT INTO contacts_fts(contacts_fts, rowid, {columns}) VALUES ('delete', old.id, {old}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+            f"INSERT INTO contacts_fts(contacts_fts, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+            f"INSERT INTO contacts_fts(rowid, {columns}) VALUES (new.id, {new}); END"
+        )
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_contacts_search_document")
+        op.execute("DROP INDEX IF EXISTS ix_contacts_search_vector")
+        op.drop_column('contacts', 'search_vector')
+        op.drop_column('contacts', 'search_document')
+    elif dialect == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS contacts_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS contacts_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS contacts_fts_ai")
+        op.execute("DROP TABLE IF EXISTS contacts_fts")
@@ -1,33 +1,279 @@
-import configparser
-import pathlib
+import bisect
+import threading
+import time
 
 from fastapi import HTTPException, status
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from src.conf.config import settings
 
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_url(url: str) -> str:
+    """
+    The async_url function turns a synchronous database URL into the matching asyncio one.
+        postgresql+psycopg2 becomes postgresql+asyncpg and sqlite becomes sqlite+aiosqlite.
+
+    :param url: str: A synchronous SQLAlchemy database URL
+    :return: The URL with the asyncio driver of its backend
+    :doc-author: Trelent
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No asyncio driver known for {parsed.get_backend_name()}")
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+class PoolStats:
+    """
+    Checkout wait times of the engine pool: totals, the slowest wait, timeouts and a histogram in milliseconds.
+    """
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.buckets = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.buckets[bisect.bisect_left(self.BUCKETS_MS, wait * 1000)] += 1
+
+    def snapshot(self, pool) -> dict:
+        """
+        The snapshot function combines the recorded wait times with the current state of the pool.
+
+        :param self: Represent the instance of the class
+        :param pool: The engine pool, its size and checked-out/overflow counts are read live
+        :return: A dictionary matching the PoolStatsResponse schema
+        :doc-author: Trelent
+        """
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            histogram = {f"le_{bound}ms": count for bound, count in zip(self.BUCKETS_MS, self.buckets)}
+            histogram["inf"] = self.buckets[-1]
+            stats = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": self.wait_total * 1000 / waits if waits else 0.0,
+                "wait_max_ms": self.wait_max * 1000,
+                "wait_histogram": histogram,
+            }
+        stats.update(
+            pool_class=type(pool).__name__,
+            size=pool.size() if hasattr(pool, "size") else None,
+            checked_in=pool.checkedin() if hasattr(pool, "checkedin") else None,
+            checked_out=pool.checkedout() if hasattr(pool, "checkedout") else None,
+            overflow=pool.overflow() if hasattr(pool, "overflow") else None,
+            max_overflow=settings.database_max_overflow,
+            timeout=settings.database_pool_timeout,
+        )
+        return stats
+
+
+pool_stats = PoolStats()
+
+
+class TimedCheckoutMixin:
+    """
+    Records how long each checkout waited for a free connection, including the ones that hit pool_timeout.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, is_async: bool) -> dict:
+    """
+    The engine_options function builds the create_engine keyword arguments from Settings.
+        In-memory SQLite keeps its default single-connection pool, and the statement timeout
+        is only passed to PostgreSQL drivers.
+
+    :param url: str: The database URL the engine is created for
+    :param is_async: bool: Whether the engine is an AsyncEngine
+    :return: A dictionary of create_engine keyword arguments
+    :doc-author: Trelent
+    """
+    parsed = make_url(url)
+    options = {"echo": settings.database_echo}
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return options
+    options.update(
+        poolclass=TimedAsyncQueuePool if is_async else TimedQueuePool,
+        pool_size=settings.database_pool_size,
+        max_overflow=settings.database_max_overflow,
+        pool_timeout=settings.database_pool_timeout,
+        pool_recycle=settings.database_pool_recycle,
+        pool_pre_ping=settings.database_pool_pre_ping,
+    )
+    timeout = settings.database_statement_timeout_ms
+    if timeout and parsed.get_backend_name() == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(timeout)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
 
 URI = settings.sqlalchemy_database_url
+ASYNC_URI = settings.sqlalchemy_async_database_url or async_url(URI)
+
+if settings.database_async:
+    engine = create_async_engine(ASYNC_URI, **engine_options(ASYNC_URI, is_async=True))
+    DBSession = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+else:
+    engine = create_engine(URI, **engine_options(URI, is_async=False))
+    DBSession = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+
+class SyncResultAdapter:
+    """
+    Async iteration over a buffered or streamed synchronous Result, mirroring AsyncResult.
+    """
+
+    def __init__(self, result):
+        self._result = result
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        row = self._result.fetchone()
+        if row is None:
+            raise StopAsyncIteration
+        return row
+
+    async def partitions(self, size: int | None = None):
+        for partition in self._result.partitions(size):
+            yield partition
+
+    def scalars(self):
+        return SyncResultAdapter(self._result.scalars())
+
+
+class AsyncSessionAdapter:
+    """
+    Exposes a synchronous Session through the awaitable AsyncSession API used by the repositories,
+    so the synchronous engine stays selectable with settings.database_async = False.
+    Statements still run on the calling thread and block the event loop.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    def get_bind(self, *args, **kwargs):
+        return self.sync_session.get_bind(*args, **kwargs)
+
+    async def execute(self, statement, params=None, **kwargs):
+        return self.sync_session.execute(statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return self.sync_session.scalar(statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return self.sync_session.scalars(statement, params, **kwargs)
+
+    async def stream(self, statement, params=None, **kwargs):
+        statement = statement.execution_options(stream_results=True)
+        return SyncResultAdapter(self.sync_session.execute(statement, params, **kwargs))
+
+    async def get(self, entity, ident, **kwargs):
+        return self.sync_session.get(entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        self.sync_session.delete(instance)
+
+    async def flush(self, objects=None):
+        self.sync_session.flush(objects)
+
+    async def refresh(self, instance, attribute_names=None):
+        self.sync_session.refresh(instance, attribute_names)
+
+    async def commit(self):
+        self.sync_session.commit()
+
+    async def rollback(self):
+        self.sync_session.rollback()
+
+    async def connection(self, **kwargs):
+        return self.sync_session.connection(**kwargs)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        self.sync_session.close()
+
+
+def new_session():
+    """
+    The new_session function opens a session for code running outside of a request, e.g. background workers.
+
+    :return: An AsyncSession, or a synchronous Session wrapped in AsyncSessionAdapter
+    :doc-author: Trelent
+    """
+    if settings.database_async:
+        return DBSession()
+    return AsyncSessionAdapter(DBSession())
 
-engine = create_engine(URI, echo=True)
-DBSession = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 # Dependency
-def get_db():
+async def get_db():
     """
-    The get_db function is a context manager that will automatically close the database connection when it goes out of scope.
+    The get_db function is a dependency that yields a database session and closes it when the request is done.
     It also handles any exceptions that occur within the with block, rolling back any changes to the database and closing the connection before re-raising them.
-    
-    :return: A context manager, which is a python object that manages a resource
+    With settings.database_async the session is a native AsyncSession, otherwise a synchronous Session wrapped in AsyncSessionAdapter.
+
+    :return: An AsyncSession or an AsyncSessionAdapter
     :doc-author: Trelent
     """
-    db = DBSession()
+    db = new_session()
     try:
         yield db
     except SQLAlchemyError as err:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
     finally:
-        db.close()
+        await db.close()
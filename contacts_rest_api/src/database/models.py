@@ -1,28 +1,134 @@
-from sqlalchemy import Date, Column, Integer, String, DateTime, func, ForeignKey, Boolean
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import Date, Column, Integer, String, DateTime, Text, func, ForeignKey, Boolean, Index, DDL, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import declarative_base, relationship, validates
+from sqlalchemy.sql.functions import now, localtimestamp
+
+from src.services.normalize import phone_keys
 
 Base = declarative_base()
 
 
+@compiles(now, "sqlite")
+def sqlite_now(element, compiler, **kw):
+    # CURRENT_TIMESTAMP has whole seconds, too coarse for ETags and sync cursors that must see every write;
+    # padded to microseconds like the datetimes SQLAlchemy writes, so the stored strings compare correctly
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'NOW')"
+
+
+@compiles(localtimestamp, "sqlite")
+def sqlite_localtimestamp(element, compiler, **kw):
+    # the stored now() is UTC on SQLite, so its naive reading of the clock is the same expression
+    return sqlite_now(element, compiler, **kw)
+
+
+def birth_month_day(birth):
+    """
+    The birth_month_day function packs the month and day of a date into one sortable integer.
+        The 4th of July becomes 704, so a year-agnostic birthday window is a plain integer range.
+    
+    :param birth: date: The date of birth, may be None
+    :return: An integer month * 100 + day, or None
+    :doc-author: Trelent
+    """
+    if birth is None:
+        return None
+    return birth.month * 100 + birth.day
+
+
 class Contact(Base):
     __tablename__ = "contacts"
+    __table_args__ = (
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+        Index("ix_contacts_user_id_lastname_id", "user_id", "lastname", "id"),
+        Index("ix_contacts_user_id_birth_md", "user_id", "birth_md"),
+        Index("ix_contacts_user_id_email", "user_id", "email", unique=True),
+        Index("ix_contacts_user_id_phone_e164", "user_id", "phone_e164"),
+        Index("ix_contacts_user_id_phone_reversed", "user_id", "phone_reversed"),
+        Index("ix_contacts_user_id_updated_at_id", "user_id", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     firstname = Column(String, index=True)
     lastname = Column(String, index=True)
-    email = Column(String, unique=True, index=True)
+    email = Column(String)
     phone = Column(String, index=True)
+    # kept in sync with phone, see phone_keys
+    phone_e164 = Column(String)
+    phone_reversed = Column(String)
     birth = Column(Date)
+    birth_md = Column(Integer)
     additional_details = Column(String, nullable=True)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     user = relationship("User", backref="contacts")
     
+    @validates("birth")
+    def validate_birth(self, key, birth):
+        self.birth_md = birth_month_day(birth)
+        return birth
+
+    @validates("phone")
+    def validate_phone(self, key, phone):
+        self.phone_e164, self.phone_reversed = phone_keys(phone)
+        return phone
+
     def is_owner(self, user_id):
         return self.user_id == user_id
 
 
+SEARCH_COLUMNS = ("firstname", "lastname", "email", "phone", "additional_details")
+
+# SQLite: external-content FTS5 table with the trigram tokenizer, kept in sync by triggers
+_fts_columns = ", ".join(SEARCH_COLUMNS)
+_fts_new = ", ".join(f"new.{name}" for name in SEARCH_COLUMNS)
+_fts_old = ", ".join(f"old.{name}" for name in SEARCH_COLUMNS)
+SQLITE_SEARCH_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5({_fts_columns}, "
+    f"content='contacts', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    f"INSERT INTO contacts_fts(rowid, {_fts_columns}) VALUES (new.id, {_fts_new}); END",
+    f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    f"INSERT INTO contacts_fts(contacts_fts, rowid, {_fts_columns}) VALUES ('delete', old.id, {_fts_old}); END",
+    f"CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    f"INSERT INTO contacts_fts(contacts_fts, rowid, {_fts_columns}) VALUES ('delete', old.id, {_fts_old}); "
+    f"INSERT INTO contacts_fts(rowid, {_fts_columns}) VALUES (new.id, {_fts_new}); END",
+    "INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')",
+)
+
+# Postgres: generated search columns with GIN tsvector and trigram indexes
+_pg_document = " || ' ' || ".join(f"coalesce({name}, '')" for name in SEARCH_COLUMNS)
+POSTGRES_SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"ALTER TABLE contacts ADD COLUMN IF NOT EXISTS search_document text "
+    f"GENERATED ALWAYS AS ({_pg_document}) STORED",
+    "ALTER TABLE contacts ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple'::regconfig, coalesce(firstname, '') || ' ' || coalesce(lastname, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(email, '') || ' ' || coalesce(phone, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(additional_details, '')), 'C')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_contacts_search_vector ON contacts USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_contacts_search_document ON contacts USING gin (search_document gin_trgm_ops)",
+)
+
+for _statement in SQLITE_SEARCH_DDL:
+    event.listen(Contact.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(Contact.__table__, "before_drop", DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect="sqlite"))
+for _statement in POSTGRES_SEARCH_DDL:
+    event.listen(Contact.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
+
+class ContactTombstone(Base):
+    __tablename__ = "contact_tombstones"
+    __table_args__ = (
+        Index("ix_contact_tombstones_user_id_deleted_at_id", "user_id", "deleted_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    contact_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=func.now())
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -32,5 +138,35 @@ class User(Base):
     password = Column(String(255), nullable=False)
     refresh_token = Column(String(255), nullable=True)
     avatar = Column(String(255), nullable=True)
+    avatar_hash = Column(String(64), nullable=True)
     confirmed = Column(Boolean, default=False)
-    
\ No newline at end of file
+    
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    template = Column(String(100), nullable=False)
+    subject = Column(String(255), nullable=False)
+    recipient = Column(String(150), nullable=False)
+    context = Column(Text, nullable=False, default="{}")
+    status = Column(String(10), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=func.now())
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+
+class JobCheckpoint(Base):
+    __tablename__ = "job_checkpoints"
+
+    name = Column(String(50), primary_key=True)
+    run_date = Column(Date, nullable=False)
+    last_key = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    completed = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -1,30 +1,108 @@
-from datetime import date
+import asyncio
+import base64
+import binascii
+import io
+import itertools
+import json
+import re
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator
 
-from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from sqlalchemy import and_, or_, tuple_, case, func, text, literal_column, table, column, insert, select, delete, bindparam
+from sqlalchemy import update as sql_update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import Contact, User
+from src.database.models import Contact, ContactTombstone, User, SEARCH_COLUMNS, birth_month_day
 from src.schemas import ContactBase
+from src.services.contacts_io import EXPORT_FIELDS
+from src.services.normalize import normalize_phone, phone_keys
 
+CURSOR_ORDERS = ("id", "lastname")
+# trigram tokenizer cannot match terms shorter than three characters
+FTS_MIN_TERM = 3
 
-async def create(body: ContactBase, db: Session, user: User):
+contacts_fts = table("contacts_fts", column("rowid"), column("contacts_fts"))
+
+IMPORT_COLUMNS = (
+    "firstname", "lastname", "email", "phone", "phone_e164", "phone_reversed", "birth", "birth_md",
+    "additional_details", "created_at", "updated_at", "user_id",
+)
+# the fields a PUT changes, see update
+UPDATE_FIELDS = ("email", "additional_details", "birth")
+# position of a first sync, before any contact
+SYNC_START = datetime(1970, 1, 1)
+
+
+def encode_cursor(contact: Contact, order_by: str) -> str:
+    """
+    The encode_cursor function builds an opaque pagination cursor pointing right after the given contact.
+    
+    :param contact: Contact: The last contact of the current page
+    :param order_by: str: Sort key the cursor belongs to
+    :return: A url-safe string
+    :doc-author: Trelent
+    """
+    key = [contact.id] if order_by == "id" else [contact.lastname, contact.id]
+    raw = json.dumps({"o": order_by, "k": key}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: str) -> list:
+    """
+    The decode_cursor function unpacks a cursor made by encode_cursor.
+        Raises ValueError when the cursor is malformed or was issued for another sort order.
+    
+    :param cursor: str: The cursor sent by the client
+    :param order_by: str: Sort key of the current request
+    :return: The sort key values of the last contact seen
+    :doc-author: Trelent
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        key = payload["k"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    size = 1 if order_by == "id" else 2
+    if payload.get("o") != order_by or not isinstance(key, list) or len(key) != size:
+        raise ValueError("Invalid cursor")
+    lastname, last_id = key if size == 2 else (None, key[0])
+    # bool passes isinstance(..., int), and a lastname that is not a string would reach the database as is
+    if isinstance(last_id, bool) or not isinstance(last_id, int) or not isinstance(lastname, (str, type(None))):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def _after_cursor(order_by: str, key: list):
+    if order_by == "id":
+        return Contact.id > key[0]
+    lastname, last_id = key
+    if lastname is None:
+        # NULL last names sort at the end of the listing
+        return and_(Contact.lastname.is_(None), Contact.id > last_id)
+    return or_(tuple_(Contact.lastname, Contact.id) > tuple_(lastname, last_id), Contact.lastname.is_(None))
+
+
+async def create(body: ContactBase, db: AsyncSession, user: User):
     """
     The create function creates a new contact in the database.
         
     
     :param body: ContactBase: Create a new contact object
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param user: User: Get the user_id of the current user
     :return: A contact object
     :doc-author: Trelent
     """
     contact = Contact(**body, user_id=user.id)
     db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    await db.commit()
+    await db.refresh(contact)
     return contact
 
 
-async def update(id: int, body: ContactBase, user_id: int, db: Session):
+async def update(id: int, body: ContactBase, user_id: int, db: AsyncSession):
     """
     The update function updates a contact in the database.
         
@@ -32,70 +110,147 @@ async def update(id: int, body: ContactBase, user_id: int, db: Session):
     :param id: int: Get the contact by id
     :param body: ContactBase: Pass the request body to the function
     :param user_id: int: Ensure that the user is only able to delete their own contacts
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A contact object
     :doc-author: Trelent
     """
     contact = await get_contact_by_id(id, user_id, db)
     if contact and contact.user_id == user_id:
-        contact.email = body.email
-        contact.additional_data = body.additional_details
-        contact.birth_date = body.birth
-        db.commit()
+        for name in UPDATE_FIELDS:
+            setattr(contact, name, getattr(body, name))
+        await db.commit()
+        # updated_at is set by the database and must be reloaded before it is serialized
+        await db.refresh(contact)
     return contact
 
 
-async def remove(id: int, user_id: int, db: Session):
+async def remove(id: int, user_id: int, db: AsyncSession):
     """
     The remove function removes a contact from the database.
         
     
     :param id: int: Specify the id of the contact to be removed
     :param user_id: int: Ensure that the user can only delete contacts they have created
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The contact that was deleted
     :doc-author: Trelent
     """
     contact = await get_contact_by_id(id, user_id, db)
     if contact and contact.user_id == user_id:
-        db.delete(contact)
-        db.commit()
+        await db.delete(contact)
+        await _bury([contact.id], user_id, db)
+        await db.commit()
     return contact
 
 
-async def get_contacts(db: Session, user: User):
+async def _bury(ids: list, user_id: int, db: AsyncSession):
+    # tombstones tell syncing clients about deletes, see get_changes
+    await db.execute(insert(ContactTombstone.__table__), [{"user_id": user_id, "contact_id": id} for id in ids])
+
+
+async def get_contacts(db: AsyncSession, user: User, limit: int = 50, cursor: str | None = None, order_by: str = "id"):
     """
-    The get_contacts function returns a list of contacts for the user.
-        
+    The get_contacts function returns one page of the user's contacts using keyset pagination.
+        Rows are ordered by id or by (lastname, id) and the next page starts right after the
+        last row of the previous one, so every page costs the same as the first one.
     
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param user: User: Get the user_id from the user object
-    :return: A list of contacts, so we can use the 'contacts' variable to access it
+    :param limit: int: Maximum number of contacts on the page
+    :param cursor: str | None: Opaque cursor returned with the previous page
+    :param order_by: str: Sort key of the listing, either id or lastname
+    :return: A tuple of the contacts on the page and the cursor of the next page or None
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter_by(user_id=user.id).all()
-    return contacts
+    if order_by not in CURSOR_ORDERS:
+        raise ValueError(f"Unsupported order: {order_by}")
+    stmt = select(Contact).where(Contact.user_id == user.id)
+    if cursor is not None:
+        stmt = stmt.where(_after_cursor(order_by, decode_cursor(cursor, order_by)))
+    if order_by == "lastname":
+        stmt = stmt.order_by(Contact.lastname.asc().nulls_last(), Contact.id.asc())
+    else:
+        stmt = stmt.order_by(Contact.id.asc())
+    contacts = (await db.execute(stmt.limit(limit + 1))).scalars().all()
+    next_cursor = None
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        next_cursor = encode_cursor(contacts[-1], order_by)
+    return contacts, next_cursor
 
 
-async def get_contact_by_id(id: int, user_id: int, db: Session):
+async def stream_contacts(user: User, db: AsyncSession, batch_size: int = 1000):
+    """
+    The stream_contacts function iterates over all of the user's contacts with a server-side cursor.
+        Rows are fetched batch_size at a time as plain column tuples, without building ORM objects,
+        so memory use does not depend on the number of contacts.
+    
+    :param user: User: Get the user_id from the user object
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of rows fetched per round-trip
+    :return: An async iterator of rows ordered by id
+    :doc-author: Trelent
+    """
+    columns = [getattr(Contact, name) for name in EXPORT_FIELDS]
+    stmt = (
+        select(*columns)
+        .where(Contact.user_id == user.id)
+        .order_by(Contact.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(stmt)
+    async for row in result:
+        yield row
+
+
+async def get_contact_by_id(id: int, user_id: int, db: AsyncSession):
     """
     The get_contact_by_id function returns a contact by its id.
         Args:
             id (int): The ID of the contact to be retrieved.
             user_id (int): The ID of the user who owns this contact.
-            db (Session, optional): A database session object for interacting with the database. Defaults to None.&lt;/code&gt;
+            db (AsyncSession, optional): A database session object for interacting with the database. Defaults to None.&lt;/code&gt;
     
     :param id: int: Filter the contact by id
     :param user_id: int: Filter the contacts by user_id
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A contact
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(id=id, user_id=user_id).first()
+    contact = (await db.execute(select(Contact).filter_by(id=id, user_id=user_id))).scalar_one_or_none()
     return contact
 
 
-async def get_contact_by_lastname_and_email(lastname: str, email: str, user_id: int, db: Session):
+async def get_contact_version(id: int, user_id: int, db: AsyncSession) -> datetime | None:
+    """
+    The get_contact_version function returns when a contact last changed, without loading the contact.
+
+    :param id: int: Id of the contact
+    :param user_id: int: Ensure that the user can only see their own contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The updated_at of the contact, or None if it is not found
+    :doc-author: Trelent
+    """
+    stmt = select(Contact.updated_at).where(Contact.id == id, Contact.user_id == user_id)
+    return (await db.execute(stmt)).scalar_one_or_none()
+
+
+async def get_contacts_version(user: User, db: AsyncSession) -> tuple[int, datetime | None]:
+    """
+    The get_contacts_version function returns the number of the user's contacts and when the latest of them changed.
+        Any create, update or delete changes one of the two, so together they version every list of contacts.
+
+    :param user: User: Get the user_id from the user object
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The count and the greatest updated_at
+    :doc-author: Trelent
+    """
+    stmt = select(func.count(), func.max(Contact.updated_at)).where(Contact.user_id == user.id)
+    count, updated_at = (await db.execute(stmt)).one()
+    return count, updated_at
+
+
+async def get_contact_by_lastname_and_email(lastname: str, email: str, user_id: int, db: AsyncSession):
     """
     The get_contact_by_lastname_and_email function returns a contact object from the database based on the lastname and email parameters.
         Args:
@@ -108,92 +263,590 @@ async def get_contact_by_lastname_and_email(lastname: str, email: str, user_id:
     :param lastname: str: Filter the database by lastname
     :param email: str: Filter the database by email
     :param user_id: int: Filter the results by user_id
-    :param db: Session: Connect to the database
+    :param db: AsyncSession: Connect to the database
     :return: The contact with the matching lastname and email
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(lastname=lastname, email=email, user_id=user_id).first()
+    contact = (await db.execute(select(Contact).filter_by(lastname=lastname, email=email, user_id=user_id))).scalars().first()
     return contact
 
 
-async def search_contacts_by_lastname(lastname: str, user: User, db: Session):
+async def search_contacts_by_lastname(lastname: str, user: User, db: AsyncSession):
     """
     The search_contacts_by_lastname function searches for contacts by lastname.
         Args:
             lastname (str): The contact's last name to search for.
             user (User): The user who is searching for the contact.
-            db (Session): A database session object that will be used to query the database with SQLAlchemy ORM methods.
+            db (AsyncSession): A database session object that will be used to query the database with SQLAlchemy ORM methods.
     
     :param lastname: str: Filter the contacts by lastname
     :param user: User: Get the user id from the user object
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter_by(lastname=lastname, user_id=user.id).all()
+    contacts = (await db.execute(select(Contact).filter_by(lastname=lastname, user_id=user.id))).scalars().all()
     return contacts
 
 
-async def search_contacts_by_firstname(firstname: str, user: User, db: Session):
+async def search_contacts_by_firstname(firstname: str, user: User, db: AsyncSession):
     """
     The search_contacts_by_firstname function searches for contacts by firstname.
         Args:
             firstname (str): The contact's first name.
             user (User): The user who owns the contact(s).
-            db (Session): A database session object to query with.
+            db (AsyncSession): A database session object to query with.
         Returns:
             List[Contact]: A list of Contact objects that match the search criteria.
     
     :param firstname: str: Define the firstname of the contact that will be searched for
     :param user: User: Pass the user object to the function
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter_by(firstname=firstname, user_id=user.id).all()
+    contacts = (await db.execute(select(Contact).filter_by(firstname=firstname, user_id=user.id))).scalars().all()
     return contacts
 
 
-async def search_contact_by_email(email: str, user: User, db: Session):
+async def search_contact_by_email(email: str, user: User, db: AsyncSession):
     """
     The search_contact_by_email function searches for a contact by email.
         Args:
             email (str): The email of the contact to search for.
             user (User): The user who owns the contacts to search through.
-            db (Session): A database session object used to query the database with SQLAlchemy ORM methods.
+            db (AsyncSession): A database session object used to query the database with SQLAlchemy ORM methods.
         Returns: 
             Contact: A single Contact object if found, otherwise None.
     
     :param email: str: Search for a contact by email
     :param user: User: Get the user_id from the user object
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The first contact that matches the email and user_id
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter_by(email=email, user_id=user.id).first()
+    contact = (await db.execute(select(Contact).filter_by(email=email, user_id=user.id))).scalars().first()
     return contact
 
 
-async def get_birthdays(start_date: date, end_date: date, db: Session, user: User):
+async def get_contacts_by_phone(number: str, user: User, db: AsyncSession, min_suffix: int = 7, limit: int = 20):
     """
-    The get_birthdays function returns a list of contacts with birthdays between the start and end dates.
+    The get_contacts_by_phone function finds the contacts with a phone number, however either side formatted it.
+        The number is matched in E.164 first; a number without a match, e.g. one without its country or area
+        code, is then matched against the last digits of the contacts' numbers. Both lookups are index range scans.
+
+    :param number: str: The phone number to look up
+    :param user: User: Get the user_id from the user object
+    :param db: AsyncSession: Pass the database session to the function
+    :param min_suffix: int: Fewest digits matched as a suffix, shorter numbers only match exactly
+    :param limit: int: Maximum number of contacts returned
+    :return: A list of contacts ordered by id
+    :doc-author: Trelent
+    """
+    e164 = normalize_phone(number)
+    if e164:
+        stmt = select(Contact).where(Contact.user_id == user.id, Contact.phone_e164 == e164)
+        contacts = (await db.execute(stmt.order_by(Contact.id).limit(limit))).scalars().all()
+        if contacts:
+            return contacts
+    digits = re.sub(r"\D", "", number)
+    if len(digits) < min_suffix:
+        return []
+    # a range instead of LIKE 'prefix%', which neither SQLite nor non-C Postgres collations serve from an index
+    prefix = digits[::-1]
+    stmt = select(Contact).where(Contact.user_id == user.id, Contact.phone_reversed >= prefix,
+                                 Contact.phone_reversed < prefix + ":")
+    return (await db.execute(stmt.order_by(Contact.id).limit(limit))).scalars().all()
+
+
+async def get_birthdays(start_date: date, end_date: date, db: AsyncSession, user: User):
+    """
+    The get_birthdays function returns a list of contacts whose birthday falls between the start and end dates.
+        The year of birth is ignored: the window is compared with the persisted month-day key,
+        wrapping from late December into January, so the query is a range scan on (user_id, birth_md).
         Args:
             start_date (date): The first date to search for birthdays.
             end_date (date): The last date to search for birthdays.
-            db (Session): A database session object used to query the database.
+            db (AsyncSession): A database session object used to query the database.
             user (User): A User object representing the current user making this request, used in filtering results by owner.
     
     :param start_date: date: Get the start date of the birthdays
     :param end_date: date: Specify the end date of the range
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param user: User: Get the user id from the database
-    :return: A list of birthdays in the given date range
+    :return: A list of contacts ordered by their next birthday
     :doc-author: Trelent
     """
-    birthdays = (
-        db.query(Contact)
-        .filter(Contact.birth >= start_date, Contact.birth <= end_date, Contact.user_id == user.id)
-        .all()
-    )
+    condition, order = birthday_window(start_date, end_date)
+    stmt = select(Contact).where(Contact.user_id == user.id, condition).order_by(*order)
+    birthdays = (await db.execute(stmt)).scalars().all()
     return birthdays
 
+
+def birthday_window(start_date: date, end_date: date) -> tuple:
+    """
+    The birthday_window function turns a date window into a condition and an ordering on the month-day key.
+        Windows crossing the new year match both ends of the calendar and sort December before January.
+
+    :param start_date: date: First day of the window
+    :param end_date: date: Last day of the window
+    :return: The where condition and the order by clauses, earliest upcoming birthday first
+    :doc-author: Trelent
+    """
+    start_md = birth_month_day(start_date)
+    end_md = birth_month_day(end_date)
+    if (end_date - start_date).days >= 365:
+        condition = Contact.birth_md.isnot(None)
+    elif start_md <= end_md and start_date.year == end_date.year:
+        return Contact.birth_md.between(start_md, end_md), (Contact.birth_md, Contact.id)
+    else:
+        condition = or_(Contact.birth_md >= start_md, Contact.birth_md <= end_md)
+    upcoming = case((Contact.birth_md >= start_md, 0), else_=1)
+    return condition, (upcoming, Contact.birth_md, Contact.id)
+
+
+async def stream_birthdays_by_user(start_date: date, end_date: date, db: AsyncSession, after_user_id: int = 0,
+                                   batch_size: int = 1000):
+    """
+    The stream_birthdays_by_user function streams the upcoming birthdays of every user in one set-based query.
+        Rows come in user id order, and within a user in upcoming order, so they can be grouped per user
+        without holding more than one user in memory. Users up to after_user_id are skipped, to resume a run.
+
+    :param start_date: date: First day of the window
+    :param end_date: date: Last day of the window
+    :param db: AsyncSession: A session that is not committed while the stream is open
+    :param after_user_id: int: Checkpoint, the last user already processed
+    :param batch_size: int: Number of rows fetched per round trip
+    :return: An async iterator of rows with the user and contact columns
+    :doc-author: Trelent
+    """
+    condition, order = birthday_window(start_date, end_date)
+    stmt = (
+        select(
+            Contact.user_id, User.email.label("user_email"), User.username,
+            Contact.id, Contact.firstname, Contact.lastname, Contact.birth,
+        )
+        .join(User, User.id == Contact.user_id)
+        .where(condition, Contact.user_id > after_user_id)
+        .order_by(Contact.user_id, *order)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(stmt)
+    async for row in result:
+        yield row
+
+
+async def search_contacts(q: str, user: User, db: AsyncSession, limit: int = 20):
+    """
+    The search_contacts function finds the user's contacts matching every term of the query.
+        Terms match as prefixes, substrings or whole tokens of the first name, last name, email,
+        phone and additional details. Postgres ranks by the weighted tsvector and trigram similarity,
+        SQLite by bm25 over the FTS5 table; other databases fall back to a LIKE scan.
+    
+    :param q: str: The search query
+    :param user: User: Get the user_id from the user object
+    :param db: AsyncSession: Pass the database session to the function
+    :param limit: int: Maximum number of contacts returned
+    :return: A list of contacts, best matches first
+    :doc-author: Trelent
+    """
+    terms = q.split()
+    if not terms:
+        return []
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = _search_postgres(q, terms)
+    elif dialect == "sqlite" and all(len(term) >= FTS_MIN_TERM for term in terms):
+        stmt = _search_sqlite(terms)
+    else:
+        stmt = _search_like(terms)
+    return (await db.execute(stmt.where(Contact.user_id == user.id).limit(limit))).scalars().all()
+
+
+def _search_postgres(q: str, terms: list):
+    document = literal_column("contacts.search_document")
+    words = re.findall(r"\w+", q)
+    conditions = [document.icontains(term, autoescape=True) for term in terms]
+    if words:
+        ts_query = func.to_tsquery("simple", " & ".join(f"{word}:*" for word in words))
+        vector = literal_column("contacts.search_vector")
+        matched = or_(vector.op("@@")(ts_query), and_(*conditions))
+        rank = func.ts_rank_cd(vector, ts_query) + func.similarity(document, q)
+    else:
+        matched = and_(*conditions)
+        rank = func.similarity(document, q)
+    return select(Contact).where(matched).order_by(rank.desc(), Contact.id)
+
+
+def _search_sqlite(terms: list):
+    match = " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+    return (
+        select(Contact)
+        .join(contacts_fts, contacts_fts.c.rowid == Contact.id)
+        .where(contacts_fts.c.contacts_fts.op("MATCH")(match))
+        # column weights follow SEARCH_COLUMNS: names first, then email and phone, then details
+        .order_by(text("bm25(contacts_fts, 4.0, 4.0, 2.0, 2.0, 1.0)"), Contact.id)
+    )
+
+
+def _search_like(terms: list):
+    columns = [getattr(Contact, name) for name in SEARCH_COLUMNS]
+    conditions = [or_(*(col.icontains(term, autoescape=True) for col in columns)) for term in terms]
+    first = terms[0]
+    rank = case(
+        (or_(Contact.lastname.istartswith(first, autoescape=True),
+             Contact.firstname.istartswith(first, autoescape=True)), 0),
+        else_=1,
+    )
+    return select(Contact).where(*conditions).order_by(rank, Contact.lastname, Contact.id)
+
+
+async def import_contacts(rows: Iterable, user: User, db: AsyncSession, chunk_size: int = 500, max_errors: int = 1000):
+    """
+    The import_contacts function bulk inserts parsed contact records for the user.
+        Records are read and validated against ContactBase in a worker thread, a chunk at a time, and each chunk
+        is written in one multi-row INSERT (COPY on Postgres) with its own commit, so memory stays flat for any
+        file size and the event loop keeps serving other requests while a large file is parsed.
+        Records whose email the user already has, in the database or earlier in the file, are skipped.
+    
+    :param rows: Iterable: ImportRow tuples produced by src.services.contacts_io.read_contacts
+    :param user: User: Owner of the imported contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param chunk_size: int: Number of records parsed and written per statement
+    :param max_errors: int: Maximum number of per-row errors kept in the report
+    :return: A dict matching ContactImportReport
+    :doc-author: Trelent
+    """
+    report = {"imported": 0, "skipped": 0, "failed": 0, "errors": [], "errors_truncated": False}
+    rows = iter(rows)
+    while parsed := await asyncio.to_thread(_parse_chunk, rows, chunk_size):
+        chunk = []
+        for number, body, error in parsed:
+            if error is not None:
+                _report_error(report, "failed", number, error, max_errors)
+            else:
+                chunk.append((number, body))
+        if chunk:
+            await _import_chunk(chunk, user, db, report, max_errors)
+    return report
+
+
+def _parse_chunk(rows: Iterator, size: int) -> list:
+    # runs in a worker thread, decoding and validating the upload would otherwise hold the event loop
+    parsed = []
+    for row in itertools.islice(rows, size):
+        if row.error is not None:
+            parsed.append((row.number, None, row.error))
+            continue
+        try:
+            parsed.append((row.number, ContactBase.model_validate(row.data), None))
+        except ValidationError as err:
+            detail = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in err.errors())
+            parsed.append((row.number, None, detail))
+    return parsed
+
+
+def _report_error(report: dict, counter: str, number: int, detail: str, max_errors: int):
+    report[counter] += 1
+    if len(report["errors"]) < max_errors:
+        report["errors"].append({"row": number, "detail": detail})
+    else:
+        report["errors_truncated"] = True
+
+
+async def _db_now(db: AsyncSession) -> datetime:
+    # created_at, updated_at and deleted_at are stamped with now() by the database; LOCALTIMESTAMP is the
+    # naive reading of that clock which such a value is stored as, whatever the clocks of the app servers say
+    return (await db.execute(select(func.localtimestamp()))).scalar_one()
+
+
+def _contact_row(body: ContactBase, user_id: int, now: datetime) -> dict:
+    phone_e164, phone_reversed = phone_keys(body.phone)
+    return {
+        "firstname": body.firstname,
+        "lastname": body.lastname,
+        "email": body.email,
+        "phone": body.phone,
+        "phone_e164": phone_e164,
+        "phone_reversed": phone_reversed,
+        "birth": body.birth,
+        "birth_md": birth_month_day(body.birth),
+        "additional_details": body.additional_details,
+        "created_at": now,
+        "updated_at": now,
+        "user_id": user_id,
+    }
+
+
+async def _import_chunk(chunk: list, user: User, db: AsyncSession, report: dict, max_errors: int):
+    emails = {body.email for _, body in chunk}
+    existing = await db.execute(select(Contact.email).where(Contact.user_id == user.id, Contact.email.in_(emails)))
+    seen = set(existing.scalars())
+    now = await _db_now(db)
+    values = []
+    for number, body in chunk:
+        if body.email in seen:
+            _report_error(report, "skipped", number, f"Duplicate email: {body.email}", max_errors)
+            continue
+        seen.add(body.email)
+        values.append(_contact_row(body, user.id, now))
+    if values:
+        connection = await db.connection()
+        driver = connection.dialect.driver
+        if driver == "asyncpg":
+            raw = await connection.get_raw_connection()
+            records = [tuple(value[name] for name in IMPORT_COLUMNS) for value in values]
+            await raw.driver_connection.copy_records_to_table("contacts", records=records, columns=IMPORT_COLUMNS)
+        elif driver == "psycopg2":
+            await db.run_sync(lambda session: _copy_rows(values, session.connection()))
+        else:
+            await db.execute(insert(Contact.__table__).values(values))
+        await db.commit()
+        report["imported"] += len(values)
+
+
+def _copy_field(value) -> str:
+    # unquoted empty field is NULL in COPY csv format, quoted empty field is an empty string
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_rows(values: list, connection):
+    buffer = io.StringIO()
+    for value in values:
+        buffer.write(",".join(_copy_field(value[name]) for name in IMPORT_COLUMNS))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY contacts ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+async def apply_batch(operations: list, user: User, db: AsyncSession, atomic: bool = False) -> dict:
+    """
+    The apply_batch function applies a list of create, update and delete operations in one transaction.
+        Operations are checked in order against the user's contacts as the earlier operations leave them,
+        then written with one DELETE ... WHERE id IN, one executemany UPDATE and one multi-row INSERT,
+        so the cost of a batch does not grow with a round-trip per operation. Operations that cannot be applied
+        are reported with their status and skipped, unless atomic is set, in which case nothing is written.
+
+    :param operations: list: ContactBatchOperation objects
+    :param user: User: Owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param atomic: bool: Write nothing if any operation fails
+    :return: A dict matching ContactBatchResponse
+    :doc-author: Trelent
+    """
+    contacts = Contact.__table__
+    results = [{"index": index, "op": operation.op, "id": operation.id, "status": None, "contact": None,
+                "detail": None} for index, operation in enumerate(operations)]
+    ids = {operation.id for operation in operations if operation.op != "create" and operation.id is not None}
+    emails = {operation.contact.email for operation in operations
+              if operation.op != "delete" and operation.contact is not None}
+    rows = (await db.execute(
+        select(Contact.id, Contact.email).where(Contact.user_id == user.id,
+                                                or_(Contact.id.in_(ids), Contact.email.in_(emails)))
+    )).all()
+    # owner id of every email in play, None for contacts the batch creates; email of every id in play
+    owners = {email: id for id, email in rows}
+    current = {id: email for id, email in rows if id in ids}
+    deleted, updates, creates = [], [], []
+
+    def fail(result: dict, status: int, detail: str):
+        result["status"], result["detail"] = status, detail
+
+    for result, operation in zip(results, operations):
+        body = operation.contact
+        if operation.op == "create":
+            if body is None:
+                fail(result, 422, "contact is required")
+            elif body.email in owners:
+                fail(result, 409, "Email exists!")
+            else:
+                owners[body.email] = None
+                creates.append((result, body))
+                result["status"] = 201
+        elif operation.id is None:
+            fail(result, 422, "id is required")
+        elif operation.id not in current:
+            fail(result, 404, "Not Found")
+        elif operation.op == "delete":
+            del owners[current.pop(operation.id)]
+            deleted.append(operation.id)
+            result["status"] = 204
+        elif body is None:
+            fail(result, 422, "contact is required")
+        elif owners.get(body.email, operation.id) != operation.id:
+            fail(result, 409, "Email exists!")
+        else:
+            del owners[current[operation.id]]
+            owners[body.email] = current[operation.id] = operation.id
+            values = {name: getattr(body, name) for name in UPDATE_FIELDS}
+            updates.append({"contact_id": operation.id, **values, "birth_md": birth_month_day(body.birth)})
+            result["status"] = 200
+
+    if atomic and any(result["status"] >= 400 for result in results):
+        for result in results:
+            if result["status"] < 400:
+                fail(result, 424, "Not applied, another operation failed")
+        return {"applied": False, "results": results}
+
+    if deleted:
+        await db.execute(delete(contacts).where(contacts.c.user_id == user.id, contacts.c.id.in_(deleted)))
+        await _bury(deleted, user.id, db)
+    # an update of a contact deleted later in the batch has nothing left to change
+    updates = [values for values in updates if values["contact_id"] not in deleted]
+    if updates:
+        await db.execute(
+            sql_update(contacts).where(contacts.c.user_id == user.id, contacts.c.id == bindparam("contact_id")),
+            updates,
+        )
+    if creates:
+        now = await _db_now(db)
+        inserted = await db.execute(
+            insert(contacts).returning(contacts.c.id, sort_by_parameter_order=True),
+            [_contact_row(body, user.id, now) for _, body in creates],
+        )
+        for (result, _), id in zip(creates, inserted.scalars()):
+            result["id"] = id
+    changed = {result["id"] for result in results if result["status"] in (200, 201)}
+    if changed:
+        statement = select(Contact).where(Contact.id.in_(changed)).execution_options(populate_existing=True)
+        loaded = {contact.id: contact for contact in (await db.execute(statement)).scalars()}
+        for result in results:
+            if result["status"] in (200, 201):
+                result["contact"] = loaded.get(result["id"])
+    await db.commit()
+    return {"applied": True, "results": results}
+
+
+async def merge_contacts(primary_id: int, duplicate_ids: list, user_id: int, db: AsyncSession):
+    """
+    The merge_contacts function folds duplicates into one contact and deletes them, in one transaction.
+        The primary contact keeps its values; the fields it has empty are taken from the first duplicate
+        that has them, and the distinct additional details of all of them are joined.
+
+    :param primary_id: int: The contact that is kept
+    :param duplicate_ids: list: The contacts merged into it
+    :param user_id: int: Ensure that the user can only merge their own contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The merged contact, or None if any of the contacts is not found
+    :doc-author: Trelent
+    """
+    ids = {primary_id, *duplicate_ids}
+    found = (await db.execute(select(Contact).where(Contact.user_id == user_id, Contact.id.in_(ids)))).scalars()
+    contacts = {contact.id: contact for contact in found}
+    if len(contacts) != len(ids):
+        return None
+    primary = contacts[primary_id]
+    duplicates = [contacts[id] for id in dict.fromkeys(duplicate_ids)]
+    for name in ("firstname", "lastname", "phone", "birth"):
+        if not getattr(primary, name):
+            setattr(primary, name, next((getattr(d, name) for d in duplicates if getattr(d, name)), None))
+    details = [contact.additional_details for contact in [primary, *duplicates] if contact.additional_details]
+    primary.additional_details = "; ".join(dict.fromkeys(details)) or primary.additional_details
+    await db.execute(delete(Contact.__table__).where(Contact.user_id == user_id, Contact.id.in_(duplicate_ids)))
+    await _bury(list(dict.fromkeys(duplicate_ids)), user_id, db)
+    await db.commit()
+    await db.refresh(primary)
+    return primary
+
+
+def encode_sync_cursor(contacts_key: list, tombstones_key: list) -> str:
+    """
+    The encode_sync_cursor function builds the opaque cursor of a delta sync: the (updated_at, id) of the
+        last contact change and the (deleted_at, id) of the last tombstone the client has seen.
+
+    :param contacts_key: list: Position in the contact changes
+    :param tombstones_key: list: Position in the tombstones
+    :return: A url-safe string
+    :doc-author: Trelent
+    """
+    keys = {"c": contacts_key, "t": tombstones_key}
+    raw = json.dumps(keys, separators=(",", ":"), default=datetime.isoformat).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_cursor(cursor: str) -> tuple[list, list]:
+    """
+    The decode_sync_cursor function unpacks a cursor made by encode_sync_cursor.
+        Raises ValueError when the cursor is malformed.
+
+    :param cursor: str: The cursor sent by the client
+    :return: The positions in the contact changes and in the tombstones
+    :doc-author: Trelent
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        keys = [[datetime.fromisoformat(payload[name][0]), payload[name][1]] for name in ("c", "t")]
+    except (binascii.Error, ValueError, TypeError, KeyError, IndexError):
+        raise ValueError("Invalid cursor")
+    if not all(isinstance(key[1], int) for key in keys):
+        raise ValueError("Invalid cursor")
+    return keys[0], keys[1]
+
+
+def _advance(key: list, last: list | None, more: bool, horizon: list) -> list:
+    if last is None:
+        return key
+    if more:
+        return last
+    # a transaction still open may commit rows stamped before the last one seen, so a caught-up
+    # stream stays behind the horizon and the next sync sends the recent changes again
+    return max(key, min(last, horizon))
+
+
+async def get_changes(user: User, db: AsyncSession, cursor: str | None = None, limit: int = 500,
+                      lag: float = 5.0) -> dict:
+    """
+    The get_changes function returns the contacts created, updated or deleted since the cursor of the last sync.
+        Changes are read in (updated_at, id) order from the contacts and in (deleted_at, id) order from
+        the tombstones, both with an index range scan. A client applies deleted before changed, and asks
+        again with next_cursor while has_more is set. Without a cursor every contact is a change.
+        Changes of the last lag seconds are sent again by the next sync, as they may not all be committed yet.
+
+    :param user: User: Owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param cursor: str | None: The next_cursor of the previous sync
+    :param limit: int: Maximum number of changed contacts, and of deleted ids, per response
+    :param lag: float: Seconds a write may take to commit after it is stamped
+    :return: A dict matching ContactChanges
+    :doc-author: Trelent
+    """
+    horizon = [await _db_now(db) - timedelta(seconds=lag), 0]
+    if cursor is None:
+        contacts_key, tombstones_key = [SYNC_START, 0], horizon
+    else:
+        contacts_key, tombstones_key = decode_sync_cursor(cursor)
+
+    stmt = (
+        select(Contact)
+        .where(Contact.user_id == user.id, tuple_(Contact.updated_at, Contact.id) > tuple_(*contacts_key))
+        .order_by(Contact.updated_at, Contact.id)
+        .limit(limit + 1)
+    )
+    changed = (await db.execute(stmt)).scalars().all()
+    stmt = (
+        select(ContactTombstone.deleted_at, ContactTombstone.id, ContactTombstone.contact_id)
+        .where(ContactTombstone.user_id == user.id,
+               tuple_(ContactTombstone.deleted_at, ContactTombstone.id) > tuple_(*tombstones_key))
+        .order_by(ContactTombstone.deleted_at, ContactTombstone.id)
+        .limit(limit + 1)
+    )
+    tombstones = (await db.execute(stmt)).all()
+
+    more_changed, more_deleted = len(changed) > limit, len(tombstones) > limit
+    changed, tombstones = changed[:limit], tombstones[:limit]
+    last = [changed[-1].updated_at, changed[-1].id] if changed else None
+    contacts_key = _advance(contacts_key, last, more_changed, horizon)
+    last = [tombstones[-1].deleted_at, tombstones[-1].id] if tombstones else None
+    tombstones_key = _advance(tombstones_key, last, more_deleted, horizon)
+    return {
+        "changed": changed,
+        "deleted": list(dict.fromkeys(tombstone.contact_id for tombstone in tombstones)),
+        "next_cursor": encode_sync_cursor(contacts_key, tombstones_key),
+        "has_more": more_changed or more_deleted,
+    }
@@ -0,0 +1,28 @@
+from datetime import date
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import JobCheckpoint
+
+
+async def get_checkpoint(name: str, run_date: date, db: AsyncSession) -> JobCheckpoint:
+    """
+    The get_checkpoint function returns the checkpoint of the job for the given run date.
+        A checkpoint left by the run of another date is reset, so every date starts from the first key.
+
+    :param name: str: Name of the job
+    :param run_date: date: Date of the current run
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The checkpoint, not committed if it is new or reset
+    :doc-author: Trelent
+    """
+    checkpoint = await db.get(JobCheckpoint, name)
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(name=name, run_date=run_date, last_key=0, processed=0, completed=False)
+        db.add(checkpoint)
+    elif checkpoint.run_date != run_date:
+        checkpoint.run_date = run_date
+        checkpoint.last_key = 0
+        checkpoint.processed = 0
+        checkpoint.completed = False
+    return checkpoint
@@ -0,0 +1,61 @@
+import json
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import EmailOutbox
+
+
+async def enqueue(template: str, subject: str, recipient: str, context: dict, db: AsyncSession) -> EmailOutbox:
+    """
+    The enqueue function adds a message to the email outbox without committing.
+        The message is committed together with the change that caused it, e.g. the new user,
+        so it is sent if and only if that change is saved.
+
+    :param template: str: Name of the template in src/services/templates
+    :param subject: str: Subject of the message
+    :param recipient: str: Email address of the recipient
+    :param context: dict: JSON serializable template variables
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The outbox row
+    :doc-author: Trelent
+    """
+    message = EmailOutbox(template=template, subject=subject, recipient=recipient, context=json.dumps(context),
+                          status="pending", attempts=0, next_attempt_at=datetime.utcnow())
+    db.add(message)
+    return message
+
+
+async def claim_batch(limit: int, now: datetime, db: AsyncSession) -> List[EmailOutbox]:
+    """
+    The claim_batch function returns the oldest pending messages that are due, locking them for this worker.
+        On PostgreSQL the rows are locked with SKIP LOCKED until the session commits, so several workers
+        can drain the outbox without sending a message twice.
+
+    :param limit: int: Maximum number of messages
+    :param now: datetime: Messages scheduled after this time are left for later
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A list of outbox rows
+    :doc-author: Trelent
+    """
+    statement = (
+        select(EmailOutbox)
+        .filter(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (await db.execute(statement)).scalars().all()
+
+
+async def count_pending(db: AsyncSession) -> int:
+    """
+    The count_pending function returns the number of messages waiting to be sent.
+
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The number of pending messages
+    :doc-author: Trelent
+    """
+    return await db.scalar(select(func.count()).select_from(EmailOutbox).filter(EmailOutbox.status == "pending"))
@@ -1,31 +1,32 @@
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
 from src.schemas import UserBase
 
-async def get_user_by_email(email: str, db: Session) -> User | None:
+async def get_user_by_email(email: str, db: AsyncSession) -> User | None:
     """
     The get_user_by_email function returns a user object from the database based on the email address provided.
         Args:
             email (str): The email address of the user to be retrieved.
-            db (Session): A connection to a database session.
+            db (AsyncSession): A connection to a database session.
     
     :param email: str: Specify the type of parameter that is being passed in
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A user object or none
     :doc-author: Trelent
     """
-    return db.query(User).filter_by(email=email).first()
+    return (await db.execute(select(User).filter_by(email=email))).scalar_one_or_none()
 
 
-async def create_user(body: UserBase, db: Session):
+async def create_user(body: UserBase, db: AsyncSession):
     """
     The create_user function creates a new user in the database.
         
     
     :param body: UserBase: Pass the data from the request body to the function
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The new_user object
     :doc-author: Trelent
     """
@@ -38,59 +39,75 @@ async def create_user(body: UserBase, db: Session):
         avatar=g.get_image(),
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, refresh_token, db: Session):
+async def update_token(user: User, refresh_token, db: AsyncSession):
     """
     The update_token function updates the user's refresh token in the database.
         Args:
             user (User): The User object to update.
             refresh_token (str): The new refresh token for this user.
-            db (Session): A database session to use for updating the User object.
+            db (AsyncSession): A database session to use for updating the User object.
     
     :param user: User: Pass in the user object that is returned from the get_user function
     :param refresh_token: Update the user's refresh token in the database
-    :param db: Session: Update the user's refresh token in the database
+    :param db: AsyncSession: Update the user's refresh token in the database
     :return: Nothing, so it should be a void function
     :doc-author: Trelent
     """
     user.refresh_token = refresh_token
-    db.commit()
+    await db.commit()
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def update_password(user: User, hashed_password: str, db: AsyncSession) -> None:
+    """
+    The update_password function replaces the stored password hash of the user, e.g. with one of the current cost.
+
+    :param user: User: The user whose hash is replaced
+    :param hashed_password: str: The new password hash
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    :doc-author: Trelent
+    """
+    user.password = hashed_password
+    await db.commit()
+
+
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     The confirmed_email function sets the confirmed field of a user to True.
     
     :param email: str: Get the email of the user that is being confirmed
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: None, which is not a valid response type
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
 
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession, avatar_hash: str | None = None) -> User:
     """
     The update_avatar function updates the avatar of a user.
     
     Args:
         email (str): The email address of the user to update.
         url (str): The URL for the new avatar image.
-        db (Session, optional): A database session object to use instead of creating one locally. Defaults to None.  # noQA: E501 line too long, but this is an example!  # noQA: E501 line too long, but this is an example!  # noQA: E501 line too long, but this is an example!  # noQ
+        db (AsyncSession, optional): A database session object to use instead of creating one locally. Defaults to None.  # noQA: E501 line too long, but this is an example!  # noQA: E501 line too long, but this is an example!  # noQA: E501 line too long, but this is an example!  # noQ
     
     :param email: Identify the user
     :param url: str: Pass the url of the avatar to be updated
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
+    :param avatar_hash: str | None: Content hash of the uploaded image, used to skip identical re-uploads
     :return: A user object, which is the same as what the get_user_by_email function returns
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    user.avatar_hash = avatar_hash
+    await db.commit()
     return user
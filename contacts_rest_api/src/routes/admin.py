@@ -0,0 +1,103 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from src.conf.config import settings
+from src.database.db import engine, pool_stats
+from src.database.models import User
+from src.schemas import PoolStatsResponse, CacheStatsResponse, PasswordHasherStatsResponse, RateLimitStatsResponse
+from src.services.auth import auth_service
+from src.services.cache import contacts_cache, principal_cache
+from src.services.passwords import password_hasher
+from src.services.ratelimit import rate_limiter
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+async def get_current_admin(current_user: User = Depends(auth_service.get_current_user)) -> User:
+    """
+    The get_current_admin function is a dependency that only lets through users listed in settings.admin_emails.
+
+    :param current_user: User: Get the current user
+    :return: The current user if they are an administrator
+    :doc-author: Trelent
+    """
+    if current_user.email not in settings.admin_emails:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Operation forbidden")
+    return current_user
+
+
+@router.get("/pool", response_model=PoolStatsResponse)
+async def read_pool_stats(current_user: User = Depends(get_current_admin)):
+    """
+    The read_pool_stats function returns live statistics of the database connection pool of this worker:
+        its size, checked-out and overflow connections, and how long checkouts waited for a free connection.
+
+    :param current_user: User: Get the current administrator
+    :return: The pool statistics
+    :doc-author: Trelent
+    """
+    return pool_stats.snapshot(engine.pool)
+
+
+@router.post("/pool/reset", response_model=PoolStatsResponse)
+async def reset_pool_stats(current_user: User = Depends(get_current_admin)):
+    """
+    The reset_pool_stats function clears the recorded checkout wait times, e.g. before a load test.
+
+    :param current_user: User: Get the current administrator
+    :return: The pool statistics after the reset
+    :doc-author: Trelent
+    """
+    pool_stats.reset()
+    return pool_stats.snapshot(engine.pool)
+
+
+@router.get("/cache", response_model=CacheStatsResponse)
+async def read_cache_stats(current_user: User = Depends(get_current_admin)):
+    """
+    The read_cache_stats function returns the hit, miss and error counters of the contacts cache of this worker,
+        along with the tier counters of the principal cache.
+
+    :param current_user: User: Get the current administrator
+    :return: The cache statistics
+    :doc-author: Trelent
+    """
+    return {**contacts_cache.stats(), "principals": principal_cache.stats()}
+
+
+@router.post("/cache/reset", response_model=CacheStatsResponse)
+async def reset_cache_stats(current_user: User = Depends(get_current_admin)):
+    """
+    The reset_cache_stats function clears the counters of the contacts cache.
+
+    :param current_user: User: Get the current administrator
+    :return: The cache statistics after the reset
+    :doc-author: Trelent
+    """
+    contacts_cache.reset_stats()
+    return contacts_cache.stats()
+
+
+@router.get("/passwords", response_model=PasswordHasherStatsResponse)
+async def read_password_hasher_stats(current_user: User = Depends(get_current_admin)):
+    """
+    The read_password_hasher_stats function returns the load of the password hashing pool of this worker:
+        calls running and waiting for a worker, completed calls and calls rejected because the queue was full.
+
+    :param current_user: User: Get the current administrator
+    :return: The password hashing pool statistics
+    :doc-author: Trelent
+    """
+    return password_hasher.stats()
+
+
+@router.get("/ratelimits", response_model=RateLimitStatsResponse)
+async def read_rate_limit_stats(current_user: User = Depends(get_current_admin)):
+    """
+    The read_rate_limit_stats function returns the allowed and rejected request counters per route of this worker,
+        and whether it is enforcing local limits only because Redis is unreachable.
+
+    :param current_user: User: Get the current administrator
+    :return: The rate limiter statistics
+    :doc-author: Trelent
+    """
+    return rate_limiter.stats()
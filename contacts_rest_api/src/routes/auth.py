@@ -1,9 +1,9 @@
 from jose import jwt
 from jose.exceptions import JWTError
 from typing import List
-from fastapi import Depends, HTTPException, status, APIRouter, Security, BackgroundTasks, Request
+from fastapi import Depends, HTTPException, status, APIRouter, Security, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 from src.database.db import get_db
@@ -11,42 +11,44 @@ from src.schemas import UserBase, UserResponse, TokenModel, RequestEmail
 from src.repository import users as repository_users
 from src.services.auth import auth_service
 from src.services.email import send_email
+from src.services.ratelimit import RateLimit
 
 
 router = APIRouter(prefix="/auth", tags=['auth'])
 security = HTTPBearer()
 
 
-@router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserBase, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+@router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(RateLimit("auth:signup"))])
+async def signup(body: UserBase, request: Request, db: AsyncSession = Depends(get_db)):
     """
     The signup function creates a new user in the database.
         It takes an email and password as input, hashes the password, and stores it in the database.
-        The function also sends an email to confirm that this is a valid account.
+        The function also queues an email to confirm that this is a valid account, committed with the user.
     
     :param body: UserBase: Get the user's email and password
-    :param background_tasks: BackgroundTasks: Add a task to the background tasks
     :param request: Request: Get the base url of the server
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A user object, but the response is empty
     :doc-author: Trelent
     """
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
+    # queued in the same transaction as the user, the outbox worker sends it
+    await send_email(body.email, body.username, request.base_url, db)
     new_user = await repository_users.create_user(body, db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
     return new_user
 
 
-@router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@router.post("/login", response_model=TokenModel, dependencies=[Depends(RateLimit("auth:login"))])
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     The login function is used to authenticate a user.
     
     :param body: OAuth2PasswordRequestForm: Get the username and password from the request body
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A dictionary with the access_token, refresh_token and token type
     :doc-author: Trelent
     """
@@ -55,24 +57,29 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not confirmed email")
-    if not auth_service.verify_password(body.password, user.password):
+    valid, new_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+    if new_hash is not None:
+        # the stored hash predates the current cost policy, upgrade it while the password is at hand
+        await repository_users.update_password(user, new_hash, db)
 
     access_token = await auth_service.create_access_token(data={"sub": user.email}) # Generate JWT
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
     await repository_users.update_token(user, refresh_token, db)
+    await auth_service.principals.invalidate(user.email)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
-@router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+@router.get('/refresh_token', response_model=TokenModel, dependencies=[Depends(RateLimit("auth:refresh_token"))])
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: AsyncSession = Depends(get_db)):
     """
     The refresh_token function is used to refresh the access token.
     It takes in a refresh token and returns an access_token, a new refresh_token, and the type of token (bearer).
     
     
     :param credentials: HTTPAuthorizationCredentials: Get the token from the request header
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A dictionary with the new access token, refresh token and bearer type
     :doc-author: Trelent
     """
@@ -81,16 +88,18 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(sec
     user = await repository_users.get_user_by_email(email, db)
     if user.refresh_token != token:
         await repository_users.update_token(user, None, db)
+        await auth_service.principals.invalidate(user.email)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
     access_token = await auth_service.create_access_token(data={"sub": email})
     refresh_token = await auth_service.create_refresh_token(data={"sub": email})
     await repository_users.update_token(user, refresh_token, db)
+    await auth_service.principals.invalidate(user.email)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
-@router.get('/confirmed_email/{token}')
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+@router.get('/confirmed_email/{token}', dependencies=[Depends(RateLimit("auth:confirmed_email"))])
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     The confirmed_email function is used to confirm a user's email address.
         It takes the token from the URL and uses it to get the user's email address.
@@ -101,17 +110,18 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
          with that email as its
     
     :param token: str: Get the token from the url
-    :param db: Session: Get the database connection
+    :param db: AsyncSession: Get the database connection
     :return: A message that the email is already confirmed
     :doc-author: Trelent
     """
-    email = await auth_service.get_email_from_token(token)
+    email = auth_service.get_email_from_token(token)
     user = await repository_users.get_user_by_email(email, db)
     if user is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Verification error")
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     await repository_users.confirmed_email(email, db)
+    await auth_service.principals.invalidate(email)
     return {"message": "Email confirmed"}
 
 
@@ -134,28 +144,27 @@ async def get_email_from_token(self, token: str):
       raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                           detail="Invalid token for email verification")
   
-@router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
+@router.post('/request_email', dependencies=[Depends(RateLimit("auth:request_email"))])
+async def request_email(body: RequestEmail, request: Request,
+                        db: AsyncSession = Depends(get_db)):
     """
     The request_email function is used to send an email to the user with a link that will allow them
     to confirm their email address. The function takes in a RequestEmail object, which contains the
     email of the user who wants to confirm their account. It then checks if there is already a confirmed
-    user with that email address, and if so returns an error message saying as much. If not, it sends 
-    an asynchronous task (using FastAPI's BackgroundTasks) to send_email(), which sends out an actual 
-    confirmation email.
+    user with that email address, and if so returns an error message saying as much. If not, it queues 
+    a confirmation email in the outbox, which the outbox worker sends out.
     
     :param body: RequestEmail: Get the email from the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base_url of the server
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A dictionary with a message
     :doc-author: Trelent
     """
     user = await repository_users.get_user_by_email(body.email, db)
 
-    if user.confirmed:
+    if user and user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+        await send_email(user.email, user.username, request.base_url, db)
+        await db.commit()
     return {"message": "Check your email for confirmation."}
\ No newline at end of file
@@ -1,39 +1,244 @@
-from typing import List
-from datetime import date, timedelta
+import asyncio
+import logging
+import time
+from typing import List, Literal, Optional, Tuple
+from datetime import date, datetime, timedelta
 
-from fastapi import Depends, HTTPException, status, APIRouter
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, status, APIRouter, Header, Path, Query, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.repository import contacts as repo_contacts
 from src.database.models import User
-from src.schemas import ContactBase, ContactResponse, UserBase, UserResponse
+from src.schemas import (ContactBase, ContactResponse, ContactPage, ContactImportReport, ContactBatchRequest,
+                         ContactBatchResponse, ContactChanges, ContactDuplicateGroup, ContactMergeRequest, UserBase,
+                         UserResponse)
 from src.services.auth import auth_service
-from fastapi_limiter.depends import RateLimiter
+from src.services.cache import contacts_cache
+from src.services.contacts_io import MEDIA_TYPES, detect_format, read_contacts, write_contacts
+from src.services.duplicates import find_duplicate_groups
+from src.services.etag import etag_matches, make_etag, not_modified, set_etag
+from src.services.normalize import normalize_phone
+from src.services.ratelimit import RateLimit
+from src.conf.config import settings
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
+logger = logging.getLogger(__name__)
 
+page_adapter = TypeAdapter(ContactPage)
+list_adapter = TypeAdapter(List[ContactResponse])
+contact_adapter = TypeAdapter(Optional[ContactResponse])
+version_adapter = TypeAdapter(Optional[datetime])
+list_version_adapter = TypeAdapter(Tuple[int, Optional[datetime]])
 
-@router.get("/", response_model=List[ContactResponse], description='No more than 10 requests per minute', dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def get_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+
+@router.get("/", response_model=ContactPage, description='No more than 10 requests per minute',
+            dependencies=[Depends(RateLimit("contacts:list"))])
+async def get_contacts(response: Response, limit: int = Query(50, ge=1), cursor: Optional[str] = None,
+                       order_by: Literal["id", "lastname"] = "id",
+                       if_none_match: Optional[str] = Header(None, include_in_schema=False),
+                       db: AsyncSession = Depends(get_db),
+                       current_user: User = Depends(auth_service.get_current_user)):
     """
-    The get_contacts function returns a list of contacts.
-        The function takes in an optional skip and limit parameter to paginate the results.
-        
+    The get_contacts function returns one page of the user's contacts.
+        Pages are chained with the next_cursor value of the previous response, the page size
+        is capped by the contacts_page_max_limit setting.
+        The ETag of a page comes from the count and the latest updated_at of the user's contacts,
+        so a client that sends it back in If-None-Match gets 304 without any contact being loaded.
     
-    :param skip: int: Skip the first n contacts
+    :param response: Response: Carries the ETag header
     :param limit: int: Limit the number of contacts returned
-    :param db: Session: Access the database
+    :param cursor: Optional[str]: Cursor of the page to return, taken from next_cursor
+    :param order_by: Literal["id", "lastname"]: Sort the contacts by id or by last name
+    :param if_none_match: Optional[str]: ETag of the page the client already has
+    :param db: AsyncSession: Access the database
     :param current_user: User: Get the user_id of the current logged in user
-    :return: A list of contacts
+    :return: A page of contacts and the cursor of the next page
+    :doc-author: Trelent
+    """
+    limit = min(limit, settings.contacts_page_max_limit)
+    count, updated_at = await contacts_cache.get_or_load(
+        current_user.id, "version", {}, lambda: repo_contacts.get_contacts_version(current_user, db),
+        list_version_adapter,
+    )
+    etag = make_etag("contacts", current_user.id, count, updated_at, limit, cursor, order_by)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    async def load():
+        contacts, next_cursor = await repo_contacts.get_contacts(db, current_user, limit, cursor, order_by)
+        return {"items": contacts, "next_cursor": next_cursor}
+
+    try:
+        return await contacts_cache.get_or_load(
+            current_user.id, "list", {"limit": limit, "cursor": cursor, "order_by": order_by}, load, page_adapter
+        )
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+
+
+@router.get("/search", response_model=List[ContactResponse], name="Search contacts")
+async def search_contacts(q: str = Query(min_length=1, max_length=100), limit: int = Query(20, ge=1),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The search_contacts function returns the contacts that best match the query.
+        Every term of the query has to match a prefix, a substring or a token of the first name,
+        last name, email, phone or additional details; results come back ranked.
+    
+    :param q: str: The search query
+    :param limit: int: Limit the number of contacts returned
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Get the user_id of the current logged in user
+    :return: A list of contacts, best matches first
+    :doc-author: Trelent
+    """
+    limit = min(limit, settings.contacts_page_max_limit)
+    return await contacts_cache.get_or_load(
+        current_user.id, "search", {"q": q, "limit": limit},
+        lambda: repo_contacts.search_contacts(q, current_user, db, limit), list_adapter,
+    )
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_contacts(format: Literal["csv", "ndjson", "vcf"] = "csv", db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The export_contacts function streams all of the user's contacts as a CSV, NDJSON or vCard file.
+        Rows are read with a server-side cursor and written chunk by chunk, so the export of a large
+        account neither materializes the list nor waits for it before sending the first bytes.
+        The throughput of each export is logged in rows per second.
+    
+    :param format: Literal["csv", "ndjson", "vcf"]: Format of the file
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Get the user_id of the current logged in user
+    :return: A streaming response with the contacts file
+    :doc-author: Trelent
+    """
+    batch_size = settings.contacts_export_batch_size
+
+    async def content():
+        exported = 0
+        started = time.perf_counter()
+
+        async def counted():
+            nonlocal exported
+            async for row in repo_contacts.stream_contacts(current_user, db, batch_size):
+                exported += 1
+                yield row
+
+        async for chunk in write_contacts(counted(), format, batch_size):
+            yield chunk
+        elapsed = time.perf_counter() - started
+        logger.info("exported %d contacts of user %s as %s in %.3fs (%.0f rows/sec)",
+                    exported, current_user.id, format, elapsed, exported / elapsed if elapsed else 0)
+
+    return StreamingResponse(
+        content(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'},
+    )
+
+
+@router.get("/changes", response_model=ContactChanges)
+async def get_changes(since: Optional[str] = None, limit: int = Query(500, ge=1), db: AsyncSession = Depends(get_db),
+                      current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_changes function is the delta sync of offline clients: the contacts created or updated and the ids of
+        the contacts deleted since the previous sync. The first sync, without since, returns every contact.
+        Clients apply deleted before changed, store next_cursor for the next sync and ask again
+        right away while has_more is set. A contact may be sent again; applying a change twice is harmless.
+
+    :param since: Optional[str]: The next_cursor of the previous sync
+    :param limit: int: Maximum number of changed contacts, and of deleted ids, in the response
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Get the user_id of the current logged in user
+    :return: The changes and the cursor of the next sync
+    :doc-author: Trelent
+    """
+    try:
+        return await repo_contacts.get_changes(current_user, db, since, min(limit, settings.contacts_sync_max_limit),
+                                               settings.contacts_sync_lag)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+
+
+@router.get("/by_phone/{number}", response_model=List[ContactResponse], name="Contacts by phone")
+async def get_contacts_by_phone(number: str = Path(min_length=1, max_length=32), db: AsyncSession = Depends(get_db),
+                                current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_contacts_by_phone function is the reverse lookup of a phone number, e.g. for caller ID.
+        Any formatting of the number matches, and a number of at least phone_suffix_min_digits digits
+        also matches the contacts whose numbers end with it. Lookups are cached until the contacts change.
+
+    :param number: str: The phone number
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Get the user_id of the current logged in user
+    :return: A list of contacts with that number
     :doc-author: Trelent
     """
-    contacts = await repo_contacts.get_contacts(skip, limit, current_user, db)
-    return contacts
+    return await contacts_cache.get_or_load(
+        current_user.id, "by_phone", {"number": normalize_phone(number) or number},
+        lambda: repo_contacts.get_contacts_by_phone(number, current_user, db, settings.phone_suffix_min_digits),
+        list_adapter,
+    )
+
+
+@router.get("/duplicates", response_model=List[ContactDuplicateGroup])
+async def get_duplicates(limit: int = Query(50, ge=1), db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_duplicates function returns groups of contacts that are likely the same person, the largest first.
+        Contacts are grouped when they share a normalized email, a phone number in E.164 or the
+        phonetic last name with the first initial; each group lists the kinds of key that linked it.
+        The contacts are read in one pass and clustered off the event loop.
+
+    :param limit: int: Maximum number of groups returned
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Get the user_id of the current logged in user
+    :return: A list of groups of contacts
+    :doc-author: Trelent
+    """
+    rows = {}
+    async for row in repo_contacts.stream_contacts(current_user, db, settings.contacts_export_batch_size):
+        rows[row.id] = row
+    groups = await asyncio.to_thread(find_duplicate_groups, rows.values(),
+                                     settings.contacts_duplicates_max_block_size)
+    return [
+        {"reasons": group["reasons"], "contacts": [rows[id] for id in group["ids"]]}
+        for group in groups[:min(limit, settings.contacts_page_max_limit)]
+    ]
+
+
+@router.post("/merge", response_model=ContactResponse)
+async def merge_contacts(body: ContactMergeRequest, db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The merge_contacts function merges duplicate contacts into the primary one and deletes them.
+        Empty fields of the primary contact are filled from the duplicates, all in one transaction.
+
+    :param body: ContactMergeRequest: The id of the contact to keep and the ids of its duplicates
+    :param db: AsyncSession: Access the database
+    :param current_user: User: Get the user_id of the current logged in user
+    :return: The merged contact
+    :doc-author: Trelent
+    """
+    if body.primary_id in body.duplicate_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A contact cannot be merged into itself")
+    contact = await repo_contacts.merge_contacts(body.primary_id, body.duplicate_ids, current_user.id, db)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    await contacts_cache.invalidate(current_user.id)
+    return contact
 
 
 @router.get("/search_by_id/{id}", response_model=ContactResponse)
-async def get_contact(id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def get_contact(id: int, response: Response, if_none_match: Optional[str] = Header(None, include_in_schema=False),
+                      db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The get_contact function returns a contact by id.
         Args:
@@ -42,14 +247,28 @@ async def get_contact(id: int, db: Session = Depends(get_db), current_user: User
             current_user (User, optional): User object from auth middleware. Defaults to Depends(auth_service.get_current_user).
     
     :param id: int: Specify the id of the contact we want to update
-    :param db: Session: Get access to the database
+    :param response: Response: Carries the ETag header, derived from the id and updated_at of the contact
+    :param if_none_match: Optional[str]: ETag of the contact the client already has, answered with 304 if current
+    :param db: AsyncSession: Get access to the database
     :param current_user: User: Get the user from the database
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = await repo_contacts.get_contact_by_id(id, db)
+    if if_none_match:
+        updated_at = await contacts_cache.get_or_load(
+            current_user.id, "version_by_id", {"id": id},
+            lambda: repo_contacts.get_contact_version(id, current_user.id, db), version_adapter,
+        )
+        etag = make_etag("contact", id, updated_at)
+        if updated_at is not None and etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    contact = await contacts_cache.get_or_load(
+        current_user.id, "by_id", {"id": id},
+        lambda: repo_contacts.get_contact_by_id(id, current_user.id, db), contact_adapter,
+    )
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    set_etag(response, make_etag("contact", contact.id, contact.updated_at))
     return contact
 
 
@@ -57,24 +276,25 @@ async def get_contact(id: int, db: Session = Depends(get_db), current_user: User
     "/search_by_lastname/{lastname}",
     response_model=List[ContactResponse],
     name="Contacts by last name",
+    deprecated=True,
 )
-async def search_contacts_by_last_name(lastname: str, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def search_contacts_by_last_name(lastname: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The search_contacts_by_last_name function searches for a contact by last name.
         Args:
             lastname (str): The last name of the contact to search for.
-            db (Session, optional): SQLAlchemy Session. Defaults to Depends(get_db).
+            db (AsyncSession, optional): SQLAlchemy AsyncSession. Defaults to Depends(get_db).
             current_user (User, optional): User object with user information and permissions. Defaults to Depends(auth_service.get_current_user).
         Returns:
             Contact: A single Contact object matching the provided criteria or None if no match is found.
     
     :param lastname: str: Pass the lastname of the contact to be searched
-    :param db: Session: Pass the database connection to the function
+    :param db: AsyncSession: Pass the database connection to the function
     :param current_user: User: Get the user_id of the current logged in user
     :return: A list of contacts with the same last name
     :doc-author: Trelent
     """
-    contact = await repo_contacts.search_contacts_by_lastname(lastname, db)
+    contact = await repo_contacts.search_contacts_by_lastname(lastname, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
     return contact
@@ -84,24 +304,25 @@ async def search_contacts_by_last_name(lastname: str, db: Session = Depends(get_
     "/search_by_firstname/{firstname}",
     response_model=List[ContactResponse],
     name="Contacts by first name",
+    deprecated=True,
 )
-async def search_contacts_by_first_name(firstname: str, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def search_contacts_by_first_name(firstname: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The search_contacts_by_first_name function searches for a contact by first name.
         Args:
             firstname (str): The first name of the contact to search for.
-            db (Session, optional): SQLAlchemy Session. Defaults to Depends(get_db).
+            db (AsyncSession, optional): SQLAlchemy AsyncSession. Defaults to Depends(get_db).
             current_user (User, optional): User object with user information and permissions. Defaults to Depends(auth_service.get_current_user).
         Returns:
             Contact: A single Contact object matching the provided criteria or None if no match is found.
     
     :param firstname: str: Pass the firstname of the contact to be searched for
-    :param db: Session: Inject the database session into the function
+    :param db: AsyncSession: Inject the database session into the function
     :param current_user: User: Get the current user
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contact = await repo_contacts.search_contacts_by_firstname(firstname, db)
+    contact = await repo_contacts.search_contacts_by_firstname(firstname, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
     return contact
@@ -109,112 +330,187 @@ async def search_contacts_by_first_name(firstname: str, db: Session = Depends(ge
 
 @router.get(
     "/search_by_email/{email}",
-    response_model=List[ContactResponse],
+    response_model=ContactResponse,
     name="Contacts by email",
+    deprecated=True,
 )
-async def search_contacts_by_email(email: str, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def search_contacts_by_email(email: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The search_contacts_by_email function searches for a contact by email.
         Args:
             email (str): The email of the contact to search for.
-            db (Session, optional): SQLAlchemy Session. Defaults to Depends(get_db).
+            db (AsyncSession, optional): SQLAlchemy AsyncSession. Defaults to Depends(get_db).
             current_user (User, optional): User object containing user information from the JWT token payload. Defaults to Depends(auth_service.get_current_user).
         Raises:
             HTTPException: 404 Not Found if no contacts are found with that email address or 500 Internal Server Error if there is an error in the database
     
     :param email: str: Pass the email of the contact to be searched
-    :param db: Session: Get the database connection
+    :param db: AsyncSession: Get the database connection
     :param current_user: User: Get the current user information from the database
     :return: A contact
     :doc-author: Trelent
     """
-    contact = await repo_contacts.search_contact_by_email(email, db)
+    contact = await repo_contacts.search_contact_by_email(email, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
     return contact
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED)
-async def create_contact(body: ContactBase, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def create_contact(body: ContactBase, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The create_contact function creates a new contact in the database.
         The function takes a ContactBase object as input and returns the newly created contact.
         If an email already exists, it will return an HTTP 409 error.
     
     :param body: ContactBase: Pass the contact data to the function
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user from the database
     :return: The contact object, which is a dict
     :doc-author: Trelent
     """
-    contact = await repo_contacts.get_contact_by_lastname_and_email(body.lastname ,body.email, db)
+    # emails are unique per user, whatever the lastname
+    contact = await repo_contacts.search_contact_by_email(body.email, current_user, db)
     if contact:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="Email exists!"
         )
 
-    contact = await repo_contacts.create(body, db)
+    try:
+        contact = await repo_contacts.create(body.model_dump(exclude={"id", "created_at", "updated_at"}), db,
+                                             current_user)
+    except IntegrityError:
+        # a concurrent request created the same email after the check
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email exists!")
+    await contacts_cache.invalidate(current_user.id)
     return contact
 
 
+@router.post("/import", response_model=ContactImportReport)
+async def import_contacts(file: UploadFile = File(), format: Optional[Literal["csv", "ndjson", "vcf"]] = None,
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The import_contacts function bulk imports contacts from an uploaded CSV, NDJSON or vCard file.
+        The format is taken from the format parameter or guessed from the file name and content type.
+        Invalid records and emails the user already has are reported per row instead of failing the upload.
+    
+    :param file: UploadFile: The uploaded contacts file
+    :param format: Optional[Literal["csv", "ndjson", "vcf"]]: Format of the file
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the database
+    :return: A report with the imported, skipped and failed counts and the per-row errors
+    :doc-author: Trelent
+    """
+    fmt = format or detect_format(file.filename, file.content_type)
+    if fmt is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unknown file format")
+    try:
+        report = await repo_contacts.import_contacts(
+            read_contacts(file.file, fmt), current_user, db,
+            settings.contacts_import_chunk_size, settings.contacts_import_max_errors,
+        )
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File must be UTF-8 encoded")
+    finally:
+        # chunks are committed as they go, so a failed upload may still have added contacts
+        await contacts_cache.invalidate(current_user.id)
+    return report
+
+
+@router.post("/batch", response_model=ContactBatchResponse)
+async def batch_contacts(body: ContactBatchRequest, db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The batch_contacts function applies a list of create, update and delete operations in one transaction.
+        Every operation gets its own result with the status the single endpoint would have answered:
+        201, 200 or 204 when applied, 404, 409 or 422 when not. With atomic set, one failed operation
+        leaves every contact unchanged and the other operations are reported with 424.
+
+    :param body: ContactBatchRequest: The operations, in the order they apply
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the current user from the database
+    :return: Whether the batch was written and the result of every operation
+    :doc-author: Trelent
+    """
+    if len(body.operations) > settings.contacts_batch_max_operations:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"No more than {settings.contacts_batch_max_operations} operations per batch")
+    report = await repo_contacts.apply_batch(body.operations, current_user, db, body.atomic)
+    if report["applied"] and any(result["status"] < 400 for result in report["results"]):
+        await contacts_cache.invalidate(current_user.id)
+    return report
+
+
 @router.put("/{id}", response_model=ContactResponse)
-async def update_contact(body: ContactBase, id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def update_contact(body: ContactBase, id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The update_contact function updates a contact in the database.
         The function takes an id and a body as parameters, which are used to update the contact.
         If no contact is found with that id, then an HTTPException is raised.
+        If another contact of the user has the new email, it will return an HTTP 409 error.
     
     :param body: ContactBase: Get the data from the request body
     :param id: int: Identify the contact to be deleted
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param current_user: User: Get the current user from the auth_service
     :return: An instance of contactbase, which is a pydantic model
     :doc-author: Trelent
     """
-    contact = await repo_contacts.update(id, body, db)
+    other = await repo_contacts.search_contact_by_email(body.email, current_user, db)
+    if other is not None and other.id != id:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email exists!")
+    try:
+        contact = await repo_contacts.update(id, body, current_user.id, db)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email exists!")
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-
+    await contacts_cache.invalidate(current_user.id)
     return contact
 
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-async def remove_contact(id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def remove_contact(id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     The remove_contact function removes a contact from the database.
         Args:
             id (int): The ID of the contact to remove.
-            db (Session, optional): SQLAlchemy Session. Defaults to Depends(get_db).
+            db (AsyncSession, optional): SQLAlchemy AsyncSession. Defaults to Depends(get_db).
             current_user (User, optional): User object for authentication and authorization purposes. Defaults to Depends(auth_service.get_current_user).
     
     :param id: int: Identify the contact to be removed
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: User: Get the user that is currently logged in
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = await repo_contacts.remove(id, db)
+    contact = await repo_contacts.remove(id, current_user.id, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contact
+    await contacts_cache.invalidate(current_user.id)
 
 
 @router.get(
     "/birthdays", response_model=List[ContactResponse], name="Upcoming Birthdays"
 )
-async def get_birthdays(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def get_birthdays(days: int = Query(7, ge=0, le=366), db: AsyncSession = Depends(get_db),
+                        current_user: User = Depends(auth_service.get_current_user)):
     """
-    The get_birthdays function returns a list of contacts with birthdays in the next 7 days.
-        The function takes no parameters and returns a list of contact objects.
+    The get_birthdays function returns a list of contacts with birthdays in the next days.
+        The window starts today and spans the given number of days, 7 by default.
     
-    :param db: Session: Pass the database session to the function
+    :param days: int: Length of the window in days
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: User: Get the current user
-    :return: A list of contacts that have birthdays in the next 7 days
+    :return: A list of contacts ordered by their next birthday
     :doc-author: Trelent
     """
     today = date.today()
-    end_date = today + timedelta(days=7)
-    birthdays = await repo_contacts.get_birthdays(today, end_date, db)
-    if birthdays is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return birthdays
+    end_date = today + timedelta(days=days)
+    return await contacts_cache.get_or_load(
+        current_user.id, "birthdays", {"start": today, "end": end_date},
+        lambda: repo_contacts.get_birthdays(today, end_date, db, current_user), list_adapter,
+    )
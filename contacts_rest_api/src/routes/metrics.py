@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.db import engine, get_db
+from src.repository import outbox as repository_outbox
+from src.services import metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics(db: AsyncSession = Depends(get_db)):
+    """
+    The read_metrics function exposes the metrics of the API in the Prometheus text format: request counts and
+        latency per route template, requests in progress, database pool connections, cache lookups,
+        rate limiter rejections and the depth of the email outbox.
+        Behind several workers it aggregates all of them, see src/services/metrics.py.
+
+    :param db: AsyncSession: Count the pending messages of the email outbox
+    :return: The metrics
+    :doc-author: Trelent
+    """
+    metrics.EMAIL_OUTBOX_PENDING.set(await repository_outbox.count_pending(db))
+    metrics.observe_pool(engine.pool)
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
@@ -1,13 +1,11 @@
 from fastapi import APIRouter, Depends, status, UploadFile, File
-from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
-from src.conf.config import settings
+from src.services.avatars import avatar_service
 from src.schemas import UserResponse
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -34,29 +32,27 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
 
 @router.patch('/avatar', response_model=UserResponse)
 async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
+                             db: AsyncSession = Depends(get_db)):
     """
     The update_avatar_user function updates the avatar of a user.
+        The upload is resized to a thumbnail off the event loop and saved to the configured avatar storage;
+        re-uploading the current avatar changes nothing.
         Args:
             file (UploadFile): The image to be uploaded.
             current_user (User): The currently logged in user.
-            db (Session): A database session object for interacting with the database.
+            db (AsyncSession): A database session object for interacting with the database.
     
     :param file: UploadFile: Get the file from the request
     :param current_user: User: Get the current user's email and username
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: The user object, which is then returned to the client
     :doc-author: Trelent
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
-    user = await repository_users.update_avatar(current_user.email, src_url, db)
+    stored = await avatar_service.store(current_user.id, file, current_user.avatar_hash)
+    if stored is None:
+        return current_user
+    url, digest = stored
+    user = await repository_users.update_avatar(current_user.email, url, db, avatar_hash=digest)
+    await auth_service.principals.invalidate(current_user.email)
+    await avatar_service.discard(current_user.id, current_user.avatar_hash)
     return user
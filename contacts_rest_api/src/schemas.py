@@ -1,18 +1,19 @@
 from datetime import date, datetime
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, EmailStr, Field
 
 
 class ContactBase(BaseModel):
-    id: int
+    id: Optional[int] = None
     firstname: str
     lastname: str
     email: EmailStr
     phone: str
     birth: date
-    additional_details: str = None
-    created_at: datetime
-    updated_at: datetime
+    additional_details: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
@@ -25,7 +26,7 @@ class ContactResponse(BaseModel):
     email: EmailStr
     phone: str
     birth: date
-    additional_details: str = None
+    additional_details: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -33,6 +34,109 @@ class ContactResponse(BaseModel):
         orm_mode = True
 
 
+class ContactPage(BaseModel):
+    items: List[ContactResponse]
+    next_cursor: Optional[str] = None
+
+
+class ContactImportError(BaseModel):
+    row: int
+    detail: str
+
+
+class ContactImportReport(BaseModel):
+    imported: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: List[ContactImportError] = []
+    errors_truncated: bool = False
+
+
+class ContactBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    contact: Optional[ContactBase] = None
+
+
+class ContactBatchRequest(BaseModel):
+    operations: List[ContactBatchOperation]
+    atomic: bool = False
+
+
+class ContactBatchResult(BaseModel):
+    index: int
+    op: str
+    status: int
+    id: Optional[int] = None
+    contact: Optional[ContactResponse] = None
+    detail: Optional[str] = None
+
+
+class ContactBatchResponse(BaseModel):
+    applied: bool
+    results: List[ContactBatchResult]
+
+
+class ContactChanges(BaseModel):
+    changed: List[ContactResponse]
+    deleted: List[int]
+    next_cursor: str
+    has_more: bool
+
+
+class ContactDuplicateGroup(BaseModel):
+    reasons: List[str]
+    contacts: List[ContactResponse]
+
+
+class ContactMergeRequest(BaseModel):
+    primary_id: int
+    duplicate_ids: List[int] = Field(min_length=1)
+
+
+class PoolStatsResponse(BaseModel):
+    pool_class: str
+    size: Optional[int] = None
+    checked_in: Optional[int] = None
+    checked_out: Optional[int] = None
+    overflow: Optional[int] = None
+    max_overflow: int
+    timeout: float
+    checkouts: int
+    timeouts: int
+    wait_avg_ms: float
+    wait_max_ms: float
+    wait_histogram: Dict[str, int]
+
+
+class CacheStatsResponse(BaseModel):
+    enabled: bool
+    hits: int
+    misses: int
+    errors: int
+    oversized: int
+    principals: Dict[str, int] = {}
+
+
+class PasswordHasherStatsResponse(BaseModel):
+    executor: str
+    workers: int
+    max_queue: int
+    running: int
+    queued: int
+    completed: int
+    rejected: int
+
+
+class RateLimitStatsResponse(BaseModel):
+    enabled: bool
+    degraded: bool
+    buckets: int
+    sync_errors: int
+    allowed: Dict[str, int]
+    rejected: Dict[str, int]
+
+
 class UserBase(BaseModel):
     username: str = Field(min_length=5, max_length=16)
     email: EmailStr
@@ -49,6 +153,18 @@ class UserResponse(BaseModel):
         orm_mode = True
 
 
+class UserPrincipal(BaseModel):
+    id: int
+    username: Optional[str] = None
+    email: str
+    avatar: Optional[str] = None
+    avatar_hash: Optional[str] = None
+    confirmed: bool = False
+
+    class Config:
+        from_attributes = True
+
+
 class TokenModel(BaseModel):
     access_token: str
     refresh_token: str
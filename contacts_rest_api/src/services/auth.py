@@ -1,31 +1,34 @@
 from datetime import datetime, timedelta
 from typing import Optional
-import pickle
+import hashlib
+import time
 
-import redis
 from fastapi import Depends, HTTPException, status
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer  # token
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 
 from src.database.db import get_db
 from src.repository import users as repository_users
 from src.conf.config import settings
+from src.services.cache import LRUCache, principal_cache
+from src.services.passwords import password_hasher
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    passwords = password_hasher
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    principals = principal_cache
+    # digest of a verified access token -> email, each entry expires with its token
+    verified_tokens = LRUCache(settings.token_cache_size, ttl=600 * 60)
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
         The verify_password function takes a plain-text password and the hashed version of that password,
             and returns True if they match, False otherwise. This is used to verify that the user's login
-            credentials are correct.
+            credentials are correct. The check runs on the password worker pool, off the event loop.
         
         :param self: Represent the instance of the class
         :param plain_password: Pass in the password that is being verified
@@ -33,19 +36,33 @@ class Auth:
         :return: A boolean value
         :doc-author: Trelent
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self.passwords.verify(plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def verify_and_update_password(self, plain_password, hashed_password):
+        """
+        The verify_and_update_password function checks a password like verify_password and also tells whether
+            the stored hash should be replaced: when it was made with another cost or a deprecated scheme,
+            a new hash of the password under the current policy is returned.
+
+        :param self: Represent the instance of the class
+        :param plain_password: Pass in the password that is being verified
+        :param hashed_password: The hash stored for the user
+        :return: Whether the password matches, and the replacement hash or None
+        :doc-author: Trelent
+        """
+        return await self.passwords.verify_and_update(plain_password, hashed_password)
+
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password as input and returns the hash of that password.
-            The function uses the pwd_context object to generate a hash from the given password.
+            The hash is computed on the password worker pool, off the event loop.
         
         :param self: Represent the instance of the class
         :param password: str: Pass in the password that is to be hashed
         :return: A password hash
         :doc-author: Trelent
         """
-        return self.pwd_context.hash(password)
+        return await self.passwords.hash(password)
 
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -112,7 +129,34 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
    
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    def decode_access_token(self, token: str) -> str | None:
+        """
+        The decode_access_token function returns the email of a valid access token, or None.
+            The signature and claims are checked once per token and worker: the result is kept in verified_tokens
+            until the exp claim of the token, so expiry is still enforced. Tokens of another scope are never cached.
+
+        :param self: Represent the instance of the class
+        :param token: str: The bearer token sent by the client
+        :return: The email of the user, or None if the token is invalid, expired or not an access token
+        :doc-author: Trelent
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        email = self.verified_tokens.get(key)
+        if email is not None:
+            return email
+        try:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            return None
+        email = payload.get("sub")
+        if payload.get("scope") != "access_token" or email is None:
+            return None
+        ttl = payload["exp"] - time.time()
+        if ttl > 0:
+            self.verified_tokens.set(key, email, ttl=ttl)
+        return email
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         The get_current_user function is a dependency that will be used in the UserController class.
         It takes an access token as input and returns the user object associated with it.
@@ -120,8 +164,8 @@ class Auth:
         
         :param self: Represent the instance of a class
         :param token: str: Get the token from the request header
-        :param db: Session: Get the database connection from the dependency injection
-        :return: A user object
+        :param db: AsyncSession: Get the database connection from the dependency injection
+        :return: A UserPrincipal snapshot of the user, usually served from the principal cache
         :doc-author: Trelent
         """
         credentials_exception = HTTPException(
@@ -130,26 +174,12 @@ class Auth:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError as e:
+        email = self.decode_access_token(token)
+        if email is None:
             raise credentials_exception
-        user = self.r.get(f"user:{email}")
+        user = await self.principals.get_or_load(email, lambda: repository_users.get_user_by_email(email, db))
         if user is None:
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            raise credentials_exception
         return user
     
     def create_email_token(self, data: dict):
@@ -165,7 +195,7 @@ class Auth:
         """
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(hours=3)
-        to_encode.update({"iat": datetime.utcnow(), "exp": expire})
+        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "email_token"})
         token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return token
     
@@ -182,7 +212,7 @@ class Auth:
         """
         try:
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == "email_token":
+            if payload.get("scope") == "email_token":
                 email = payload["sub"]
                 return email
             raise HTTPException(
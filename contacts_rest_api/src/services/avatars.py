@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import io
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from PIL import Image, ImageOps, UnidentifiedImageError
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+from src.services.storage import AvatarStorage, build_storage
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+CONTENT_TYPE = "image/png"
+UPLOAD_PATH = "/api/users/avatar"
+# room for the multipart boundaries and part headers around the image
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+def make_thumbnail(data: bytes, size: int) -> bytes:
+    """
+    The make_thumbnail function crops and scales an image to a size x size PNG, like Cloudinary's crop=fill.
+        It is CPU bound and runs in a worker process, so it only takes and returns bytes.
+
+    :param data: bytes: The uploaded image
+    :param size: int: Width and height of the thumbnail in pixels
+    :return: The PNG encoded thumbnail
+    :doc-author: Trelent
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            thumbnail = ImageOps.fit(image.convert("RGBA"), (size, size), Image.LANCZOS)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as err:
+        raise ValueError(f"not a valid image: {err}") from None
+    output = io.BytesIO()
+    thumbnail.save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+
+def avatar_key(user_id: int, digest: str) -> str:
+    # content addressed, so a new avatar never hits a stale CDN or browser cache entry
+    return f"{user_id}/{digest[:32]}.png"
+
+
+class AvatarService:
+    """
+    Reads, resizes and stores avatar uploads.
+        Oversized request bodies are refused by AvatarUploadLimit before they are parsed; the parsed file
+        is then read in chunks and rejected with 413 if the image itself exceeds settings.avatar_max_bytes.
+        Thumbnails are made on a process pool of settings.avatar_resize_workers, off the event loop.
+    """
+
+    def __init__(self, storage: AvatarStorage | None = None):
+        self._storage = storage
+        self._executor = None
+
+    @property
+    def storage(self) -> AvatarStorage:
+        if self._storage is None:
+            self._storage = build_storage()
+        return self._storage
+
+    @storage.setter
+    def storage(self, storage: AvatarStorage):
+        self._storage = storage
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if settings.avatar_resize_executor == "process":
+                self._executor = ProcessPoolExecutor(max_workers=settings.avatar_resize_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=settings.avatar_resize_workers,
+                                                    thread_name_prefix="avatar-resize")
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def read_upload(self, file: UploadFile) -> tuple[bytes, str]:
+        """
+        The read_upload function reads the uploaded file in chunks, enforcing the size limit and hashing as it goes.
+            By then the body is already spooled; AvatarUploadLimit keeps that spool bounded.
+
+        :param self: Represent the instance of the class
+        :param file: UploadFile: The uploaded file
+        :return: The content and its hex SHA-256
+        :doc-author: Trelent
+        """
+        limit = settings.avatar_max_bytes
+        too_large = HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                  detail=f"Avatar must not exceed {limit} bytes")
+        if file.size is not None and file.size > limit:
+            raise too_large
+        digest = hashlib.sha256()
+        content = bytearray()
+        while chunk := await file.read(CHUNK_SIZE):
+            if len(content) + len(chunk) > limit:
+                raise too_large
+            digest.update(chunk)
+            content += chunk
+        return bytes(content), digest.hexdigest()
+
+    async def thumbnail(self, data: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, make_thumbnail, data, settings.avatar_size)
+        except ValueError as err:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File is not a valid image") from err
+
+    async def store(self, user_id: int, file: UploadFile, current_hash: str | None) -> tuple[str, str] | None:
+        """
+        The store function resizes and uploads a new avatar of the user.
+            Nothing is resized or uploaded when the content is the same as the current avatar.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Owner of the avatar
+        :param file: UploadFile: The uploaded image
+        :param current_hash: str | None: Content hash of the current avatar, if any
+        :return: The URL and content hash of the new avatar, or None if it is unchanged
+        :doc-author: Trelent
+        """
+        data, digest = await self.read_upload(file)
+        if digest == current_hash:
+            return None
+        url = await self.storage.save(avatar_key(user_id, digest), await self.thumbnail(data), CONTENT_TYPE)
+        return url, digest
+
+    async def discard(self, user_id: int, digest: str | None):
+        """
+        The discard function removes a replaced avatar from the storage; failures are only logged.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Owner of the avatar
+        :param digest: str | None: Content hash of the replaced avatar
+        :return: None
+        :doc-author: Trelent
+        """
+        if not digest:
+            return
+        try:
+            await self.storage.delete(avatar_key(user_id, digest))
+        except Exception as err:
+            logger.warning("could not delete the previous avatar of user %s: %s", user_id, err)
+
+
+class AvatarUploadLimit:
+    """
+    ASGI middleware refusing avatar uploads over the size limit before the multipart body is spooled.
+        A declared Content-Length over the limit is answered with 413 without reading the body at all;
+        a body sent without one is counted as it arrives and cut off with 413 once it goes over.
+    """
+
+    def __init__(self, app: ASGIApp, path: str = UPLOAD_PATH):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        limit = settings.avatar_max_bytes + MULTIPART_OVERHEAD
+        detail = f"Avatar must not exceed {settings.avatar_max_bytes} bytes"
+        length = Headers(scope=scope).get("content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            response = JSONResponse({"detail": detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+avatar_service = AvatarService()
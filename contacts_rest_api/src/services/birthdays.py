@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import logging
+import time
+from datetime import date, timedelta
+
+from src.conf.config import settings
+from src.database.db import new_session
+from src.repository import contacts as repository_contacts
+from src.repository import jobs as repository_jobs
+from src.services.email import send_birthday_digest
+
+logger = logging.getLogger(__name__)
+
+DIGEST_JOB = "birthday_digest"
+
+
+def next_birthday(birth: date, today: date) -> date:
+    """
+    The next_birthday function returns the first anniversary of birth on or after today.
+        The 29th of February is celebrated on the 28th in common years.
+
+    :param birth: date: The date of birth
+    :param today: date: The reference date
+    :return: The date of the next birthday
+    :doc-author: Trelent
+    """
+    for year in (today.year, today.year + 1):
+        try:
+            anniversary = birth.replace(year=year)
+        except ValueError:
+            anniversary = date(year, 2, 28)
+        if anniversary >= today:
+            return anniversary
+
+
+async def run_birthday_digest(today: date | None = None, days: int | None = None, session_factory=new_session,
+                              commit_every: int | None = None, batch_size: int | None = None) -> dict:
+    """
+    The run_birthday_digest function queues one digest of upcoming birthdays per user with any.
+        All users are read by a single streamed query in user order, so the cost is one scan instead of
+        one query per user. Digests and the checkpoint (last user done) are committed together every
+        commit_every users: a crashed run resumes after the last committed user without sending twice,
+        and a completed run is not repeated on the same day.
+
+    :param today: date | None: First day of the window, today by default
+    :param days: int | None: Length of the window, settings.birthday_digest_days by default
+    :param session_factory: Opens the reading and the writing session
+    :param commit_every: int | None: Users per transaction, settings.birthday_digest_commit_every by default
+    :param batch_size: int | None: Rows fetched per round trip, settings.contacts_export_batch_size by default
+    :return: A dictionary with the number of users and contacts processed and the elapsed seconds
+    :doc-author: Trelent
+    """
+    today = today or date.today()
+    days = settings.birthday_digest_days if days is None else days
+    commit_every = commit_every or settings.birthday_digest_commit_every
+    batch_size = batch_size or settings.contacts_export_batch_size
+    stats = {"users": 0, "contacts": 0, "resumed_after": 0, "skipped": False, "seconds": 0.0}
+    started = time.perf_counter()
+
+    # the stream is read on its own session: committing the writer must not close the server-side cursor.
+    # SQLite needs journal_mode=WAL for the writer to commit while the reader is open
+    reader = session_factory()
+    writer = session_factory()
+    try:
+        checkpoint = await repository_jobs.get_checkpoint(DIGEST_JOB, today, writer)
+        await writer.commit()
+        if checkpoint.completed:
+            stats["skipped"] = True
+            return stats
+        stats["resumed_after"] = checkpoint.last_key
+
+        async def flush(user, contacts):
+            await send_birthday_digest(user.user_email, user.username, contacts, days, writer)
+            checkpoint.last_key = user.user_id
+            checkpoint.processed += 1
+            stats["users"] += 1
+            stats["contacts"] += len(contacts)
+            if stats["users"] % commit_every == 0:
+                await writer.commit()
+                elapsed = time.perf_counter() - started
+                logger.info("birthday digest: %d users, %d contacts, %.0f users/sec, last user %s",
+                            stats["users"], stats["contacts"], stats["users"] / elapsed, user.user_id)
+
+        user, contacts = None, []
+        rows = repository_contacts.stream_birthdays_by_user(
+            today, today + timedelta(days=days), reader, checkpoint.last_key, batch_size
+        )
+        async for row in rows:
+            if user is not None and row.user_id != user.user_id:
+                await flush(user, contacts)
+                contacts = []
+            user = row
+            anniversary = next_birthday(row.birth, today)
+            contacts.append({
+                "firstname": row.firstname,
+                "lastname": row.lastname,
+                "date": anniversary.isoformat(),
+                "in_days": (anniversary - today).days,
+            })
+        if user is not None:
+            await flush(user, contacts)
+        checkpoint.completed = True
+        await writer.commit()
+    finally:
+        await reader.close()
+        await writer.close()
+        stats["seconds"] = time.perf_counter() - started
+    logger.info("birthday digest for %s done: %d users, %d contacts in %.1fs",
+                today, stats["users"], stats["contacts"], stats["seconds"])
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m src.services.birthdays --days 7
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Queue the daily digest of upcoming birthdays for every user")
+    parser.add_argument("--days", type=int, default=settings.birthday_digest_days)
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="first day of the window, YYYY-MM-DD")
+    arguments = parser.parse_args()
+    print(asyncio.run(run_birthday_digest(arguments.date, arguments.days)))
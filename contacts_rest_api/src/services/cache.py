@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+import redis.asyncio as redis
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.schemas import UserPrincipal
+from src.services.metrics import CACHE_REQUESTS
+from src.services.profiler import ProfiledRedis
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Bounded in-process mapping with a TTL per entry; the least recently used entry is evicted first.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, now: float | None = None):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires <= (time.monotonic() if now is None else now):
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def keys(self) -> list:
+        return list(self._data)
+
+    def pop(self, key):
+        item = self._data.pop(key, None)
+        return None if item is None else item[0]
+
+    def clear(self):
+        self._data.clear()
+
+
+class RedisCache:
+    """
+    Base of the Redis backed caches: the asyncio client is created on first use.
+    """
+
+    def __init__(self):
+        self._redis = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = ProfiledRedis(host=settings.redis_host, port=settings.redis_port, db=0)
+        return self._redis
+
+    @client.setter
+    def client(self, client: redis.Redis):
+        self._redis = client
+
+
+class ContactsCache(RedisCache):
+    """
+    Read-through Redis cache of contact reads, versioned per user.
+        Entries are keyed on the user id, the version counter of that user, the read name and its parameters.
+        A write bumps the version, so every entry of that user becomes unreachable at once and expires with its TTL.
+    """
+
+    def __init__(self, prefix: str = "contacts"):
+        super().__init__()
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.oversized = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.contacts_cache_enabled
+
+    def version_key(self, user_id: int) -> str:
+        return f"{self.prefix}:ver:{user_id}"
+
+    def entry_key(self, user_id: int, version: int, name: str, params: dict) -> str:
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{self.prefix}:{user_id}:{version}:{name}:{digest}"
+
+    async def get_or_load(self, user_id: int, name: str, params: dict, loader: Callable[[], Awaitable[Any]],
+                          adapter: TypeAdapter):
+        """
+        The get_or_load function returns a cached read of the user's contacts, or runs the loader and caches its result.
+            Values are validated and stored through the adapter, so a hit returns the same response models as a miss.
+            When the cache is switched off or Redis is unavailable the loader result is returned directly.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Owner of the contacts
+        :param name: str: Name of the read, part of the key
+        :param params: dict: Parameters of the read, part of the key
+        :param loader: Callable[[], Awaitable[Any]]: Runs the read against the database
+        :param adapter: TypeAdapter: Validates and serializes the result
+        :return: The result of the read, validated by the adapter
+        :doc-author: Trelent
+        """
+        if not self.enabled:
+            return adapter.validate_python(await loader(), from_attributes=True)
+        try:
+            version = int(await self.client.get(self.version_key(user_id)) or 0)
+            key = self.entry_key(user_id, version, name, params)
+            cached = await self.client.get(key)
+        except RedisError as err:
+            self.errors += 1
+            logger.warning("contacts cache read failed: %s", err)
+            return adapter.validate_python(await loader(), from_attributes=True)
+        if cached is not None:
+            self.hits += 1
+            CACHE_REQUESTS.labels("contacts", "hit").inc()
+            return adapter.validate_json(cached)
+        self.misses += 1
+        CACHE_REQUESTS.labels("contacts", "miss").inc()
+        value = adapter.validate_python(await loader(), from_attributes=True)
+        payload = adapter.dump_json(value)
+        if len(payload) > settings.contacts_cache_max_entry_bytes:
+            self.oversized += 1
+            return value
+        try:
+            await self.client.set(key, payload, ex=settings.contacts_cache_ttl)
+        except RedisError as err:
+            self.errors += 1
+            logger.warning("contacts cache write failed: %s", err)
+        return value
+
+    async def invalidate(self, user_id: int):
+        """
+        The invalidate function bumps the version counter of the user, which makes all of their cached reads stale.
+            The counter has no TTL: if it expired, versions would restart and old entries could be served again.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Owner of the contacts that changed
+        :return: None
+        :doc-author: Trelent
+        """
+        if not self.enabled:
+            return
+        try:
+            await self.client.incr(self.version_key(user_id))
+        except RedisError as err:
+            self.errors += 1
+            logger.error("contacts cache invalidation failed for user %s: %s", user_id, err)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "oversized": self.oversized,
+        }
+
+    def reset_stats(self):
+        self.hits = self.misses = self.errors = self.oversized = 0
+
+
+class PrincipalCache(RedisCache):
+    """
+    Two-tier cache of the authenticated user: a bounded in-process LRU in front of Redis.
+        Entries are UserPrincipal snapshots serialized as JSON, never ORM objects.
+        Invalidations are published on a channel so every worker drops its local copy.
+    """
+
+    CHANNEL = "principals:invalidate"
+
+    def __init__(self, prefix: str = "principal"):
+        super().__init__()
+        self.prefix = prefix
+        self.local = LRUCache(settings.principal_cache_size, settings.principal_cache_local_ttl)
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def key(self, email: str) -> str:
+        return f"{self.prefix}:{email}"
+
+    async def get_or_load(self, email: str, loader: Callable[[], Awaitable[Any]]) -> UserPrincipal | None:
+        """
+        The get_or_load function returns the principal of the given email from the first tier that has it.
+            The in-process LRU is checked first, then Redis, and only then the loader runs against the database.
+            A Redis failure is counted and treated as a miss.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the user
+        :param loader: Callable[[], Awaitable[Any]]: Loads the User from the database
+        :return: The principal, or None if the user does not exist
+        :doc-author: Trelent
+        """
+        principal = self.local.get(email)
+        if principal is not None:
+            self.local_hits += 1
+            CACHE_REQUESTS.labels("principal", "local_hit").inc()
+            return principal
+        try:
+            cached = await self.client.get(self.key(email))
+        except RedisError as err:
+            self.errors += 1
+            logger.warning("principal cache read failed: %s", err)
+            cached = None
+        if cached is not None:
+            self.redis_hits += 1
+            CACHE_REQUESTS.labels("principal", "redis_hit").inc()
+            principal = UserPrincipal.model_validate_json(cached)
+        else:
+            self.misses += 1
+            CACHE_REQUESTS.labels("principal", "miss").inc()
+            user = await loader()
+            if user is None:
+                return None
+            principal = UserPrincipal.model_validate(user, from_attributes=True)
+            try:
+                await self.client.set(self.key(email), principal.model_dump_json(), ex=settings.principal_cache_ttl)
+            except RedisError as err:
+                self.errors += 1
+                logger.warning("principal cache write failed: %s", err)
+        self.local.set(email, principal)
+        return principal
+
+    async def invalidate(self, email: str):
+        """
+        The invalidate function drops the principal from both tiers and tells the other workers to drop it too.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the user that changed
+        :return: None
+        :doc-author: Trelent
+        """
+        self.local.pop(email)
+        try:
+            await self.client.delete(self.key(email))
+            await self.client.publish(self.CHANNEL, email)
+        except RedisError as err:
+            self.errors += 1
+            logger.error("principal cache invalidation failed for %s: %s", email, err)
+
+    async def listen(self):
+        """
+        The listen function evicts local entries invalidated by other workers, for the lifetime of the worker.
+            While the subscription is down messages can be lost, so the local tier is cleared on every reconnect.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                self.local.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        data = message["data"]
+                        self.local.pop(data.decode() if isinstance(data, bytes) else data)
+            except RedisError as err:
+                logger.warning("principal invalidation channel lost: %s", err)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.local),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+contacts_cache = ContactsCache()
+principal_cache = PrincipalCache()
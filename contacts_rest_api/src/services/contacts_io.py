@@ -0,0 +1,232 @@
+import codecs
+import csv
+import io
+import json
+import re
+from collections import namedtuple
+from typing import AsyncIterable, AsyncIterator, BinaryIO, Iterator
+
+CONTACT_FIELDS = ("firstname", "lastname", "email", "phone", "birth", "additional_details")
+EXPORT_FIELDS = ("id",) + CONTACT_FIELDS + ("created_at", "updated_at")
+FORMATS = ("csv", "ndjson", "vcf")
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson", "vcf": "text/vcard"}
+
+ImportRow = namedtuple("ImportRow", "number data error")
+
+_EXTENSIONS = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".vcf": "vcf",
+    ".vcard": "vcf",
+}
+_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/vcard": "vcf",
+    "text/x-vcard": "vcf",
+}
+
+
+def detect_format(filename: str | None, content_type: str | None) -> str | None:
+    """
+    The detect_format function guesses the format of an uploaded contacts file.
+        The file extension wins over the content type sent by the client.
+
+    :param filename: str | None: Name of the uploaded file
+    :param content_type: str | None: Content type of the uploaded file
+    :return: One of FORMATS or None if the format is unknown
+    :doc-author: Trelent
+    """
+    if filename:
+        name = filename.lower()
+        for extension, fmt in _EXTENSIONS.items():
+            if name.endswith(extension):
+                return fmt
+    if content_type:
+        return _CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+    return None
+
+
+def read_contacts(stream: BinaryIO, fmt: str) -> Iterator[ImportRow]:
+    """
+    The read_contacts function parses an uploaded file one record at a time.
+        Only the current record is held in memory, whatever the size of the file.
+
+    :param stream: BinaryIO: The uploaded file
+    :param fmt: str: One of FORMATS
+    :return: An iterator of ImportRow tuples with either the record fields or a parse error
+    :doc-author: Trelent
+    """
+    # decode line by line: SpooledTemporaryFile cannot be wrapped in TextIOWrapper before Python 3.11
+    text = codecs.iterdecode(stream, "utf-8-sig")
+    if fmt == "csv":
+        yield from _read_csv(text)
+    elif fmt == "ndjson":
+        yield from _read_ndjson(text)
+    elif fmt == "vcf":
+        yield from _read_vcard(text)
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _read_csv(text) -> Iterator[ImportRow]:
+    reader = csv.DictReader(text)
+    number = 0
+    while True:
+        number += 1
+        try:
+            record = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as err:
+            # the reader has consumed the bad record and goes on with the next line
+            yield ImportRow(number, None, f"Invalid CSV: {err}")
+            continue
+        yield ImportRow(number, {key: value for key, value in record.items() if key in CONTACT_FIELDS}, None)
+
+
+def _read_ndjson(text) -> Iterator[ImportRow]:
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as err:
+            yield ImportRow(number, None, f"Invalid JSON: {err}")
+            continue
+        if not isinstance(record, dict):
+            yield ImportRow(number, None, "Expected a JSON object")
+            continue
+        yield ImportRow(number, record, None)
+
+
+def _unescape_vcard(value: str) -> str:
+    return re.sub(r"\\(.)", lambda match: "\n" if match.group(1) in "nN" else match.group(1), value)
+
+
+def _vcard_lines(text) -> Iterator[str]:
+    # RFC 6350 line unfolding: a line starting with a space or tab continues the previous one
+    pending = None
+    for raw in text:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending is not None:
+        yield pending
+
+
+def _read_vcard(text) -> Iterator[ImportRow]:
+    number = 0
+    card = None
+    for line in _vcard_lines(text):
+        if not line.strip():
+            continue
+        name, _, value = line.partition(":")
+        prop = name.split(";")[0].split(".")[-1].upper()
+        if prop == "BEGIN" and value.strip().upper() == "VCARD":
+            number += 1
+            card = {}
+        elif card is None:
+            continue
+        elif prop == "END" and value.strip().upper() == "VCARD":
+            yield ImportRow(number, card, None)
+            card = None
+        elif prop == "N":
+            parts = value.split(";")
+            card["lastname"] = _unescape_vcard(parts[0])
+            if len(parts) > 1:
+                card["firstname"] = _unescape_vcard(parts[1])
+        elif prop == "FN":
+            first, _, last = _unescape_vcard(value).partition(" ")
+            card.setdefault("firstname", first)
+            card.setdefault("lastname", last)
+        elif prop == "EMAIL":
+            card.setdefault("email", value.strip())
+        elif prop == "TEL":
+            card.setdefault("phone", value.strip())
+        elif prop == "BDAY":
+            birth = value.strip()
+            if len(birth) == 8 and birth.isdigit():
+                birth = f"{birth[:4]}-{birth[4:6]}-{birth[6:]}"
+            card["birth"] = birth
+        elif prop == "NOTE":
+            card["additional_details"] = _unescape_vcard(value)
+    if card is not None:
+        yield ImportRow(number, None, "Unterminated vCard")
+
+
+async def write_contacts(rows: AsyncIterable, fmt: str, batch_size: int = 500) -> AsyncIterator[str]:
+    """
+    The write_contacts function serializes contact rows into text chunks for a streaming response.
+        Each chunk holds up to batch_size rows, so only one chunk is in memory at a time.
+
+    :param rows: AsyncIterable: Rows or objects with the EXPORT_FIELDS attributes
+    :param fmt: str: One of FORMATS
+    :param batch_size: int: Number of rows per yielded chunk
+    :return: An async iterator of text chunks
+    :doc-author: Trelent
+    """
+    if fmt == "csv":
+        format_row = _csv_row
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(EXPORT_FIELDS)
+        yield buffer.getvalue()
+    elif fmt == "ndjson":
+        format_row = _ndjson_row
+    elif fmt == "vcf":
+        format_row = _vcard_row
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+    batch = []
+    async for row in rows:
+        batch.append(format_row(row))
+        if len(batch) >= batch_size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def _csv_row(row) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(["" if value is None else value for value in (getattr(row, name) for name in EXPORT_FIELDS)])
+    return buffer.getvalue()
+
+
+def _ndjson_row(row) -> str:
+    record = {name: getattr(row, name) for name in EXPORT_FIELDS}
+    return json.dumps(record, default=lambda value: value.isoformat(), ensure_ascii=False) + "\n"
+
+
+def _escape_vcard(value) -> str:
+    return str(value).replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;").replace("\n", "\\n")
+
+
+def _vcard_row(row) -> str:
+    firstname = _escape_vcard(row.firstname or "")
+    lastname = _escape_vcard(row.lastname or "")
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"UID:{row.id}",
+        f"N:{lastname};{firstname};;;",
+        f"FN:{' '.join(part for part in (firstname, lastname) if part)}",
+    ]
+    if row.email:
+        lines.append(f"EMAIL;TYPE=INTERNET:{row.email}")
+    if row.phone:
+        lines.append(f"TEL:{_escape_vcard(row.phone)}")
+    if row.birth:
+        lines.append(f"BDAY:{row.birth.isoformat()}")
+    if row.additional_details:
+        lines.append(f"NOTE:{_escape_vcard(row.additional_details)}")
+    lines.append("END:VCARD")
+    return "\r\n".join(lines) + "\r\n"
@@ -0,0 +1,91 @@
+from collections import defaultdict
+from typing import Iterable
+
+from src.services.normalize import normalize_email, normalize_phone, soundex
+
+
+class UnionFind:
+    """
+    Disjoint sets of ids with path halving and union by size, so clustering n ids is close to linear.
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        parent = self.parent
+        parent.setdefault(item, item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size.get(a, 1) < self.size.get(b, 1):
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] = self.size.get(a, 1) + self.size.pop(b, 1)
+        return a
+
+
+def blocking_keys(row) -> list[tuple[str, str]]:
+    """
+    The blocking_keys function returns the keys under which a contact may match another one:
+        its normalized email, its phone in E.164 and the Soundex of the last name with the first initial.
+
+    :param row: Any object with the firstname, lastname, email and phone attributes
+    :return: A list of (kind, key) pairs
+    :doc-author: Trelent
+    """
+    keys = []
+    email = normalize_email(row.email)
+    if email:
+        keys.append(("email", email))
+    phone = normalize_phone(row.phone)
+    if phone:
+        keys.append(("phone", phone))
+    lastname = soundex(row.lastname)
+    if lastname and row.firstname:
+        keys.append(("name", f"{lastname}{row.firstname.strip()[:1].lower()}"))
+    return keys
+
+
+def find_duplicate_groups(rows: Iterable, max_block_size: int) -> list[dict]:
+    """
+    The find_duplicate_groups function clusters contacts that share any blocking key.
+        Keys are computed in one pass, then the contacts of every block are joined with union-find, so
+        contacts linked through a chain of keys end up in one group; there are no pairwise comparisons.
+        Blocks larger than max_block_size, e.g. a very common name, say nothing and are ignored.
+
+    :param rows: Iterable: Contacts with the id, firstname, lastname, email and phone attributes
+    :param max_block_size: int: Largest block that still counts as a match
+    :return: Groups of two or more ids with the kinds of key that linked them, the largest first
+    :doc-author: Trelent
+    """
+    blocks = defaultdict(list)
+    for row in rows:
+        for key in blocking_keys(row):
+            blocks[key].append(row.id)
+
+    sets = UnionFind()
+    linked = []
+    for (kind, _), ids in blocks.items():
+        if 2 <= len(ids) <= max_block_size:
+            first = ids[0]
+            for other in ids[1:]:
+                sets.union(first, other)
+            linked.append((kind, first))
+
+    groups = defaultdict(list)
+    for item in sets.parent:
+        groups[sets.find(item)].append(item)
+    reasons = defaultdict(set)
+    for kind, first in linked:
+        reasons[sets.find(first)].add(kind)
+    result = [{"ids": sorted(ids), "reasons": sorted(reasons[root])} for root, ids in groups.items()]
+    result.sort(key=lambda group: (-len(group["ids"]), group["ids"][0]))
+    return result
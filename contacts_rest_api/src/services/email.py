@@ -1,54 +1,215 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
 from pydantic import EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.database.db import new_session
+from src.database.models import EmailOutbox
+from src.repository import outbox as repository_outbox
 from src.services.auth import auth_service
 from src.conf.config import settings
 
-# MAIL_FROM=EmailStr(settings.mail_from),
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Service",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
-
-
-async def send_email(email: EmailStr, username: str, host: str):
-    """
-    The send_email function sends an email to the user with a link to confirm their email address.
-        The function takes in three arguments:
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
+CONFIRMATION_TEMPLATE = "email_template.html"
+DIGEST_TEMPLATE = "birthday_digest.html"
+
+templates = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(["html"]))
+
+
+async def send_email(email: EmailStr, username: str, host: str, db: AsyncSession):
+    """
+    The send_email function queues the message asking the user to confirm their email address.
+        The message is written to the email outbox in the session of the caller and sent by the outbox worker
+        once the caller commits; the confirmation token is created when the message is sent.
             -email: the user's email address, which is used as a unique identifier for them.
-            -username: the username of the user who is registering. This will be displayed in 
-                their confirmation message so they know it was sent to them and not someone else.
-            -host: this is used as part of the URL that will be sent in their confirmation message, 
-                so they can click on it and verify themselves.
+            -username: the username of the user who is registering, displayed in the message.
+            -host: the base URL of the server, used in the confirmation link.
     
     :param email: EmailStr: Define the email address of the recipient
     :param username: str: Pass the username to the template
     :param host: str: Pass the hostname of the server to be used in the email template
-    :return: A coroutine object
+    :param db: AsyncSession: The session the message is committed with
+    :return: The outbox row
+    :doc-author: Trelent
+    """
+    return await repository_outbox.enqueue(
+        CONFIRMATION_TEMPLATE, "Confirm your email ", email, {"host": str(host), "username": username}, db
+    )
+
+
+async def send_birthday_digest(email: str, username: str, contacts: list, days: int, db: AsyncSession):
+    """
+    The send_birthday_digest function queues the digest of the upcoming birthdays of the user's contacts.
+        Like send_email, the message is only written to the outbox in the session of the caller.
+
+    :param email: str: Email address of the user
+    :param username: str: Pass the username to the template
+    :param contacts: list: Dictionaries with the firstname, lastname, date and in_days of each birthday
+    :param days: int: Length of the window the digest covers
+    :param db: AsyncSession: The session the message is committed with
+    :return: The outbox row
+    :doc-author: Trelent
+    """
+    return await repository_outbox.enqueue(
+        DIGEST_TEMPLATE, "Upcoming birthdays", email, {"username": username, "days": days, "contacts": contacts}, db
+    )
+
+
+def backoff_delay(attempts: int) -> float:
+    """
+    The backoff_delay function returns how long to wait before the next attempt: exponential, capped.
+
+    :param attempts: int: Number of failed attempts so far
+    :return: The delay in seconds
     :doc-author: Trelent
     """
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
+    return min(settings.outbox_backoff_base * 2 ** (attempts - 1), settings.outbox_backoff_max)
+
+
+def build_message(message: EmailOutbox, template: Template) -> EmailMessage:
+    context = json.loads(message.context)
+    if message.template == CONFIRMATION_TEMPLATE:
+        context["token"] = auth_service.create_email_token({"sub": message.recipient})
+    email = EmailMessage()
+    email["From"] = formataddr((settings.mail_from_name, settings.mail_from))
+    email["To"] = message.recipient
+    email["Subject"] = message.subject
+    email.set_content(template.render(**context), subtype="html")
+    return email
+
+
+class OutboxWorker:
+    """
+    Drains the email outbox: claims a batch of due messages, sends them over one SMTP connection
+    and reschedules failures with exponential backoff until outbox_max_attempts.
+    """
+
+    def __init__(self, session_factory=new_session, batch_size: int | None = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.outbox_batch_size
+
+    def smtp(self) -> aiosmtplib.SMTP:
+        return aiosmtplib.SMTP(
+            hostname=settings.mail_server,
+            port=settings.mail_port,
+            use_tls=settings.mail_ssl_tls,
+            start_tls=settings.mail_starttls,
+            validate_certs=settings.mail_validate_certs,
         )
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+    async def connect(self, smtp: aiosmtplib.SMTP):
+        await smtp.connect()
+        if settings.mail_use_credentials:
+            await smtp.login(settings.mail_username, settings.mail_password)
+
+    async def run_once(self) -> int:
+        """
+        The run_once function sends one batch of due messages and commits their new state.
+
+        :param self: Represent the instance of the class
+        :return: The number of messages claimed
+        :doc-author: Trelent
+        """
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            batch = await repository_outbox.claim_batch(self.batch_size, now, db)
+            if not batch:
+                return 0
+            by_template = defaultdict(list)
+            for message in batch:
+                by_template[message.template].append(message)
+            smtp = self.smtp()
+            try:
+                await self.connect(smtp)
+            except aiosmtplib.SMTPException as err:
+                logger.warning("outbox: SMTP connection failed: %s", err)
+                for message in batch:
+                    self.failed(message, err, now)
+            else:
+                for name, messages in by_template.items():
+                    try:
+                        template = templates.get_template(name)
+                    except Exception as err:
+                        logger.exception("outbox: cannot load template %s", name)
+                        for message in messages:
+                            self.failed(message, err, now)
+                        continue
+                    for message in messages:
+                        await self.send(smtp, message, template, now)
+                if smtp.is_connected:
+                    try:
+                        await smtp.quit()
+                    except aiosmtplib.SMTPException as err:
+                        logger.warning("outbox: SMTP quit failed: %s", err)
+            await db.commit()
+            return len(batch)
+        finally:
+            await db.close()
+
+    async def send(self, smtp: aiosmtplib.SMTP, message: EmailOutbox, template: Template, now: datetime):
+        # any error stays with its message, so the state of the messages already sent is still committed
+        try:
+            email = build_message(message, template)
+            if not smtp.is_connected:
+                await self.connect(smtp)
+            await smtp.send_message(email)
+        except aiosmtplib.SMTPException as err:
+            self.failed(message, err, now)
+            return
+        except Exception as err:
+            logger.exception("outbox: cannot send message %s", message.id)
+            self.failed(message, err, now)
+            return
+        message.attempts += 1
+        message.status = "sent"
+        message.sent_at = now
+        message.last_error = None
+
+    def failed(self, message: EmailOutbox, error: Exception, now: datetime):
+        message.attempts += 1
+        message.last_error = str(error)
+        if message.attempts >= settings.outbox_max_attempts:
+            message.status = "failed"
+            logger.error("outbox: giving up on message %s to %s: %s", message.id, message.recipient, error)
+        else:
+            message.next_attempt_at = now + timedelta(seconds=backoff_delay(message.attempts))
+
+    async def run(self, stop: asyncio.Event | None = None):
+        """
+        The run function drains the outbox until stopped, sleeping poll_interval whenever it is empty.
+
+        :param self: Represent the instance of the class
+        :param stop: asyncio.Event | None: Set it to stop the worker after the current batch
+        :return: None
+        :doc-author: Trelent
+        """
+        stop = stop or asyncio.Event()
+        while not stop.is_set():
+            try:
+                claimed = await self.run_once()
+            except Exception:
+                logger.exception("outbox: batch failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=settings.outbox_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+
+if __name__ == "__main__":
+    # python -m src.services.email
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(OutboxWorker().run())
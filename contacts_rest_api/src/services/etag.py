@@ -0,0 +1,45 @@
+import hashlib
+from datetime import datetime
+
+from fastapi import Response, status
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """
+    The make_etag function returns a strong entity tag derived from the parts that identify a representation,
+        e.g. the id and updated_at of a contact. Equal parts always give the same tag.
+
+    :param parts: Values that change whenever the representation does
+    :return: The quoted entity tag
+    :doc-author: Trelent
+    """
+    text = "|".join(part.isoformat() if isinstance(part, datetime) else str(part) for part in parts)
+    return f'"{hashlib.sha256(text.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    The etag_matches function tells whether an If-None-Match header matches the entity tag.
+        The comparison is weak, as RFC 9110 requires for If-None-Match: a W/ prefix is ignored.
+
+    :param if_none_match: str | None: The header, a list of entity tags or *
+    :param etag: str: The current entity tag
+    :return: True if the client already has the representation
+    :doc-author: Trelent
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
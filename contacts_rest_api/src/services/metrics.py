@@ -0,0 +1,71 @@
+import os
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# With several uvicorn workers, export PROMETHEUS_MULTIPROC_DIR (an empty directory shared by the workers)
+# before they start: every worker then writes its samples there and /metrics aggregates all of them.
+
+REQUESTS = Counter("http_requests", "HTTP requests by route template and status code",
+                   ["method", "route", "status"])
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route template",
+                            ["method", "route"],
+                            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served", multiprocess_mode="livesum")
+
+DB_POOL = Gauge("db_pool_connections", "Database pool connections by state", ["state"], multiprocess_mode="livesum")
+
+CACHE_REQUESTS = Counter("cache_requests", "Cache lookups by cache and result", ["cache", "result"])
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections", "Requests rejected by the rate limiter", ["route"])
+EMAIL_OUTBOX_PENDING = Gauge("email_outbox_pending", "Messages waiting in the email outbox",
+                             multiprocess_mode="mostrecent")
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_template(scope: dict) -> str:
+    """
+    The route_template function returns the path template of the route that served the request, e.g.
+    /api/contacts/{id}, so the labels do not grow with every id. Requests no route matched share one label.
+
+    :param scope: dict: ASGI scope of the request, after routing
+    :return: The route template
+    :doc-author: Trelent
+    """
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    REQUESTS.labels(method, route, str(status)).inc()
+    REQUEST_LATENCY.labels(method, route).observe(seconds)
+
+
+def observe_pool(pool):
+    # NullPool and StaticPool keep no counts
+    for state, method in (("checked_in", "checkedin"), ("checked_out", "checkedout"), ("overflow", "overflow")):
+        if hasattr(pool, method):
+            DB_POOL.labels(state).set(getattr(pool, method)())
+
+
+def render() -> tuple[bytes, str]:
+    """
+    The render function returns the metrics in the Prometheus text format, aggregated over all workers
+    when PROMETHEUS_MULTIPROC_DIR is set.
+
+    :return: The body and content type of the response
+    :doc-author: Trelent
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=directory)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead():
+    # drops the live gauges of this worker from the aggregate
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
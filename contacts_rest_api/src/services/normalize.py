@@ -0,0 +1,104 @@
+import re
+import unicodedata
+
+from src.conf.config import settings
+
+E164_MIN_DIGITS = 8
+E164_MAX_DIGITS = 15
+# providers that ignore dots in the local part and route every alias to one mailbox
+DOTLESS_DOMAINS = {"gmail.com": "gmail.com", "googlemail.com": "gmail.com"}
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"),
+    "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+
+
+def normalize_email(email: str | None) -> str | None:
+    """
+    The normalize_email function returns the mailbox an address delivers to, so aliases compare equal.
+        The address is lowercased and the +tag is dropped; for Gmail the dots of the local part are dropped too.
+
+    :param email: str | None: The address as entered
+    :return: The normalized address, or None if there is none
+    :doc-author: Trelent
+    """
+    if not email or "@" not in email:
+        return None
+    local, _, domain = email.strip().lower().rpartition("@")
+    local = local.split("+", 1)[0]
+    if domain in DOTLESS_DOMAINS:
+        local, domain = local.replace(".", ""), DOTLESS_DOMAINS[domain]
+    return f"{local}@{domain}" if local else None
+
+
+def normalize_phone(phone: str | None, country_code: str | None = None) -> str | None:
+    """
+    The normalize_phone function returns a phone number in the E.164 format, e.g. +380671234567.
+        Numbers starting with + or 00 are international; other numbers are national, their trunk 0
+        is replaced with the country code of the phone_default_country_code setting. Anything after
+        the number, such as an extension, is ignored.
+
+    :param phone: str | None: The number as entered
+    :param country_code: str | None: Country calling code of national numbers, without the +
+    :return: The number in E.164, or None if it is not a valid phone number
+    :doc-author: Trelent
+    """
+    if not phone:
+        return None
+    country_code = country_code or settings.phone_default_country_code
+    number = re.split(r"[^\d\s()+./-]", phone.strip(), maxsplit=1)[0]
+    digits = re.sub(r"\D", "", number)
+    if number.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country_code + digits[1:]
+    elif not digits.startswith(country_code) or len(digits) <= len(country_code) + 7:
+        digits = country_code + digits
+    if not E164_MIN_DIGITS <= len(digits) <= E164_MAX_DIGITS or digits.startswith("0"):
+        return None
+    return f"+{digits}"
+
+
+def phone_keys(phone: str | None) -> tuple[str | None, str | None]:
+    """
+    The phone_keys function returns the lookup columns of a phone number: the number in E.164 and its digits
+        reversed, so a match on the last digits of a number is a prefix match an index can serve.
+        Numbers that are not valid phone numbers still get their reversed digits.
+
+    :param phone: str | None: The number as entered
+    :return: The E.164 number and the reversed digits, either may be None
+    :doc-author: Trelent
+    """
+    e164 = normalize_phone(phone)
+    digits = e164[1:] if e164 else re.sub(r"\D", "", phone or "")
+    return e164, digits[::-1] or None
+
+
+def soundex(name: str | None) -> str | None:
+    """
+    The soundex function returns the American Soundex code of a name, e.g. R163 for both Robert and Rupert.
+        Accents are stripped first, characters other than Latin letters are ignored.
+
+    :param name: str | None: The name
+    :return: A letter and three digits, or None if the name has no Latin letters
+    :doc-author: Trelent
+    """
+    if not name:
+        return None
+    letters = [char for char in unicodedata.normalize("NFKD", name.lower()) if "a" <= char <= "z"]
+    if not letters:
+        return None
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0])
+    for char in letters[1:]:
+        digit = SOUNDEX_CODES.get(char)
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w do not separate letters with the same code, vowels do
+        if char not in "hw":
+            previous = digit
+    return code.ljust(4, "0")
@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from src.conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+# the lowest cost calibration may pick, whatever the hardware
+MIN_BCRYPT_ROUNDS = 10
+MAX_BCRYPT_ROUNDS = 18
+
+
+def build_context(rounds: int) -> CryptContext:
+    """
+    The build_context function returns the hashing policy for the given bcrypt cost.
+        Hashes made with any other cost, or with a deprecated scheme, are reported by needs_update.
+
+    :param rounds: int: The bcrypt cost, log2 of the number of rounds
+    :return: A CryptContext
+    :doc-author: Trelent
+    """
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+pwd_context = build_context(settings.password_bcrypt_rounds)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+def verify_and_update(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+def calibrate_rounds(budget_ms: float, samples: int = 3) -> tuple[int, dict[int, float]]:
+    """
+    The calibrate_rounds function measures bcrypt on this host and picks the highest cost that fits the budget.
+        Each cost doubles the hashing time, so costs are tried upwards until one takes longer than the budget.
+        The result is never below MIN_BCRYPT_ROUNDS, even on hardware too slow for the budget.
+
+    :param budget_ms: float: Target time of one hash in milliseconds
+    :param samples: int: Number of hashes timed per cost, the fastest one counts
+    :return: The chosen cost and the measured milliseconds per cost
+    :doc-author: Trelent
+    """
+    timings = {}
+    chosen = MIN_BCRYPT_ROUNDS
+    for rounds in range(MIN_BCRYPT_ROUNDS, MAX_BCRYPT_ROUNDS + 1):
+        context = build_context(rounds)
+        best = float("inf")
+        for _ in range(samples):
+            start = time.perf_counter()
+            context.hash("calibration-password")
+            best = min(best, time.perf_counter() - start)
+        timings[rounds] = best * 1000
+        if timings[rounds] > budget_ms:
+            break
+        chosen = rounds
+    return chosen, timings
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification on a bounded worker pool, off the event loop.
+        At most settings.password_hash_workers calls run at once and at most settings.password_hash_max_queue
+        wait for a worker; beyond that the request is rejected with 503 instead of queueing without bound.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if settings.password_hash_executor == "process":
+                self._executor = ProcessPoolExecutor(max_workers=settings.password_hash_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers,
+                                                    thread_name_prefix="password-hash")
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        """
+        The run function calls fn(*args) on the worker pool and waits for the result without blocking the loop.
+
+        :param self: Represent the instance of the class
+        :param fn: A module level function, so it can be sent to a process pool
+        :param args: Arguments of fn
+        :return: The result of fn
+        :doc-author: Trelent
+        """
+        if self.queued >= settings.password_hash_max_queue:
+            self.rejected += 1
+            logger.warning("password hashing queue is full (%d queued)", self.queued)
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is busy, try again",
+                                headers={"Retry-After": "1"})
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    @property
+    def running(self) -> int:
+        return min(self.in_flight, settings.password_hash_workers)
+
+    @property
+    def queued(self) -> int:
+        # the pool starts calls in submission order, so everything past the workers is waiting
+        return max(self.in_flight - settings.password_hash_workers, 0)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self.run(verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "executor": settings.password_hash_executor,
+            "workers": settings.password_hash_workers,
+            "max_queue": settings.password_hash_max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher()
+
+
+if __name__ == "__main__":
+    # python -m src.services.passwords --budget-ms 250
+    parser = argparse.ArgumentParser(description="Pick the bcrypt cost that fits a hashing latency budget on this host")
+    parser.add_argument("--budget-ms", type=float, default=settings.password_hash_budget_ms)
+    parser.add_argument("--samples", type=int, default=3)
+    arguments = parser.parse_args()
+    chosen, timings = calibrate_rounds(arguments.budget_ms, arguments.samples)
+    for rounds, elapsed in timings.items():
+        print(f"rounds {rounds:2d}: {elapsed:8.1f} ms{'  <- chosen' if rounds == chosen else ''}")
+    if timings[chosen] > arguments.budget_ms:
+        print(f"warning: even {MIN_BCRYPT_ROUNDS} rounds exceed the {arguments.budget_ms:.0f} ms budget on this host")
+    print(f"PASSWORD_BCRYPT_ROUNDS={chosen}")
@@ -0,0 +1,165 @@
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+import redis.asyncio as redis
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+current_profile: ContextVar["RequestProfile | None"] = ContextVar("current_profile", default=None)
+
+# bound parameters of an expanded IN list, whatever the paramstyle: (?, ?), ($1, $2), (%(a_1)s, %(a_2)s)
+IN_LIST = re.compile(r"\((?:\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    The statement_shape function reduces a statement to its shape: statements differing only in the length of an
+    IN list or in whitespace have the same shape. Values are already bound parameters, so they never differ.
+
+    :param statement: str: The SQL sent to the driver
+    :return: The shape of the statement
+    :doc-author: Trelent
+    """
+    return IN_LIST.sub("(...)", WHITESPACE.sub(" ", statement).strip())
+
+
+class RequestProfile:
+    """
+    Database and Redis time of one request, filled in by the engine events and ProfiledRedis.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.redis_calls = 0
+        self.redis_time = 0.0
+        self.slowest = (0.0, None)
+        self.shapes = Counter()
+
+    def record_query(self, statement: str, elapsed: float):
+        self.queries += 1
+        self.db_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+        if elapsed > self.slowest[0]:
+            self.slowest = (elapsed, statement)
+
+    def record_redis(self, elapsed: float):
+        self.redis_calls += 1
+        self.redis_time += elapsed
+
+    def repeated(self, threshold: int | None = None) -> list[tuple[str, int]]:
+        """
+        The repeated function returns the statement shapes run at least threshold times, the usual sign of N+1
+        lazy loads: one query per row of a previous result instead of one query for all of them.
+
+        :param self: Represent the instance of the class
+        :param threshold: int | None: Minimum number of runs, settings.profiler_n_plus_one_threshold by default
+        :return: The shapes and their run counts, most repeated first
+        :doc-author: Trelent
+        """
+        threshold = settings.profiler_n_plus_one_threshold if threshold is None else threshold
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def server_timing(self, total: float) -> str:
+        """
+        The server_timing function formats the profile as the value of a Server-Timing header, durations in ms.
+
+        :param self: Represent the instance of the class
+        :param total: float: Wall time of the request in seconds
+        :return: The header value
+        :doc-author: Trelent
+        """
+        metrics = [
+            f"app;dur={total * 1000:.2f}",
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+            f'redis;dur={self.redis_time * 1000:.2f};desc="{self.redis_calls} calls"',
+        ]
+        if self.queries:
+            metrics.append(f"db-slowest;dur={self.slowest[0] * 1000:.2f}")
+        repeated = self.repeated()
+        if repeated:
+            metrics.append(f'n-plus-one;desc="{len(repeated)} statements repeated up to {repeated[0][1]} times"')
+        return ", ".join(metrics)
+
+
+def sampled() -> bool:
+    rate = settings.profiler_sample_rate
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def start_profile() -> tuple[RequestProfile | None, object]:
+    profile = RequestProfile() if sampled() else None
+    return profile, current_profile.set(profile)
+
+
+def finish_profile(profile: RequestProfile | None, token, route: str, total: float) -> str:
+    """
+    The finish_profile function ends the profile of a request and returns its Server-Timing header.
+        Repeated statement shapes are logged with the route, so N+1 queries can be found in the logs.
+
+    :param profile: RequestProfile | None: The profile from start_profile, None if the request was not sampled
+    :param token: The context variable token from start_profile
+    :param route: str: Method and path of the request, for the log
+    :param total: float: Wall time of the request in seconds
+    :return: The value of the Server-Timing header
+    :doc-author: Trelent
+    """
+    current_profile.reset(token)
+    if profile is None:
+        return f"app;dur={total * 1000:.2f}"
+    for shape, count in profile.repeated():
+        logger.warning("possible N+1 in %s: statement run %d times: %s", route, count, shape)
+    if profile.slowest[1] is not None and profile.slowest[0] * 1000 >= settings.profiler_slow_query_ms:
+        logger.warning("slow query in %s: %.1f ms: %s", route, profile.slowest[0] * 1000,
+                       statement_shape(profile.slowest[1]))
+    return profile.server_timing(total)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        conn.info.setdefault("profiler_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is not None and conn.info.get("profiler_start"):
+        profile.record_query(statement, time.perf_counter() - conn.info["profiler_start"].pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def handle_error(context):
+    # a failed statement gets no after_cursor_execute, its start must not be paired with the next statement
+    conn = context.connection
+    if conn is None or not conn.info.get("profiler_start"):
+        return
+    start = conn.info["profiler_start"].pop()
+    profile = current_profile.get()
+    if profile is not None and context.statement is not None:
+        profile.record_query(context.statement, time.perf_counter() - start)
+
+
+class ProfiledRedis(redis.Redis):
+    """
+    Redis client that adds the time of every command to the profile of the current request.
+    """
+
+    async def execute_command(self, *args, **options):
+        profile = current_profile.get()
+        if profile is None:
+            return await super().execute_command(*args, **options)
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            profile.record_redis(time.perf_counter() - start)
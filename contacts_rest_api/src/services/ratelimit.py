@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request, status
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.cache import LRUCache, RedisCache
+from src.services.metrics import RATE_LIMIT_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RatePolicy:
+    times: int
+    seconds: int
+    identity: str = "ip"
+
+    @classmethod
+    def parse(cls, spec: str) -> "RatePolicy":
+        """
+        The parse function reads a policy written as "times/seconds/identity", e.g. "10/60/user".
+            The identity is "user" (the subject of the bearer token, or the IP without one) or "ip".
+
+        :param spec: str: The policy as written in settings.rate_limits
+        :return: A RatePolicy
+        :doc-author: Trelent
+        """
+        times, seconds, *identity = spec.split("/")
+        policy = cls(int(times), int(seconds), *identity)
+        if policy.times < 1 or policy.seconds < 1 or policy.identity not in ("user", "ip"):
+            raise ValueError(f"invalid rate limit policy {spec!r}")
+        return policy
+
+    @property
+    def rate(self) -> float:
+        return self.times / self.seconds
+
+
+class Bucket:
+    """
+    Token bucket of one route and identity in one worker.
+        pending counts the requests this worker let through and has not reported yet, seen the total of all
+        workers in the current window of the policy as last returned by Redis. syncing is set while a report
+        of the bucket is on its way, so requests let through meanwhile wait for the next one.
+    """
+
+    __slots__ = ("policy", "tokens", "updated", "window", "seen", "pending", "syncing")
+
+    def __init__(self, policy: RatePolicy, now: float):
+        self.policy = policy
+        self.tokens = float(policy.times)
+        self.updated = now
+        self.window = int(now // policy.seconds)
+        self.seen = 0
+        self.pending = 0
+        self.syncing = False
+
+    def take(self, now: float) -> float:
+        """
+        The take function spends one token and returns 0, or returns the seconds to wait before retrying.
+
+        :param self: Represent the instance of the class
+        :param now: float: Current time in seconds since the epoch
+        :return: 0 if the request is allowed, else the delay after which it could be
+        :doc-author: Trelent
+        """
+        policy = self.policy
+        self.tokens = min(policy.times, self.tokens + (now - self.updated) * policy.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return (1 - self.tokens) / policy.rate
+        self.tokens -= 1
+        self.pending += 1
+        return 0
+
+    def merge(self, total: int, sent: int):
+        """
+        The merge function spends the tokens used by the other workers since the last report.
+            Requests let through while the report was on its way stay pending for the next one.
+
+        :param self: Represent the instance of the class
+        :param total: int: Requests of all workers in the current window, including the ones just reported
+        :param sent: int: Number of requests of this worker in the report
+        :return: None
+        :doc-author: Trelent
+        """
+        others = total - self.seen - sent
+        self.tokens = max(self.tokens - others, -self.policy.times)
+        self.seen = total
+        self.pending -= sent
+
+
+class RateLimiter(RedisCache):
+    """
+    Hybrid rate limiter: every worker decides locally from its own token buckets and reports the requests it
+    let through to Redis in batches; the count of all workers that comes back drains the local bucket by what
+    the other workers used, so each bucket tracks the limit of the whole cluster.
+        Reports are sent every settings.rate_limit_sync_interval seconds by run, or as soon as a bucket has
+        settings.rate_limit_sync_batch unreported requests, so Redis sees one round-trip per batch instead of
+        one per request. A cluster may overshoot a limit by at most that batch per worker.
+        While Redis is unreachable the workers enforce their local buckets only.
+    """
+
+    def __init__(self, prefix: str = "ratelimit"):
+        super().__init__()
+        self.prefix = prefix
+        self.buckets = LRUCache(settings.rate_limit_local_size, ttl=3600)
+        self.allowed = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self.sync_errors = 0
+        self.degraded_until = 0.0
+        self._policies = {}
+
+    def policy(self, route: str) -> RatePolicy | None:
+        spec = settings.rate_limits.get(route)
+        if spec is None:
+            return None
+        if spec not in self._policies:
+            self._policies[spec] = RatePolicy.parse(spec)
+        return self._policies[spec]
+
+    @staticmethod
+    def identity(request: Request, policy: RatePolicy) -> str:
+        if policy.identity == "user":
+            scheme, _, token = request.headers.get("authorization", "").partition(" ")
+            email = auth_service.decode_access_token(token) if scheme.lower() == "bearer" and token else None
+            if email is not None:
+                return f"user:{email}"
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+
+    async def hit(self, route: str, identity: str, now: float | None = None) -> float:
+        """
+        The hit function counts one request of the identity on the route against the route's policy.
+
+        :param self: Represent the instance of the class
+        :param route: str: Name of the route in settings.rate_limits
+        :param identity: str: Who is making the request
+        :param now: float | None: Current time in seconds since the epoch, for tests
+        :return: 0 if the request is allowed, else the seconds to wait before retrying
+        :doc-author: Trelent
+        """
+        policy = self.policy(route)
+        if policy is None or not settings.rate_limit_enabled:
+            return 0
+        now = time.time() if now is None else now
+        key = f"{route}:{identity}"
+        bucket = self.buckets.get(key)
+        if bucket is None or bucket.policy != policy:
+            bucket = Bucket(policy, now)
+        # idle buckets are dropped once a fresh one would be full again anyway
+        self.buckets.set(key, bucket, ttl=policy.seconds * 2)
+        delay = bucket.take(now)
+        if delay:
+            self.rejected[route] += 1
+            RATE_LIMIT_REJECTIONS.labels(route).inc()
+            return delay
+        self.allowed[route] += 1
+        if bucket.pending >= settings.rate_limit_sync_batch:
+            await self.sync([key], now)
+        return 0
+
+    async def sync(self, keys: list[str] | None = None, now: float | None = None):
+        """
+        The sync function reports the unreported requests of the given buckets, or of all buckets, to Redis
+        in one pipeline and updates the buckets with the counts of all workers.
+            After a Redis failure reports are dropped and the local limits apply for
+            settings.rate_limit_retry_interval seconds before Redis is tried again.
+
+        :param self: Represent the instance of the class
+        :param keys: list[str] | None: Keys of the buckets to report, all of them by default
+        :param now: float | None: Current time in seconds since the epoch, for tests
+        :return: None
+        :doc-author: Trelent
+        """
+        now = time.time() if now is None else now
+        keys = self.buckets.keys() if keys is None else keys
+        # a bucket already on its way to Redis is left to the next sync
+        pending = [(key, bucket) for key in keys
+                   if (bucket := self.buckets.get(key)) is not None and bucket.pending and not bucket.syncing]
+        if not pending:
+            return
+        if now < self.degraded_until:
+            for _, bucket in pending:
+                bucket.pending = 0
+            return
+        # the counts reported, as more requests may be let through while the pipeline runs
+        sent = [bucket.pending for _, bucket in pending]
+        for _, bucket in pending:
+            bucket.syncing = True
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for (key, bucket), count in zip(pending, sent):
+                    window = int(now // bucket.policy.seconds)
+                    if window != bucket.window:
+                        bucket.window, bucket.seen = window, 0
+                    redis_key = f"{self.prefix}:{key}:{window}"
+                    pipe.incrby(redis_key, count)
+                    pipe.expire(redis_key, bucket.policy.seconds * 2)
+                results = await pipe.execute()
+        except RedisError as err:
+            self.sync_errors += 1
+            self.degraded_until = now + settings.rate_limit_retry_interval
+            logger.warning("rate limiter falls back to local limits: %s", err)
+            for (_, bucket), count in zip(pending, sent):
+                bucket.pending -= count
+            return
+        finally:
+            for _, bucket in pending:
+                bucket.syncing = False
+        for (_, bucket), count, total in zip(pending, sent, results[::2]):
+            bucket.merge(int(total), count)
+
+    async def run(self):
+        """
+        The run function reports the requests of this worker to Redis periodically, for the lifetime of the worker.
+
+        :param self: Represent the instance of the class
+        :return: None
+        :doc-author: Trelent
+        """
+        while True:
+            await asyncio.sleep(settings.rate_limit_sync_interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("rate limiter sync failed")
+
+    def reset(self):
+        self.buckets.clear()
+        self.allowed.clear()
+        self.rejected.clear()
+        self.sync_errors = 0
+        self.degraded_until = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.rate_limit_enabled,
+            "degraded": time.time() < self.degraded_until,
+            "buckets": len(self.buckets),
+            "sync_errors": self.sync_errors,
+            "allowed": dict(self.allowed),
+            "rejected": dict(self.rejected),
+        }
+
+
+rate_limiter = RateLimiter()
+
+
+class RateLimit:
+    """
+    Dependency applying the policy of settings.rate_limits[route]; routes without a policy are not limited.
+        Rejected requests get 429 with a Retry-After header.
+    """
+
+    def __init__(self, route: str, limiter: RateLimiter = rate_limiter):
+        self.route = route
+        self.limiter = limiter
+
+    async def __call__(self, request: Request):
+        policy = self.limiter.policy(self.route)
+        if policy is None:
+            return
+        delay = await self.limiter.hit(self.route, self.limiter.identity(request, policy))
+        if delay:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests",
+                                headers={"Retry-After": str(math.ceil(delay))})
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import hmac
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+import cloudinary
+import cloudinary.uploader
+import httpx
+
+from src.conf.config import settings
+
+
+class AvatarStorage(ABC):
+    """
+    Where avatar images are kept. Keys are relative paths such as "42/3f9c….png"; save returns the public URL.
+        Implementations never block the event loop: blocking SDKs and file I/O run on the default executor.
+    """
+
+    @abstractmethod
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+
+class LocalStorage(AvatarStorage):
+    """
+    Avatars on the local filesystem under root, served by the app under base_url.
+    """
+
+    def __init__(self, root: str | Path, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    def path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"invalid storage key {key!r}")
+        return path
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        await asyncio.to_thread(self._write, self.path(key), data)
+        return f"{self.base_url}/{key}"
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self.path(key).unlink, missing_ok=True)
+
+
+class CloudinaryStorage(AvatarStorage):
+    """
+    Avatars on Cloudinary. The SDK is configured once and its blocking calls run on the default executor.
+    """
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str, folder: str):
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+        self.folder = folder
+
+    def public_id(self, key: str) -> str:
+        return f"{self.folder}/{key.rsplit('.', 1)[0]}"
+
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        result = await asyncio.to_thread(cloudinary.uploader.upload, data, public_id=self.public_id(key),
+                                         overwrite=True)
+        return result["secure_url"]
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(cloudinary.uploader.destroy, self.public_id(key))
+
+
+def sign_v4(method: str, url: str, headers: dict, payload_hash: str, access_key: str, secret_key: str,
+            region: str, now: datetime, service: str = "s3") -> str:
+    """
+    The sign_v4 function computes the AWS Signature Version 4 Authorization header of a request.
+        Every header passed in is signed; headers must already contain host and x-amz-date.
+
+    :param method: str: HTTP method
+    :param url: str: Full URL of the request, path already percent-encoded
+    :param headers: dict: Headers to sign
+    :param payload_hash: str: Hex SHA-256 of the body, also sent as x-amz-content-sha256
+    :param access_key: str: Access key id
+    :param secret_key: str: Secret access key
+    :param region: str: Region of the endpoint
+    :param now: datetime: Time of the request, in UTC
+    :param service: str: Service name of the credential scope
+    :return: The value of the Authorization header
+    :doc-author: Trelent
+    """
+    parts = urlsplit(url)
+    day = now.strftime("%Y%m%d")
+    scope = f"{day}/{region}/{service}/aws4_request"
+    canonical_headers = {name.lower(): " ".join(str(value).split()) for name, value in headers.items()}
+    signed_headers = ";".join(sorted(canonical_headers))
+    query = "&".join(sorted(parts.query.split("&"))) if parts.query else ""
+    canonical_request = "\n".join([
+        method,
+        parts.path or "/",
+        query,
+        "".join(f"{name}:{canonical_headers[name]}\n" for name in sorted(canonical_headers)),
+        signed_headers,
+        payload_hash,
+    ])
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256",
+        now.strftime("%Y%m%dT%H%M%SZ"),
+        scope,
+        hashlib.sha256(canonical_request.encode()).hexdigest(),
+    ])
+    key = f"AWS4{secret_key}".encode()
+    for part in (day, region, service, "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    return f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, SignedHeaders={signed_headers}, Signature={signature}"
+
+
+class S3Storage(AvatarStorage):
+    """
+    Avatars in a bucket of an S3-compatible service (AWS, MinIO, R2, ...), addressed path-style.
+        Requests are signed with Signature Version 4 and sent with the async httpx client.
+    """
+
+    def __init__(self, endpoint_url: str, bucket: str, region: str, access_key: str, secret_key: str,
+                 public_url: str | None = None, transport: httpx.AsyncBaseTransport | None = None):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.public_url = (public_url or f"{self.endpoint_url}/{bucket}").rstrip("/")
+        self.transport = transport
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(transport=self.transport, timeout=30.0)
+        return self._client
+
+    def object_url(self, key: str) -> str:
+        return f"{self.endpoint_url}/{self.bucket}/{quote(key, safe='/~')}"
+
+    async def request(self, method: str, key: str, data: bytes = b"", headers: dict | None = None) -> httpx.Response:
+        url = self.object_url(key)
+        now = datetime.now(timezone.utc)
+        payload_hash = hashlib.sha256(data).hexdigest()
+        headers = {
+            "host": urlsplit(url).netloc,
+            "x-amz-content-sha256": payload_hash,
+            "x-amz-date": now.strftime("%Y%m%dT%H%M%SZ"),
+            **(headers or {}),
+        }
+        headers["authorization"] = sign_v4(method, url, headers, payload_hash, self.access_key, self.secret_key,
+                                           self.region, now)
+        response = await self.client.request(method, url, content=data, headers=headers)
+        response.raise_for_status()
+        return response
+
+    async def save(self, key: str, data: bytes, content_type: str) -> str:
+        await self.request("PUT", key, data, {"content-type": content_type})
+        return f"{self.public_url}/{quote(key, safe='/~')}"
+
+    async def delete(self, key: str):
+        await self.request("DELETE", key)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def build_storage(backend: str | None = None) -> AvatarStorage:
+    """
+    The build_storage function creates the avatar storage selected by settings.avatar_storage.
+
+    :param backend: str: "cloudinary", "local" or "s3"; defaults to settings.avatar_storage
+    :return: An AvatarStorage
+    :doc-author: Trelent
+    """
+    backend = backend or settings.avatar_storage
+    if backend == "local":
+        return LocalStorage(settings.avatar_local_dir, settings.avatar_local_url)
+    if backend == "s3":
+        return S3Storage(settings.s3_endpoint_url, settings.s3_bucket, settings.s3_region, settings.s3_access_key,
+                         settings.s3_secret_key, settings.s3_public_url)
+    if backend == "cloudinary":
+        return CloudinaryStorage(settings.cloudinary_name, str(settings.cloudinary_api_key),
+                                 settings.cloudinary_api_secret, settings.avatar_cloudinary_folder)
+    raise ValueError(f"unknown avatar storage {backend!r}")
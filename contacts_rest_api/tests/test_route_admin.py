@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import create_engine, exc
+
+from src.conf.config import settings
+from src.database.db import TimedQueuePool, pool_stats
+
+
+def test_pool_stats_forbidden(client, token):
+    response = client.get("/api/admin/pool", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403, response.text
+
+
+def test_pool_stats(client, token, user, monkeypatch):
+    monkeypatch.setattr(settings, "admin_emails", [user["email"]])
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post("/api/admin/pool/reset", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["checkouts"] == 0
+    response = client.get("/api/admin/pool", headers=headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["max_overflow"] == settings.database_max_overflow
+    assert "le_1ms" in data["wait_histogram"]
+
+
+def test_timed_pool_records_waits_and_timeouts():
+    pool_stats.reset()
+    engine = create_engine("sqlite:///./test.db", poolclass=TimedQueuePool, pool_size=1, max_overflow=0,
+                           pool_timeout=0.05)
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    engine.dispose()
+    stats = pool_stats.snapshot(engine.pool)
+    assert stats["checkouts"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["wait_max_ms"] >= 50
+    assert stats["size"] == 1
+    assert stats["checked_out"] == 0
+
+
+def test_rate_limit_stats(client, token, user, monkeypatch):
+    monkeypatch.setattr(settings, "admin_emails", [user["email"]])
+    monkeypatch.setitem(settings.rate_limits, "contacts:list", "1/60/user")
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/api/contacts/", headers=headers)
+    client.get("/api/contacts/", headers=headers)
+    response = client.get("/api/admin/ratelimits", headers=headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["rejected"] == {"contacts:list": 1}
+    assert data["degraded"] is False
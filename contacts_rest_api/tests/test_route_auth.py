@@ -1,28 +1,32 @@
+import asyncio
 from unittest.mock import MagicMock
 
-from src.database.models import User
+from src.database.models import User, EmailOutbox
 from src.conf import messages
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.cache import principal_cache
+from src.services.passwords import build_context, pwd_context
 
 
-def test_create_user(client, user, monkeypatch):
+def test_create_user(client, user, session, monkeypatch):
     mock_session = MagicMock()
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
     monkeypatch.setattr("src.database.db.get_db", mock_session)
 
     response = client.post("/api/auth/signup", json=user)
     assert response.status_code == 201, response.text
     payload = response.json()
     assert payload["email"] == user.get("email")
+    queued = session.query(EmailOutbox).filter(EmailOutbox.recipient == user.get("email")).all()
+    assert [message.status for message in queued] == ["pending"]
 
 
-def test_repeat_create_user(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def test_repeat_create_user(client, user, session):
     response = client.post("/api/auth/signup", json=user)
     assert response.status_code == 409, response.text
     payload = response.json()
     assert payload["detail"] == "Account already exists"
+    assert session.query(EmailOutbox).filter(EmailOutbox.recipient == user.get("email")).count() == 1
 
 
 def test_login_user_not_confirmed_email(client, user):
@@ -78,3 +82,44 @@ def test_login_user_with_wrong_email(client, user, session):
     payload = response.json()
     assert payload["detail"] == "Invalid email"
 
+
+
+def test_login_rehashes_outdated_password(client, user, session):
+    current_user: User = (
+        session.query(User).filter(User.email == user.get("email")).first()
+    )
+    current_user.confirmed = True
+    current_user.password = build_context(4).hash(user.get("password"))
+    session.commit()
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get("email"), "password": user.get("password")},
+    )
+    assert response.status_code == 200, response.text
+    session.refresh(current_user)
+    assert current_user.password.startswith(f"$2b${settings.password_bcrypt_rounds:02d}$")
+    assert pwd_context.verify(user.get("password"), current_user.password)
+
+
+def test_login_rate_limited(client, user, monkeypatch):
+    monkeypatch.setitem(settings.rate_limits, "auth:login", "2/60/ip")
+    data = {"username": user.get("email"), "password": "wrong-password"}
+    statuses = [client.post("/api/auth/login", data=data).status_code for _ in range(3)]
+    assert statuses == [401, 401, 429]
+
+
+def test_confirmed_email_evicts_cached_principal(client, session, fake_redis):
+    email = "confirm.me@example.com"
+    session.add(User(username="confirm", email=email, password="secret", confirmed=False))
+    session.commit()
+    principal_cache.local.set(email, "stale")
+    asyncio.run(fake_redis.set(principal_cache.key(email), "stale"))
+    token = auth_service.create_email_token({"sub": email})
+    response = client.get(f"/api/auth/confirmed_email/{token}")
+    assert response.status_code == 200, response.text
+    assert response.json()["message"] == "Email confirmed"
+    assert principal_cache.local.get(email) is None
+    assert principal_cache.key(email) not in fake_redis.data
+    assert (principal_cache.CHANNEL, email) in fake_redis.published
+    response = client.get(f"/api/auth/confirmed_email/{token}")
+    assert response.json()["message"] == "Your email is already confirmed"
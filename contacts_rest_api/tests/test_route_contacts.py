@@ -0,0 +1,556 @@
+import asyncio
+import base64
+import io
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from src.conf.config import settings
+from src.database.models import Contact, User
+from src.services.cache import contacts_cache
+from src.services.contacts_io import read_contacts
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    contacts_cache.reset_stats()
+    return contacts_cache
+
+
+@pytest.fixture(scope="module")
+def contacts(session, user, token):
+    owner = session.query(User).filter(User.email == user.get("email")).first()
+    rows = [
+        Contact(firstname=f"Name{i}", lastname=lastname, email=f"contact{i}@example.com",
+                phone=f"067000000{i}", birth=date(1990, i + 1, 10), additional_details="", user_id=owner.id)
+        for i, lastname in enumerate(["Shevchenko", "Bondar", "Kovalenko", "Bondar", "Melnyk"])
+    ]
+    session.add_all(rows)
+    session.commit()
+    return [row.id for row in rows]
+
+
+def test_get_contacts_pages(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/contacts/", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        payload = response.json()
+        assert len(payload["items"]) <= 2
+        seen.extend(item["id"] for item in payload["items"])
+        cursor = payload["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == sorted(contacts)
+
+
+def test_get_contacts_by_lastname(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    first = client.get("/api/contacts/", params={"limit": 3, "order_by": "lastname"}, headers=headers).json()
+    second = client.get(
+        "/api/contacts/",
+        params={"limit": 3, "order_by": "lastname", "cursor": first["next_cursor"]},
+        headers=headers,
+    ).json()
+    lastnames = [item["lastname"] for item in first["items"] + second["items"]]
+    assert lastnames == ["Bondar", "Bondar", "Kovalenko", "Melnyk", "Shevchenko"]
+    assert second["next_cursor"] is None
+
+
+def test_get_contacts_invalid_cursor(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    first = client.get("/api/contacts/", params={"limit": 1}, headers=headers).json()
+    response = client.get(
+        "/api/contacts/",
+        params={"order_by": "lastname", "cursor": first["next_cursor"]},
+        headers=headers,
+    )
+    assert response.status_code == 400, response.text
+    response = client.get("/api/contacts/", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400, response.text
+    # forged cursors of the right shape but with the wrong types
+    for order_by, key in (("id", [True]), ("lastname", [{"a": 1}, 1]), ("lastname", [["Bondar"], 1]),
+                          ("lastname", ["Bondar", False])):
+        raw = json.dumps({"o": order_by, "k": key}).encode()
+        cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+        response = client.get("/api/contacts/", params={"order_by": order_by, "cursor": cursor}, headers=headers)
+        assert response.status_code == 400, (key, response.text)
+
+
+def test_get_contacts_limit_is_capped(client, token, contacts, monkeypatch):
+    monkeypatch.setattr("src.routes.contacts.settings.contacts_page_max_limit", 2)
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/api/contacts/", params={"limit": 1000}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert len(response.json()["items"]) == 2
+
+
+def test_search_contacts(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/api/contacts/search", params={"q": "bond"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert [item["lastname"] for item in response.json()] == ["Bondar", "Bondar"]
+
+    response = client.get("/api/contacts/search", params={"q": "00003"}, headers=headers)
+    assert [item["phone"] for item in response.json()] == ["0670000003"]
+
+    response = client.get("/api/contacts/search", params={"q": "name4 EXAMPLE"}, headers=headers)
+    assert [item["lastname"] for item in response.json()] == ["Melnyk"]
+
+
+def test_search_contacts_short_terms(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/api/contacts/search", params={"q": "ko"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert [item["lastname"] for item in response.json()] == ["Kovalenko", "Shevchenko"]
+
+
+class FakeDate(date):
+    @classmethod
+    def today(cls):
+        return cls(2026, 12, 28)
+
+
+def test_get_birthdays_wraps_new_year(client, token, contacts, monkeypatch):
+    monkeypatch.setattr("src.routes.contacts.date", FakeDate)
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/api/contacts/birthdays", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == []
+
+    response = client.get("/api/contacts/birthdays", params={"days": 45}, headers=headers)
+    assert [item["birth"] for item in response.json()] == ["1990-01-10", "1990-02-10"]
+
+
+def test_import_contacts_csv(client, token, contacts, monkeypatch):
+    monkeypatch.setattr("src.routes.contacts.settings.contacts_import_chunk_size", 2)
+    headers = {"Authorization": f"Bearer {token}"}
+    content = (
+        "firstname,lastname,email,phone,birth,additional_details\n"
+        "Olena,Tkachenko,olena@example.com,0501112233,1991-03-04,friend\n"
+        "Petro,Boyko,not-an-email,0501112234,1992-05-06,\n"
+        "Old,Duplicate,contact0@example.com,0501112235,1993-07-08,\n"
+        "Olena,Again,olena@example.com,0501112236,1994-09-10,\n"
+        "Mykola,Lysenko,mykola@example.com,0501112237,1995-11-12,\n"
+    )
+    response = client.post(
+        "/api/contacts/import",
+        files={"file": ("contacts.csv", content, "text/csv")},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    payload = response.json()
+    assert (payload["imported"], payload["skipped"], payload["failed"]) == (2, 2, 1)
+    assert [error["row"] for error in payload["errors"]] == [2, 3, 4]
+
+    response = client.get("/api/contacts/search", params={"q": "Lysenko"}, headers=headers)
+    assert response.json()[0]["birth"] == "1995-11-12"
+
+
+def test_import_contacts_malformed_csv(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    content = (
+        "firstname,lastname,email,phone,birth,additional_details\n"
+        f"Too,Long,long@example.com,0501112238,1990-01-01,{'x' * 200000}\n"
+        "Taras,Hnatyuk,taras@example.com,0501112239,1990-01-02,\n"
+    )
+    response = client.post("/api/contacts/import", files={"file": ("contacts.csv", content)}, headers=headers)
+    assert response.status_code == 200, response.text
+    payload = response.json()
+    assert (payload["imported"], payload["failed"]) == (1, 1)
+    assert payload["errors"][0]["row"] == 1
+    assert payload["errors"][0]["detail"].startswith("Invalid CSV")
+
+
+def test_contact_email_is_unique_per_user(client, token, contacts, monkeypatch):
+    headers = {"Authorization": f"Bearer {token}"}
+    body = {"firstname": "Other", "lastname": "Lastname", "email": "contact0@example.com", "phone": "0670000099",
+            "birth": "1990-01-10", "additional_details": ""}
+    response = client.post("/api/contacts/", json=body, headers=headers)
+    assert (response.status_code, response.json()["detail"]) == (409, "Email exists!")
+    response = client.put(f"/api/contacts/{contacts[1]}", json=body, headers=headers)
+    assert (response.status_code, response.json()["detail"]) == (409, "Email exists!")
+
+    # a conflict the check cannot see, as from a concurrent request, is still a clean 409
+    async def not_found(*args):
+        return None
+
+    monkeypatch.setattr("src.routes.contacts.repo_contacts.search_contact_by_email", not_found)
+    response = client.post("/api/contacts/", json=body, headers=headers)
+    assert (response.status_code, response.json()["detail"]) == (409, "Email exists!")
+    response = client.put(f"/api/contacts/{contacts[1]}", json=body, headers=headers)
+    assert (response.status_code, response.json()["detail"]) == (409, "Email exists!")
+
+
+def test_import_contacts_parses_off_the_event_loop(client, token, contacts, monkeypatch):
+    on_loop = []
+
+    def read(stream, fmt):
+        for row in read_contacts(stream, fmt):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+            yield row
+
+    monkeypatch.setattr("src.routes.contacts.read_contacts", read)
+    headers = {"Authorization": f"Bearer {token}"}
+    content = "\n".join(json.dumps(batch_contact(number)) for number in (84, 85, 86))
+    response = client.post("/api/contacts/import", files={"file": ("people.ndjson", content)}, headers=headers)
+    assert response.json()["imported"] == 3
+    assert on_loop == [False, False, False]
+
+
+def test_import_contacts_ndjson_and_vcard(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    content = (
+        '{"firstname": "Iryna", "lastname": "Savchuk", "email": "iryna@example.com", '
+        '"phone": "0631234567", "birth": "1988-08-08"}\n'
+        "\n"
+        "{broken\n"
+    )
+    response = client.post("/api/contacts/import", files={"file": ("people.ndjson", content)}, headers=headers)
+    payload = response.json()
+    assert (payload["imported"], payload["failed"]) == (1, 1)
+    assert payload["errors"][0]["row"] == 2
+
+    content = (
+        "BEGIN:VCARD\r\nVERSION:3.0\r\nN:Hnatiuk;Andrii;;;\r\nFN:Andrii Hnatiuk\r\n"
+        "EMAIL;TYPE=INTERNET:andrii@example.com\r\nTEL;TYPE=CELL:+380671234567\r\n"
+        "BDAY:19900101\r\nNOTE:met at\r\n  the conference\r\nEND:VCARD\r\n"
+    )
+    response = client.post(
+        "/api/contacts/import", params={"format": "vcf"}, files={"file": ("card", content)}, headers=headers
+    )
+    assert response.json()["imported"] == 1
+    found = client.get("/api/contacts/search", params={"q": "Hnatiuk"}, headers=headers).json()
+    assert found[0]["additional_details"] == "met at the conference"
+    assert found[0]["birth"] == "1990-01-01"
+
+
+def test_import_contacts_unknown_format(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post("/api/contacts/import", files={"file": ("contacts.bin", b"\x00")}, headers=headers)
+    assert response.status_code == 415, response.text
+
+
+def test_export_contacts(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/api/contacts/export", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0].split(",")[:3] == ["id", "firstname", "lastname"]
+    assert len(lines) - 1 == len(client.get("/api/contacts/", params={"limit": 100}, headers=headers).json()["items"])
+
+    response = client.get("/api/contacts/export", params={"format": "ndjson"}, headers=headers)
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["id"] for record in records] == sorted(record["id"] for record in records)
+    assert records[0]["birth"] == "1990-01-10"
+
+    response = client.get("/api/contacts/export", params={"format": "vcf"}, headers=headers)
+    rows = list(read_contacts(io.BytesIO(response.content), "vcf"))
+    assert len(rows) == len(records)
+    assert rows[0].data["email"] == records[0]["email"]
+
+
+def test_contacts_cache_hit_and_invalidation(client, token, contacts, cache):
+    headers = {"Authorization": f"Bearer {token}"}
+    first = client.get(f"/api/contacts/search_by_id/{contacts[0]}", headers=headers)
+    assert first.status_code == 200, first.text
+    second = client.get(f"/api/contacts/search_by_id/{contacts[0]}", headers=headers)
+    assert second.json() == first.json()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    body = {"firstname": "New", "lastname": "Contact", "email": "new.contact@example.com", "phone": "0671112233",
+            "birth": "1995-05-05", "additional_details": ""}
+    created = client.post("/api/contacts/", json=body, headers=headers)
+    assert created.status_code == 201, created.text
+    found = client.get("/api/contacts/search", params={"q": "new.contact"}, headers=headers).json()
+    assert [item["id"] for item in found] == [created.json()["id"]]
+
+    response = client.delete(f"/api/contacts/{created.json()['id']}", headers=headers)
+    assert response.status_code == 204, response.text
+    assert client.get("/api/contacts/search", params={"q": "new.contact"}, headers=headers).json() == []
+    missing = client.get(f"/api/contacts/search_by_id/{created.json()['id']}", headers=headers)
+    assert missing.status_code == 404
+
+
+def test_contacts_cache_disabled(client, token, contacts, cache, monkeypatch):
+    monkeypatch.setattr("src.conf.config.settings.contacts_cache_enabled", False)
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(2):
+        assert client.get("/api/contacts/", headers=headers).status_code == 200
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert not [key for key in cache.client.data if key.startswith("contacts:")]
+
+
+def test_get_contacts_rate_limited_per_user(client, token, monkeypatch):
+    monkeypatch.setitem(settings.rate_limits, "contacts:list", "3/60/user")
+    headers = {"Authorization": f"Bearer {token}"}
+    statuses = [client.get("/api/contacts/", headers=headers).status_code for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    response = client.get("/api/contacts/", headers=headers)
+    assert int(response.headers["Retry-After"]) > 0
+    # anonymous callers are counted per IP, separately from the user
+    assert client.get("/api/contacts/").status_code == 401
+
+
+def test_server_timing(client, token, contacts, monkeypatch):
+    monkeypatch.setattr("src.services.profiler.settings.profiler_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "contacts_cache_enabled", False)
+    response = client.get("/api/contacts/search", params={"q": "bond"},
+                          headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    metrics = {item.split(";")[0]: item for item in response.headers["Server-Timing"].split(", ")}
+    assert set(metrics) >= {"app", "db", "redis", "db-slowest"}
+    assert 'desc="0 queries"' not in metrics["db"]
+
+
+def batch_contact(number: int, **fields) -> dict:
+    return {"firstname": "Batch", "lastname": f"Contact{number}", "email": f"batch{number}@example.com",
+            "phone": f"06799900{number:02d}", "birth": "1991-03-04", "additional_details": "", **fields}
+
+
+def test_batch_contacts(client, token, contacts, monkeypatch):
+    monkeypatch.setattr("src.services.profiler.settings.profiler_sample_rate", 1.0)
+    headers = {"Authorization": f"Bearer {token}"}
+    created = client.post("/api/contacts/batch", headers=headers, json={
+        "operations": [{"op": "create", "contact": batch_contact(number)} for number in range(40)]})
+    assert created.status_code == 200, created.text
+    ids = [result["id"] for result in created.json()["results"]]
+    assert [result["status"] for result in created.json()["results"]] == [201] * 40
+    assert created.json()["results"][7]["contact"]["email"] == "batch7@example.com"
+
+    operations = [{"op": "update", "id": id, "contact": batch_contact(number, birth="1992-12-31")}
+                  for number, id in enumerate(ids[:20])]
+    operations += [{"op": "delete", "id": id} for id in ids[20:]]
+    operations += [
+        {"op": "create", "contact": batch_contact(50)},
+        {"op": "create", "contact": batch_contact(51, email="batch0@example.com")},
+        {"op": "update", "id": ids[1], "contact": batch_contact(1, email="batch50@example.com")},
+        {"op": "delete", "id": ids[30]},
+        {"op": "delete", "id": contacts[0] + 100000},
+        {"op": "update", "id": ids[2]},
+        # the email of a contact deleted earlier in the batch is free again
+        {"op": "create", "contact": batch_contact(52, email="batch25@example.com")},
+    ]
+    response = client.post("/api/contacts/batch", headers=headers, json={"operations": operations})
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert response.json()["applied"] is True
+    assert [result["status"] for result in results[40:]] == [201, 409, 409, 404, 404, 422, 201]
+    assert results[0]["contact"]["birth"] == "1992-12-31"
+    # a whole batch costs the same few queries as a small one
+    db_timing = [item for item in response.headers["Server-Timing"].split(", ") if item.startswith("db;")][0]
+    assert int(db_timing.split('desc="')[1].split()[0]) <= 10
+
+    birthdays = client.get("/api/contacts/search", params={"q": "batch0@example.com"}, headers=headers).json()
+    assert [item["birth"] for item in birthdays] == ["1992-12-31"]
+    assert client.get(f"/api/contacts/search_by_id/{ids[25]}", headers=headers).status_code == 404
+    assert client.get(f"/api/contacts/search_by_id/{results[46]['id']}", headers=headers).json()["email"] == \
+        "batch25@example.com"
+
+
+def test_batch_contacts_atomic(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post("/api/contacts/batch", headers=headers, json={"atomic": True, "operations": [
+        {"op": "create", "contact": batch_contact(60)},
+        {"op": "delete", "id": contacts[0] + 100000},
+    ]})
+    assert response.status_code == 200, response.text
+    assert response.json()["applied"] is False
+    assert [result["status"] for result in response.json()["results"]] == [424, 404]
+    assert client.get("/api/contacts/search", params={"q": "batch60"}, headers=headers).json() == []
+
+
+def test_batch_contacts_too_large(client, token, monkeypatch):
+    monkeypatch.setattr(settings, "contacts_batch_max_operations", 2)
+    response = client.post("/api/contacts/batch", headers={"Authorization": f"Bearer {token}"},
+                           json={"operations": [{"op": "delete", "id": 1}] * 3})
+    assert response.status_code == 413
+
+
+def test_duplicates_and_merge(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    operations = [{"op": "create", "contact": body} for body in (
+        {"firstname": "Taras", "lastname": "Zhuravel", "email": "taras.zh@ukr.net", "phone": "+380 50 765 4321",
+         "birth": "1980-02-02", "additional_details": "work"},
+        {"firstname": "T", "lastname": "Zhuravel", "email": "TARAS.ZH+home@ukr.net", "phone": "n/a",
+         "birth": "1980-02-02", "additional_details": "home"},
+        {"firstname": "Taras", "lastname": "Other", "email": "tz@example.com", "phone": "0507654321",
+         "birth": "1980-02-02", "additional_details": "work"},
+    )]
+    created = client.post("/api/contacts/batch", headers=headers, json={"operations": operations})
+    ids = [result["id"] for result in created.json()["results"]]
+
+    response = client.get("/api/contacts/duplicates", headers=headers)
+    assert response.status_code == 200, response.text
+    group = next(group for group in response.json() if ids[0] in [c["id"] for c in group["contacts"]])
+    assert [contact["id"] for contact in group["contacts"]] == ids
+    assert group["reasons"] == ["email", "name", "phone"]
+
+    merged = client.post("/api/contacts/merge", headers=headers,
+                         json={"primary_id": ids[1], "duplicate_ids": [ids[0], ids[2]]})
+    assert merged.status_code == 200, merged.text
+    assert merged.json()["email"] == "TARAS.ZH+home@ukr.net"
+    assert merged.json()["additional_details"] == "home; work"
+    for id in ids[::2]:
+        assert client.get(f"/api/contacts/search_by_id/{id}", headers=headers).status_code == 404
+
+    missing = client.post("/api/contacts/merge", headers=headers, json={"primary_id": ids[1], "duplicate_ids": [ids[0]]})
+    assert missing.status_code == 404
+    itself = client.post("/api/contacts/merge", headers=headers, json={"primary_id": ids[1], "duplicate_ids": [ids[1]]})
+    assert itself.status_code == 400
+
+
+def test_get_contacts_by_phone(client, token, contacts, cache):
+    headers = {"Authorization": f"Bearer {token}"}
+    body = {"firstname": "Caller", "lastname": "Id", "email": "caller.id@example.com", "phone": "+380 (93) 555-12-34",
+            "birth": "1990-01-01", "additional_details": ""}
+    imported = client.post("/api/contacts/batch", headers=headers, json={"operations": [
+        {"op": "create", "contact": {**body, "email": "caller.two@example.com", "phone": "0935551234"}}]})
+    created = client.post("/api/contacts/", json=body, headers=headers)
+    ids = [imported.json()["results"][0]["id"], created.json()["id"]]
+
+    for number in ("+380935551234", "0935551234", "093-555-12-34", "5551234"):
+        response = client.get(f"/api/contacts/by_phone/{number}", headers=headers)
+        assert response.status_code == 200, response.text
+        assert [contact["id"] for contact in response.json()] == ids, number
+    assert client.get("/api/contacts/by_phone/1234", headers=headers).json() == []
+    hits = cache.hits
+    client.get("/api/contacts/by_phone/093 555 1234", headers=headers)
+    assert cache.hits == hits + 1
+
+    client.delete(f"/api/contacts/{ids[1]}", headers=headers)
+    response = client.get("/api/contacts/by_phone/+380935551234", headers=headers)
+    assert [contact["id"] for contact in response.json()] == ids[:1]
+
+
+def test_contact_etag(client, token, contacts, monkeypatch):
+    monkeypatch.setattr("src.services.profiler.settings.profiler_sample_rate", 1.0)
+    headers = {"Authorization": f"Bearer {token}"}
+    body = {"firstname": "Etag", "lastname": "Contact", "email": "etag@example.com", "phone": "0671110000",
+            "birth": "1990-01-01", "additional_details": ""}
+    id = client.post("/api/contacts/", json=body, headers=headers).json()["id"]
+
+    first = client.get(f"/api/contacts/search_by_id/{id}", headers=headers)
+    etag = first.headers["ETag"]
+    assert etag.startswith('"') and first.headers["Cache-Control"] == "private, no-cache"
+    cached = client.get(f"/api/contacts/search_by_id/{id}", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["ETag"] == etag
+    again = client.get(f"/api/contacts/search_by_id/{id}", headers={**headers, "If-None-Match": f"W/{etag}"})
+    assert again.status_code == 304
+    assert 'desc="0 queries"' in again.headers["Server-Timing"]
+
+    client.put(f"/api/contacts/{id}", json={**body, "additional_details": "changed"}, headers=headers)
+    changed = client.get(f"/api/contacts/search_by_id/{id}", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.json()["additional_details"] == "changed"
+
+
+def test_contacts_list_etag(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    first = client.get("/api/contacts/", params={"limit": 2}, headers=headers)
+    etag = first.headers["ETag"]
+    cached = client.get("/api/contacts/", params={"limit": 2}, headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    other_page = client.get("/api/contacts/", params={"limit": 3}, headers={**headers, "If-None-Match": etag})
+    assert other_page.status_code == 200
+
+    client.put(f"/api/contacts/{contacts[4]}", headers=headers, json={
+        "firstname": "Name4", "lastname": "Melnyk", "email": "contact4@example.com", "phone": "0670000004",
+        "birth": "1990-05-10", "additional_details": "etag"})
+    changed = client.get("/api/contacts/", params={"limit": 2}, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+
+def sync(client, headers, since=None, limit=1000):
+    params = {"limit": limit}
+    if since:
+        params["since"] = since
+    response = client.get("/api/contacts/changes", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_contacts_changes(client, token, contacts, monkeypatch):
+    monkeypatch.setattr(settings, "contacts_sync_lag", 0)
+    headers = {"Authorization": f"Bearer {token}"}
+    first = sync(client, headers)
+    assert not first["has_more"] and first["deleted"] == []
+    listed = client.get("/api/contacts/export", params={"format": "ndjson"}, headers=headers)
+    assert sorted(contact["id"] for contact in first["changed"]) == \
+        sorted(json.loads(line)["id"] for line in listed.text.splitlines())
+    assert sync(client, headers, first["next_cursor"])["changed"] == []
+
+    operations = [{"op": "create", "contact": batch_contact(number)} for number in (70, 71, 72)]
+    ids = [result["id"] for result in
+           client.post("/api/contacts/batch", headers=headers, json={"operations": operations}).json()["results"]]
+    client.put(f"/api/contacts/{ids[0]}", json=batch_contact(70, additional_details="synced"), headers=headers)
+    client.delete(f"/api/contacts/{ids[1]}", headers=headers)
+    client.post("/api/contacts/batch", headers=headers, json={"operations": [{"op": "delete", "id": ids[2]}]})
+
+    page = sync(client, headers, first["next_cursor"], limit=1)
+    assert page["has_more"] is True
+    assert [contact["id"] for contact in page["changed"]] == [ids[0]]
+    assert page["changed"][0]["additional_details"] == "synced"
+    assert page["deleted"] == [ids[1]]
+    rest = sync(client, headers, page["next_cursor"], limit=1)
+    assert (rest["changed"], rest["deleted"], rest["has_more"]) == ([], [ids[2]], False)
+    assert sync(client, headers, rest["next_cursor"])["deleted"] == []
+
+    response = client.get("/api/contacts/changes", params={"since": "bogus"}, headers=headers)
+    assert response.status_code == 400
+
+
+class SkewedDatetime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return datetime.utcnow() + timedelta(hours=3)
+
+    @classmethod
+    def fromisoformat(cls, value):
+        return datetime.fromisoformat(value)
+
+
+def test_contacts_changes_with_skewed_app_clock(client, token, contacts, monkeypatch):
+    # the app server runs hours ahead of the database, which stamps the rows
+    monkeypatch.setattr("src.repository.contacts.datetime", SkewedDatetime)
+    headers = {"Authorization": f"Bearer {token}"}
+    created = client.post("/api/contacts/", json=batch_contact(81), headers=headers).json()
+    cursor = sync(client, headers)["next_cursor"]
+    client.delete(f"/api/contacts/{created['id']}", headers=headers)
+    assert created["id"] in sync(client, headers, cursor)["deleted"]
+
+
+def test_imported_and_batch_created_contacts_use_database_clock(client, token, session, contacts, monkeypatch):
+    monkeypatch.setattr("src.repository.contacts.datetime", SkewedDatetime)
+    headers = {"Authorization": f"Bearer {token}"}
+    content = json.dumps(batch_contact(82))
+    client.post("/api/contacts/import", files={"file": ("people.ndjson", content)}, headers=headers)
+    operations = [{"op": "create", "contact": batch_contact(83)}]
+    client.post("/api/contacts/batch", headers=headers, json={"operations": operations})
+    for email in ("batch82@example.com", "batch83@example.com"):
+        query = session.query(Contact.created_at, Contact.updated_at).filter(Contact.email == email)
+        created_at, updated_at = query.one()
+        assert created_at == updated_at < datetime.utcnow() + timedelta(minutes=1)
+
+
+def test_contacts_changes_resends_recent_writes(client, token, contacts):
+    headers = {"Authorization": f"Bearer {token}"}
+    cursor = sync(client, headers)["next_cursor"]
+    created = client.post("/api/contacts/", json=batch_contact(80), headers=headers).json()
+    first = sync(client, headers, cursor)
+    assert created["id"] in [contact["id"] for contact in first["changed"]]
+    # within the commit lag the same change comes again, applying it twice is harmless
+    again = sync(client, headers, first["next_cursor"])
+    assert created["id"] in [contact["id"] for contact in again["changed"]]
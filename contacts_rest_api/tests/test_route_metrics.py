@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+
+from prometheus_client.parser import text_string_to_metric_families
+
+from src.conf.config import settings
+from src.services import metrics
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def samples(text: str) -> dict:
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+
+
+def value(text: str, name: str, **labels) -> float:
+    return samples(text).get((name, tuple(sorted(labels.items()))), 0.0)
+
+
+def test_metrics(client, token, monkeypatch):
+    monkeypatch.setitem(settings.rate_limits, "contacts:list", "1/60/user")
+    before = client.get("/metrics").text
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/contacts/", headers=headers).status_code == 200
+    assert client.get("/api/contacts/", headers=headers).status_code == 429
+    assert client.get("/api/contacts/search_by_id/12345", headers=headers).status_code == 404
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    after = response.text
+
+    def delta(name, **labels):
+        return value(after, name, **labels) - value(before, name, **labels)
+
+    assert delta("http_requests_total", method="GET", route="/api/contacts/", status="200") == 1
+    assert delta("http_requests_total", method="GET", route="/api/contacts/", status="429") == 1
+    assert delta("http_requests_total", method="GET", route="/api/contacts/search_by_id/{id}", status="404") == 1
+    assert delta("http_request_duration_seconds_count", method="GET", route="/api/contacts/") == 2
+    assert delta("rate_limit_rejections_total", route="contacts:list") == 1
+    # the rejected request never reaches authentication
+    assert sum(delta("cache_requests_total", cache="principal", result=result)
+               for result in ("local_hit", "redis_hit", "miss")) == 2
+    assert value(after, "http_requests_in_progress") == 1
+    assert ("email_outbox_pending", ()) in samples(after)
+
+
+def test_metrics_unmatched_route(client):
+    before = client.get("/metrics").text
+    client.get("/no/such/path/1")
+    client.get("/no/such/path/2")
+    after = client.get("/metrics").text
+    assert value(after, "http_requests_total", method="GET", route="unmatched", status="404") - \
+        value(before, "http_requests_total", method="GET", route="unmatched", status="404") == 2
+
+
+def test_multiprocess_aggregation(tmp_path, monkeypatch):
+    script = (
+        "from src.services import metrics\n"
+        "metrics.observe_request('GET', '/api/contacts/', 200, 0.01)\n"
+        "metrics.IN_PROGRESS.inc()\n"
+    )
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, check=True)
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    body, _ = metrics.render()
+    text = body.decode()
+    assert value(text, "http_requests_total", method="GET", route="/api/contacts/", status="200") == 2
+    assert value(text, "http_request_duration_seconds_count", method="GET", route="/api/contacts/") == 2
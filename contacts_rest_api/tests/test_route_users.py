@@ -0,0 +1,102 @@
+import io
+
+import pytest
+from PIL import Image
+
+from src.database.models import User
+from src.services.avatars import avatar_key, avatar_service
+from src.services.storage import LocalStorage
+
+
+def image_bytes(color=(200, 30, 30), size=(640, 480)):
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, format="JPEG")
+    return output.getvalue()
+
+
+class CountingStorage(LocalStorage):
+    def __init__(self, root):
+        super().__init__(root, "/avatars")
+        self.saved = []
+        self.deleted = []
+
+    async def save(self, key, data, content_type):
+        self.saved.append(key)
+        return await super().save(key, data, content_type)
+
+    async def delete(self, key):
+        self.deleted.append(key)
+        await super().delete(key)
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = CountingStorage(tmp_path)
+    monkeypatch.setattr(avatar_service, "_storage", storage)
+    return storage
+
+
+def upload(client, token, data, name="avatar.jpg"):
+    return client.patch("/api/users/avatar", files={"file": (name, data, "image/jpeg")},
+                        headers={"Authorization": f"Bearer {token}"})
+
+
+def test_update_avatar(client, token, session, storage, tmp_path):
+    data = image_bytes()
+    response = upload(client, token, data)
+    assert response.status_code == 200, response.text
+    user = session.query(User).filter(User.email == "deadpool@example.com").first()
+    session.refresh(user)
+    key = avatar_key(user.id, user.avatar_hash)
+    assert response.json()["avatar"] == f"/avatars/{key}"
+    assert storage.saved == [key]
+    thumbnail = Image.open(tmp_path / key)
+    assert thumbnail.size == (250, 250)
+
+
+def test_update_avatar_same_content_is_skipped(client, token, storage):
+    response = upload(client, token, image_bytes())
+    assert response.status_code == 200, response.text
+    assert storage.saved == []
+
+
+def test_update_avatar_replaces_previous(client, token, session, storage):
+    user = session.query(User).filter(User.email == "deadpool@example.com").first()
+    session.refresh(user)
+    previous = avatar_key(user.id, user.avatar_hash)
+    response = upload(client, token, image_bytes(color=(30, 200, 30)))
+    assert response.status_code == 200, response.text
+    assert storage.deleted == [previous]
+    assert response.json()["avatar"] == f"/avatars/{storage.saved[0]}"
+
+
+def test_update_avatar_too_large(client, token, storage, monkeypatch):
+    monkeypatch.setattr("src.services.avatars.settings.avatar_max_bytes", 1024)
+    response = upload(client, token, image_bytes(size=(2000, 2000)))
+    assert response.status_code == 413, response.text
+    assert storage.saved == []
+
+
+def test_update_avatar_too_large_is_refused_before_parsing(client, token, storage, monkeypatch):
+    monkeypatch.setattr("src.services.avatars.settings.avatar_max_bytes", 1024)
+
+    async def store(*args):
+        raise AssertionError("the body should not reach the route")
+
+    monkeypatch.setattr(avatar_service, "store", store)
+    response = upload(client, token, image_bytes(size=(2000, 2000)))
+    assert response.status_code == 413, response.text
+
+    # without a Content-Length the body is counted as it is received
+    chunks = iter([b"--x\r\n", b"0" * 64 * 1024, b"\r\n--x--\r\n"])
+    response = client.patch("/api/users/avatar", content=chunks,
+                            headers={"Authorization": f"Bearer {token}",
+                                     "Content-Type": "multipart/form-data; boundary=x"})
+    assert response.status_code == 413, response.text
+    assert storage.saved == []
+
+
+def test_update_avatar_not_an_image(client, token, storage):
+    response = upload(client, token, b"definitely not a picture", name="avatar.txt")
+    assert response.status_code == 400, response.text
+    assert storage.saved == []
@@ -7,7 +7,7 @@ from datetime import date
 import unittest
 from unittest.mock import MagicMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User, Contact
 from src.schemas import ContactBase, ContactResponse
@@ -21,14 +21,16 @@ from src.repository.contacts import (
     search_contacts_by_lastname,
     search_contacts_by_firstname,
     search_contact_by_email,
-    get_birthdays
+    get_birthdays,
+    decode_cursor,
 )
 
 
 
 class TestContacts(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
         self.user = User(id=1, email="test@test.com")
 
     async def test_create_contact(self):
@@ -101,16 +103,26 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter_by().all.return_value = contacts
-        result = await get_contacts(self.session, self.user)
+        self.session.execute.return_value.scalars.return_value.all.return_value = contacts
+        result, next_cursor = await get_contacts(self.session, self.user)
         self.assertEqual(result, contacts)
+        self.assertIsNone(next_cursor)
+
+    async def test_get_contacts_next_cursor(self):
+        contacts = [Contact(id=1, lastname="A"), Contact(id=2, lastname="B"), Contact(id=3, lastname="C")]
+        self.session.execute.return_value.scalars.return_value.all.return_value = contacts
+        result, next_cursor = await get_contacts(self.session, self.user, limit=2, order_by="lastname")
+        self.assertEqual(result, contacts[:2])
+        self.assertEqual(decode_cursor(next_cursor, "lastname"), ["B", 2])
+        with self.assertRaises(ValueError):
+            decode_cursor(next_cursor, "id")
 
     async def test_get_contact_by_id(self):
         contact_id = 1
         user_id = self.user.id
         expected_contact = Contact(id=contact_id, user_id=user_id)
 
-        self.session.query(Contact).filter_by(id=contact_id, user_id=user_id).first.return_value = expected_contact
+        self.session.execute.return_value.scalar_one_or_none.return_value = expected_contact
         result = await get_contact_by_id(contact_id, user_id, self.session)
         self.assertEqual(result, expected_contact)
 
@@ -121,7 +133,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         email = "test@example.com"
         expected_contact = Contact(id=contact_id, user_id=user_id, lastname=lastname, email=email)
 
-        self.session.query(Contact).filter_by(lastname=lastname, email=email, user_id=user_id).first.return_value = expected_contact
+        self.session.execute.return_value.scalar_one_or_none.return_value = expected_contact
         result = await get_contact_by_id(contact_id, user_id, self.session)
         self.assertEqual(result, expected_contact)
     
@@ -131,7 +143,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         lastname = 'Someone'
         expected_contact = Contact(id=contact_id, user_id=user_id, lastname=lastname)
 
-        self.session.query(Contact).filter_by(lastname=lastname, user_id=user_id).first.return_value = expected_contact
+        self.session.execute.return_value.scalar_one_or_none.return_value = expected_contact
         result = await get_contact_by_id(contact_id, user_id, self.session)
         self.assertEqual(result, expected_contact)
 
@@ -141,7 +153,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         firstname = 'Someone'
         expected_contact = Contact(id=contact_id, user_id=user_id, firstname=firstname)
 
-        self.session.query(Contact).filter_by(firstname=firstname, user_id=user_id).first.return_value = expected_contact
+        self.session.execute.return_value.scalar_one_or_none.return_value = expected_contact
         result = await get_contact_by_id(contact_id, user_id, self.session)
         self.assertEqual(result, expected_contact)
 
@@ -151,7 +163,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         email = "test@example.com"
         expected_contact = Contact(id=contact_id, user_id=user_id, email=email)
 
-        self.session.query(Contact).filter_by(email=email, user_id=user_id).first.return_value = expected_contact
+        self.session.execute.return_value.scalar_one_or_none.return_value = expected_contact
         result = await get_contact_by_id(contact_id, user_id, self.session)
         self.assertEqual(result, expected_contact)
 
@@ -163,7 +175,7 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         end_date = date(2000, 1, 1)
         expected_contact = Contact(id=contact_id, user_id=user_id, birth=birth)
 
-        self.session.query(Contact).filter_by(birth >= start_date, birth <= end_date, user_id=user_id).first.return_value = expected_contact
+        self.session.execute.return_value.scalar_one_or_none.return_value = expected_contact
         result = await get_contact_by_id(contact_id, user_id, self.session)
         self.assertEqual(result, expected_contact)
 
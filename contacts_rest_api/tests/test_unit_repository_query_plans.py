@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.bench_queries import build_cases, compare, run_cases, sqlite_seq_scans
+from benchmarks.seed_data import seed
+
+
+def test_sqlite_seq_scans():
+    assert sqlite_seq_scans(["SCAN contacts"]) == ["contacts"]
+    assert sqlite_seq_scans(["SEARCH contacts USING INDEX ix_contacts_user_id_id (user_id=?)",
+                             "SCAN contacts USING COVERING INDEX ix_contacts_user_id_email",
+                             "SCAN contacts_fts VIRTUAL TABLE INDEX 0:M5",
+                             "SCAN 50 CONSTANT ROWS"]) == []
+
+
+def test_compare_reports_new_scans_and_slowdowns():
+    baseline = {
+        "contacts.get_contacts": {"median_ms": 1.0, "statements": [{"sql": "SELECT", "plan": [], "seq_scans": []}]},
+        "users.get_user_by_email": {"median_ms": 1.0, "statements": []},
+    }
+    report = {
+        "contacts.get_contacts": {"median_ms": 2.5,
+                                  "statements": [{"sql": "SELECT", "plan": ["SCAN contacts"],
+                                                  "seq_scans": ["contacts"]}]},
+        "users.get_user_by_email": {"median_ms": 10.0, "statements": []},
+        "contacts.new_function": {"median_ms": 99.0, "statements": []},
+    }
+    failures = compare(report, baseline, tolerance=1.0, slack_ms=1.0)
+    assert len(failures) == 2
+    assert failures[0].startswith("contacts.get_contacts: sequential scan of contacts")
+    assert failures[1].startswith("users.get_user_by_email: median 10.00 ms")
+
+
+def test_repository_queries_use_indexes(tmp_path):
+    # plans of a real database, which MagicMock sessions cannot show
+    path = os.path.join(tmp_path, "plans.db")
+    seed(f"sqlite:///{path}", users=3, contacts=50)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    async def run():
+        try:
+            return await run_cases(engine, build_cases(), repeat=1)
+        finally:
+            await engine.dispose()
+
+    report = asyncio.run(run())
+    scans = {name: statement["plan"] for name, case in report.items() for statement in case["statements"]
+             if statement["seq_scans"]}
+    assert scans == {}
+    assert all(case["statements"] for case in report.values())
@@ -4,9 +4,9 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, AsyncMock, patch
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User, Contact
 from src.schemas import UserBase, UserResponse
@@ -20,14 +20,15 @@ from src.repository.users import (
 
 class TestUser(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
         self.user = User(id=1, email="test@test.com")
 
     async def test_get_user_by_email(self):
         email = "test@example.com"
         expected_user = User(email=email)
 
-        self.session.query(User).filter_by(email=email).first.return_value = expected_user
+        self.session.execute.return_value.scalar_one_or_none.return_value = expected_user
         result = await get_user_by_email(email, self.session)
         self.assertEqual(result, expected_user)
     
@@ -50,7 +51,7 @@ class TestUser(unittest.IsolatedAsyncioTestCase):
     async def test_update_token(self):
         user = User(id=1, username="Someone", email="test@example.com", password="testpassword")
 
-        self.session.commit = MagicMock()
+        self.session.commit = AsyncMock()
         new_refresh_token = "new_token"
 
         await update_token(user, new_refresh_token, self.session)
@@ -0,0 +1,44 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from unittest.mock import patch
+
+from jose import jwt
+
+from src.services.auth import Auth
+from src.services.cache import LRUCache
+
+
+class TestVerifiedTokens(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.auth = Auth()
+        self.auth.verified_tokens = LRUCache(maxsize=10, ttl=60)
+
+    async def test_access_token_decoded_once(self):
+        token = await self.auth.create_access_token(data={"sub": "deadpool@example.com"})
+        with patch("src.services.auth.jwt.decode", wraps=jwt.decode) as decode:
+            self.assertEqual(self.auth.decode_access_token(token), "deadpool@example.com")
+            self.assertEqual(self.auth.decode_access_token(token), "deadpool@example.com")
+        self.assertEqual(decode.call_count, 1)
+
+    async def test_refresh_token_rejected(self):
+        token = await self.auth.create_refresh_token(data={"sub": "deadpool@example.com"})
+        self.assertIsNone(self.auth.decode_access_token(token))
+        self.assertEqual(len(self.auth.verified_tokens), 0)
+
+    async def test_expired_token_rejected(self):
+        token = await self.auth.create_access_token(data={"sub": "deadpool@example.com"}, expires_delta=-1)
+        self.assertIsNone(self.auth.decode_access_token(token))
+        self.assertEqual(len(self.auth.verified_tokens), 0)
+
+    async def test_cached_token_expires(self):
+        token = await self.auth.create_access_token(data={"sub": "deadpool@example.com"}, expires_delta=60)
+        self.assertIsNotNone(self.auth.decode_access_token(token))
+        ((_, expires),) = self.auth.verified_tokens._data.values()
+        self.assertIsNone(self.auth.verified_tokens.get(next(iter(self.auth.verified_tokens._data)), now=expires))
+
+if __name__ == '__main__':
+    unittest.main()
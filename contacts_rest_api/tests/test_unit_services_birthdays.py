@@ -0,0 +1,70 @@
+import asyncio
+import json
+from datetime import date
+
+import pytest
+
+from src.database.models import Contact, EmailOutbox, JobCheckpoint, User
+from src.services.birthdays import DIGEST_JOB, next_birthday, run_birthday_digest
+from tests.conftest import AsyncTestingSessionLocal
+
+TODAY = date(2026, 12, 28)
+
+
+@pytest.fixture
+def people(session):
+    session.query(EmailOutbox).delete()
+    session.query(JobCheckpoint).delete()
+    users = [User(username=f"digest{i}", email=f"digest{i}@example.com", password="x", confirmed=True)
+             for i in range(3)]
+    session.add_all(users)
+    session.commit()
+    births = {
+        0: [date(1990, 12, 30), date(1985, 1, 2), date(1970, 6, 1)],
+        1: [date(2000, 3, 3)],
+        2: [date(1999, 12, 28)],
+    }
+    for i, user in enumerate(users):
+        session.add_all(Contact(firstname=f"F{i}{j}", lastname=f"L{i}{j}", email=f"c{i}{j}@digest.example",
+                                birth=birth, user_id=user.id) for j, birth in enumerate(births[i]))
+    session.commit()
+    yield users
+    for user in users:
+        session.query(Contact).filter(Contact.user_id == user.id).delete()
+        session.delete(user)
+    session.query(EmailOutbox).delete()
+    session.query(JobCheckpoint).delete()
+    session.commit()
+
+
+def digests(session):
+    rows = session.query(EmailOutbox).filter(EmailOutbox.template == "birthday_digest.html").order_by(EmailOutbox.id)
+    return {row.recipient: json.loads(row.context)["contacts"] for row in rows}
+
+
+def test_digest_per_user(session, people):
+    stats = asyncio.run(run_birthday_digest(TODAY, 7, AsyncTestingSessionLocal, commit_every=1, batch_size=1))
+    assert (stats["users"], stats["contacts"]) == (2, 3)
+    queued = digests(session)
+    assert list(queued) == ["digest0@example.com", "digest2@example.com"]
+    assert [(item["date"], item["in_days"]) for item in queued["digest0@example.com"]] == \
+        [("2026-12-30", 2), ("2027-01-02", 5)]
+    assert queued["digest2@example.com"][0]["in_days"] == 0
+
+    again = asyncio.run(run_birthday_digest(TODAY, 7, AsyncTestingSessionLocal))
+    assert again["skipped"]
+    assert len(digests(session)) == 2
+
+
+def test_digest_resumes_after_checkpoint(session, people):
+    session.add(JobCheckpoint(name=DIGEST_JOB, run_date=TODAY, last_key=people[0].id, processed=1, completed=False))
+    session.commit()
+    stats = asyncio.run(run_birthday_digest(TODAY, 7, AsyncTestingSessionLocal))
+    assert stats["resumed_after"] == people[0].id
+    assert list(digests(session)) == ["digest2@example.com"]
+
+
+def test_next_birthday_leap_day():
+    assert next_birthday(date(2000, 2, 29), date(2027, 1, 1)) == date(2027, 2, 28)
+    assert next_birthday(date(2000, 2, 29), date(2028, 1, 1)) == date(2028, 2, 29)
+    assert next_birthday(date(1990, 1, 1), date(2026, 12, 28)) == date(2027, 1, 1)
@@ -0,0 +1,72 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from unittest.mock import AsyncMock
+
+from redis.exceptions import ConnectionError
+
+from src.database.models import User
+from src.services.cache import LRUCache, PrincipalCache
+from tests.conftest import FakeRedis
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_expires_entries(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a", now=float("inf")))
+        self.assertEqual(len(cache), 0)
+
+
+class TestPrincipalCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = PrincipalCache()
+        self.cache.client = FakeRedis()
+        self.user = User(id=1, username="deadpool", email="deadpool@example.com", avatar=None, confirmed=True)
+        self.loader = AsyncMock(return_value=self.user)
+
+    async def test_tiers(self):
+        principal = await self.cache.get_or_load(self.user.email, self.loader)
+        self.assertEqual((principal.id, principal.email), (1, self.user.email))
+        await self.cache.get_or_load(self.user.email, self.loader)
+        self.cache.local.clear()
+        await self.cache.get_or_load(self.user.email, self.loader)
+        self.loader.assert_awaited_once()
+        self.assertEqual((self.cache.misses, self.cache.local_hits, self.cache.redis_hits), (1, 1, 1))
+
+    async def test_invalidate(self):
+        await self.cache.get_or_load(self.user.email, self.loader)
+        await self.cache.invalidate(self.user.email)
+        self.assertEqual(len(self.cache.local), 0)
+        self.assertEqual(self.cache.client.published, [(PrincipalCache.CHANNEL, self.user.email)])
+        await self.cache.get_or_load(self.user.email, self.loader)
+        self.assertEqual(self.loader.await_count, 2)
+
+    async def test_unknown_user(self):
+        self.assertIsNone(await self.cache.get_or_load("nobody@example.com", AsyncMock(return_value=None)))
+        self.assertEqual(len(self.cache.local), 0)
+
+    async def test_redis_down(self):
+        self.cache.client = AsyncMock(get=AsyncMock(side_effect=ConnectionError), set=AsyncMock(side_effect=ConnectionError))
+        principal = await self.cache.get_or_load(self.user.email, self.loader)
+        self.assertEqual(principal.id, self.user.id)
+        self.assertEqual(self.cache.errors, 2)
+        await self.cache.get_or_load(self.user.email, self.loader)
+        self.loader.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
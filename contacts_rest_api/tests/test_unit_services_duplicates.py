@@ -0,0 +1,81 @@
+import random
+import time
+from collections import namedtuple
+
+from src.services.duplicates import UnionFind, blocking_keys, find_duplicate_groups
+from src.services.normalize import normalize_email, normalize_phone, phone_keys, soundex
+
+Row = namedtuple("Row", "id firstname lastname email phone")
+
+
+def test_normalize_email():
+    assert normalize_email(" John.Smith+work@GoogleMail.com ") == "johnsmith@gmail.com"
+    assert normalize_email("john.smith+work@ukr.net") == "john.smith@ukr.net"
+    assert normalize_email("not an email") is None
+    assert normalize_email(None) is None
+
+
+def test_normalize_phone():
+    expected = "+380671234567"
+    for phone in ("+380 67 123 4567", "0671234567", "(067) 123-45-67", "00380671234567", "380671234567",
+                  "671234567", "067 123 45 67 ext. 12"):
+        assert normalize_phone(phone) == expected, phone
+    assert normalize_phone("+1 (415) 555-0100") == "+14155550100"
+    assert normalize_phone("0671234567", country_code="48") == "+48671234567"
+    assert normalize_phone("12") is None
+    assert normalize_phone("") is None
+
+
+def test_soundex():
+    assert soundex("Robert") == soundex("Rupert") == "R163"
+    assert soundex("Ashcraft") == "A261"
+    assert soundex("Tymczak") == "T522"
+    assert soundex("Pfister") == "P236"
+    assert soundex("Lee") == "L000"
+    assert soundex("Kovalenko") == soundex("Kovalenco")
+    assert soundex("Шевченко") is None
+
+
+def test_union_find():
+    sets = UnionFind()
+    sets.union(1, 2)
+    sets.union(3, 4)
+    sets.union(2, 4)
+    assert len({sets.find(item) for item in (1, 2, 3, 4)}) == 1
+    assert sets.find(5) == 5
+
+
+def test_blocking_keys():
+    keys = blocking_keys(Row(1, "Olena", "Kovalenko", "Olena.K@gmail.com", "067 123 45 67"))
+    assert keys == [("email", "olenak@gmail.com"), ("phone", "+380671234567"), ("name", "K145o")]
+
+
+def test_find_duplicate_groups():
+    rows = [
+        Row(1, "Olena", "Kovalenko", "olena@ukr.net", "0671234567"),
+        Row(2, "Olena", "Kovalenco", "other@ukr.net", None),
+        Row(3, "Ivan", "Melnyk", "ivan@ukr.net", "+380 67 123 4567"),
+        Row(4, "Petro", "Moroz", "petro@ukr.net", "0501112233"),
+        Row(5, "Anna", "Smith", "OLENA+old@ukr.net", ""),
+    ]
+    groups = find_duplicate_groups(rows, max_block_size=10)
+    assert groups == [{"ids": [1, 2, 3, 5], "reasons": ["email", "name", "phone"]}]
+    # blocks over the limit are ignored
+    assert find_duplicate_groups(rows[:2], max_block_size=1) == []
+
+
+def test_find_duplicate_groups_scales_linearly():
+    rng = random.Random(1)
+    rows = [Row(i, rng.choice("ABCDEFGH") + str(i), f"Name{rng.randrange(10 ** 6)}", f"user{i}@example.com",
+                f"+38067{i:07d}") for i in range(100000)]
+    rows += [Row(100000 + i, "X", f"Dup{i}", f"USER{i}@example.com", None) for i in range(0, 100000, 1000)]
+    start = time.perf_counter()
+    groups = find_duplicate_groups(rows, max_block_size=50)
+    assert time.perf_counter() - start < 10
+    assert {tuple(group["ids"]) for group in groups} >= {(0, 100000), (1000, 101000)}
+
+
+def test_phone_keys():
+    assert phone_keys("067 123 45 67") == ("+380671234567", "765432176083")
+    assert phone_keys("ext 12") == (None, "21")
+    assert phone_keys(None) == (None, None)
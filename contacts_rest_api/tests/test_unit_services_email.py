@@ -0,0 +1,122 @@
+import asyncio
+import json
+import socket
+from datetime import datetime, timedelta
+from email import message_from_bytes
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from src.database.models import EmailOutbox
+from src.services.email import OutboxWorker, backoff_delay
+from tests.conftest import AsyncTestingSessionLocal
+
+
+class Inbox:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(message_from_bytes(envelope.content))
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    for name, value in {"mail_server": "127.0.0.1", "mail_port": controller.port, "mail_ssl_tls": False,
+                        "mail_starttls": False, "mail_use_credentials": False}.items():
+        monkeypatch.setattr(f"src.services.email.settings.{name}", value)
+    yield inbox
+    controller.stop()
+
+
+@pytest.fixture
+def outbox(session):
+    session.query(EmailOutbox).delete()
+    session.commit()
+    yield session
+    session.query(EmailOutbox).delete()
+    session.commit()
+
+
+def queue(session, count, template="email_template.html"):
+    rows = [
+        EmailOutbox(template=template, subject="Confirm your email ", recipient=f"user{i}@example.com",
+                    context=json.dumps({"host": "http://testserver/", "username": f"user{i}"}),
+                    status="pending", attempts=0, next_attempt_at=datetime.utcnow() - timedelta(seconds=1))
+        for i in range(count)
+    ]
+    session.add_all(rows)
+    session.commit()
+    return rows
+
+
+def test_worker_sends_batch_over_one_connection(outbox, smtp_server):
+    queue(outbox, 3)
+    worker = OutboxWorker(session_factory=AsyncTestingSessionLocal, batch_size=10)
+    assert asyncio.run(worker.run_once()) == 3
+    assert len(smtp_server.messages) == 3
+    assert len(smtp_server.sessions) == 1
+    body = smtp_server.messages[0].get_payload(decode=True).decode()
+    assert "http://testserver/api/auth/confirmed_email/" in body
+    outbox.expire_all()
+    assert {row.status for row in outbox.query(EmailOutbox)} == {"sent"}
+    assert asyncio.run(worker.run_once()) == 0
+
+
+def test_worker_keeps_batch_when_a_message_is_broken(outbox, smtp_server):
+    good = queue(outbox, 2)
+    (missing,) = queue(outbox, 1, template="missing.html")
+    (broken,) = queue(outbox, 1)
+    broken.context = "{broken"
+    outbox.commit()
+    worker = OutboxWorker(session_factory=AsyncTestingSessionLocal, batch_size=10)
+    assert asyncio.run(worker.run_once()) == 4
+    assert asyncio.run(worker.run_once()) == 0
+    assert len(smtp_server.messages) == 2
+    for row in good:
+        outbox.refresh(row)
+        assert row.status == "sent"
+    for row in (missing, broken):
+        outbox.refresh(row)
+        assert (row.status, row.attempts) == ("pending", 1)
+        assert row.last_error
+
+
+def test_worker_retries_with_backoff(outbox, monkeypatch):
+    monkeypatch.setattr("src.services.email.settings.mail_server", "127.0.0.1")
+    monkeypatch.setattr("src.services.email.settings.mail_port", free_port())
+    monkeypatch.setattr("src.services.email.settings.mail_ssl_tls", False)
+    monkeypatch.setattr("src.services.email.settings.outbox_max_attempts", 2)
+    (row,) = queue(outbox, 1)
+    worker = OutboxWorker(session_factory=AsyncTestingSessionLocal)
+    started = datetime.utcnow()
+    assert asyncio.run(worker.run_once()) == 1
+    outbox.refresh(row)
+    assert (row.status, row.attempts) == ("pending", 1)
+    assert row.next_attempt_at >= started + timedelta(seconds=backoff_delay(1))
+    assert asyncio.run(worker.run_once()) == 0
+
+    row.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    outbox.commit()
+    asyncio.run(worker.run_once())
+    outbox.refresh(row)
+    assert (row.status, row.attempts) == ("failed", 2)
+    assert row.last_error
+
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr("src.services.email.settings.outbox_backoff_base", 10)
+    monkeypatch.setattr("src.services.email.settings.outbox_backoff_max", 60)
+    assert [backoff_delay(attempt) for attempt in (1, 2, 3, 4)] == [10, 20, 40, 60]
@@ -0,0 +1,67 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import threading
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException
+
+from src.services.passwords import MIN_BCRYPT_ROUNDS, PasswordHasher, build_context, calibrate_rounds
+
+
+class TestPasswordHasher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.hasher = PasswordHasher()
+        self.settings = patch.multiple("src.services.passwords.settings", password_hash_workers=1,
+                                       password_hash_max_queue=1, password_hash_executor="thread")
+        self.settings.start()
+
+    def tearDown(self):
+        self.hasher.shutdown()
+        self.settings.stop()
+
+    async def test_hash_and_verify(self):
+        hashed = await self.hasher.hash("secret")
+        self.assertTrue(await self.hasher.verify("secret", hashed))
+        self.assertFalse(await self.hasher.verify("wrong", hashed))
+        self.assertEqual(self.hasher.stats()["completed"], 3)
+
+    async def test_off_loop(self):
+        loop_thread = threading.get_ident()
+        worker_thread = await self.hasher.run(threading.get_ident)
+        self.assertNotEqual(worker_thread, loop_thread)
+
+    async def test_queue_full(self):
+        release = threading.Event()
+        running = asyncio.ensure_future(self.hasher.run(release.wait))
+        waiting = asyncio.ensure_future(self.hasher.run(release.wait))
+        await asyncio.sleep(0)
+        self.assertEqual((self.hasher.running, self.hasher.queued), (1, 1))
+        with self.assertRaises(HTTPException) as error:
+            await self.hasher.run(release.wait)
+        self.assertEqual(error.exception.status_code, 503)
+        self.assertEqual(self.hasher.rejected, 1)
+        release.set()
+        await asyncio.gather(running, waiting)
+        self.assertEqual(self.hasher.in_flight, 0)
+
+
+class TestCalibration(unittest.TestCase):
+    def test_needs_update_on_other_cost(self):
+        context = build_context(5)
+        self.assertTrue(context.needs_update(build_context(4).hash("secret")))
+        self.assertTrue(context.needs_update(build_context(6).hash("secret")))
+        self.assertFalse(context.needs_update(context.hash("secret")))
+
+    def test_budget_below_minimum(self):
+        chosen, timings = calibrate_rounds(budget_ms=0.001, samples=1)
+        self.assertEqual(chosen, MIN_BCRYPT_ROUNDS)
+        self.assertEqual(list(timings), [MIN_BCRYPT_ROUNDS])
+
+
+if __name__ == '__main__':
+    unittest.main()
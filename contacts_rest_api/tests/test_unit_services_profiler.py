@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from src.services.profiler import (ProfiledRedis, RequestProfile, current_profile, finish_profile, start_profile,
+                                   statement_shape)
+
+
+def test_statement_shape():
+    assert statement_shape("SELECT *\n  FROM contacts WHERE id IN (?, ?, ?)") == \
+        statement_shape("SELECT * FROM contacts WHERE id IN (?, ?)") == "SELECT * FROM contacts WHERE id IN (...)"
+    assert statement_shape("SELECT * FROM t WHERE id IN ($1, $2)") == "SELECT * FROM t WHERE id IN (...)"
+    assert statement_shape("SELECT * FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == "SELECT * FROM t WHERE id IN (...)"
+
+
+def test_engine_events_record_queries(monkeypatch, caplog):
+    monkeypatch.setattr("src.services.profiler.settings.profiler_sample_rate", 1.0)
+    engine = create_engine("sqlite://")
+    profile, token = start_profile()
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE tags (id INTEGER, note_id INTEGER)"))
+        for note_id in range(6):
+            connection.execute(text("SELECT id FROM tags WHERE note_id = :note_id"), {"note_id": note_id})
+    with caplog.at_level(logging.WARNING, logger="src.services.profiler"):
+        header = finish_profile(profile, token, "GET /api/notes", 0.05)
+    assert current_profile.get() is None
+    assert profile.queries == 7
+    assert profile.repeated() == [("SELECT id FROM tags WHERE note_id = ?", 6)]
+    assert header.startswith("app;dur=50.00, db;dur=")
+    assert 'desc="7 queries"' in header
+    assert 'n-plus-one;desc="1 statements repeated up to 6 times"' in header
+    assert "possible N+1 in GET /api/notes" in caplog.text
+
+
+def test_failed_statement_leaves_no_start_behind(monkeypatch):
+    monkeypatch.setattr("src.services.profiler.settings.profiler_sample_rate", 1.0)
+    engine = create_engine("sqlite://")
+    profile, token = start_profile()
+    with engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT id FROM missing"))
+        assert connection.info.get("profiler_start") == []
+        connection.execute(text("SELECT 1"))
+    finish_profile(profile, token, "GET /api/notes", 0.05)
+    assert profile.queries == 2
+
+
+def test_not_sampled(monkeypatch):
+    monkeypatch.setattr("src.services.profiler.settings.profiler_sample_rate", 0.0)
+    engine = create_engine("sqlite://")
+    profile, token = start_profile()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    assert profile is None
+    assert finish_profile(profile, token, "GET /", 0.001) == "app;dur=1.00"
+
+
+def test_redis_commands_are_timed():
+    client = ProfiledRedis()
+    profile = RequestProfile()
+    token = current_profile.set(profile)
+    try:
+        with patch("redis.asyncio.Redis.execute_command", AsyncMock(return_value=b"1")):
+            assert asyncio.run(client.get("key")) == b"1"
+    finally:
+        current_profile.reset(token)
+    assert profile.redis_calls == 1
+    assert profile.redis_time > 0
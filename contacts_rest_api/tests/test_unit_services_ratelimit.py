@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from src.services.ratelimit import RateLimiter, RatePolicy
+from tests.conftest import FakeRedis
+
+
+@pytest.fixture
+def policies(monkeypatch):
+    monkeypatch.setattr("src.services.ratelimit.settings.rate_limits", {"r": "10/60/user", "login": "3/60/ip"})
+    monkeypatch.setattr("src.services.ratelimit.settings.rate_limit_sync_batch", 4)
+
+
+def worker(redis):
+    limiter = RateLimiter()
+    limiter.client = redis
+    return limiter
+
+
+def test_parse_policy():
+    assert RatePolicy.parse("10/60/user") == RatePolicy(10, 60, "user")
+    assert RatePolicy.parse("5/1") == RatePolicy(5, 1, "ip")
+    for spec in ("0/60", "10/60/session", "ten/60"):
+        with pytest.raises(ValueError):
+            RatePolicy.parse(spec)
+
+
+def test_local_bucket_refills(policies):
+    limiter = worker(FakeRedis())
+
+    async def scenario():
+        allowed = [await limiter.hit("login", "ip:1", now=1200.0) for _ in range(4)]
+        # 3 per minute refill one token every 20 seconds
+        return allowed, await limiter.hit("login", "ip:1", now=1210.0), await limiter.hit("login", "ip:1", now=1221.0)
+
+    allowed, early, later = asyncio.run(scenario())
+    assert allowed[:3] == [0, 0, 0]
+    assert allowed[3] == pytest.approx(20.0)
+    assert early == pytest.approx(10.0)
+    assert later == 0
+    assert limiter.stats()["rejected"] == {"login": 2}
+    assert limiter.stats()["allowed"] == {"login": 4}
+
+
+def test_unlisted_route_is_not_limited(policies):
+    limiter = worker(FakeRedis())
+    assert asyncio.run(limiter.hit("other", "ip:1")) == 0
+    assert limiter.stats()["buckets"] == 0
+
+
+def test_workers_share_the_limit_through_redis(policies):
+    redis = FakeRedis()
+    first, second = worker(redis), worker(redis)
+
+    async def scenario():
+        # the first worker reports after a batch of 4, the second sees the total on its own next sync
+        for _ in range(8):
+            assert await first.hit("r", "user:a", now=1200.0) == 0
+        assert await second.hit("r", "user:a", now=1200.0) == 0
+        await second.sync(now=1200.0)
+        return [await second.hit("r", "user:a", now=1201.0) for _ in range(2)]
+
+    results = asyncio.run(scenario())
+    assert redis.data["ratelimit:r:user:a:20"] == b"9"
+    # 8 requests of the first worker leave one token to the second, refilled at one per 6 seconds
+    assert results[0] == 0
+    assert results[1] == pytest.approx(5.0)
+
+
+def test_sync_is_batched(policies):
+    redis = FakeRedis()
+    limiter = worker(redis)
+
+    async def scenario():
+        for _ in range(3):
+            await limiter.hit("r", "user:a", now=1200.0)
+        before = dict(redis.data)
+        await limiter.hit("r", "user:a", now=1200.0)
+        return before
+
+    assert asyncio.run(scenario()) == {}
+    assert redis.data == {"ratelimit:r:user:a:20": b"4"}
+
+
+class SlowRedis(FakeRedis):
+    def __init__(self):
+        super().__init__()
+        self.release = None
+
+    async def incrby(self, key, amount):
+        await self.release.wait()
+        return await super().incrby(key, amount)
+
+
+def test_requests_during_a_sync_are_reported_once(policies):
+    redis = SlowRedis()
+    limiter = worker(redis)
+
+    async def scenario():
+        redis.release = asyncio.Event()
+        for _ in range(3):
+            await limiter.hit("r", "user:a", now=1200.0)
+        # the fourth request starts a sync that waits on Redis while three more are let through
+        syncing = asyncio.create_task(limiter.hit("r", "user:a", now=1200.0))
+        await asyncio.sleep(0)
+        during = [await limiter.hit("r", "user:a", now=1200.0) for _ in range(3)]
+        redis.release.set()
+        await syncing
+        bucket = limiter.buckets.get("r:user:a")
+        reported = redis.data["ratelimit:r:user:a:20"]
+        await limiter.sync(now=1200.0)
+        return during, bucket, reported
+
+    during, bucket, reported = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert during == [0, 0, 0]
+    assert reported == b"4"
+    assert redis.data["ratelimit:r:user:a:20"] == b"7"
+    assert (bucket.pending, bucket.seen, bucket.syncing) == (0, 7, False)
+    # no other worker used any: 10 tokens less the 7 requests
+    assert bucket.tokens == pytest.approx(3.0)
+
+
+class BrokenRedis(FakeRedis):
+    async def incrby(self, key, amount):
+        raise ConnectionError("redis is down")
+
+
+def test_falls_back_to_local_limits(policies):
+    limiter = worker(BrokenRedis())
+
+    async def scenario():
+        return [await limiter.hit("r", "user:a", now=1200.0) for _ in range(11)]
+
+    results = asyncio.run(scenario())
+    assert results[:10] == [0] * 10
+    assert results[10] > 0
+    assert limiter.sync_errors == 1
+    assert limiter.degraded_until == 1200.0 + 5.0
@@ -22,7 +22,7 @@ class Note(Base):
     created_at = Column('created_at', DateTime, default=func.now())
     description = Column(String(150), nullable=False)
     done = Column(Boolean, default=False)
-    tags = relationship("Tag", secondary=note_m2m_tag, backref="notes")
+    tags = relationship("Tag", secondary=note_m2m_tag, backref="notes", lazy="selectin")
 
 
 class Tag(Base):
@@ -1,52 +1,52 @@
 from typing import List
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Note, Tag
 from src.schemas import NoteModel, NoteUpdate, NoteStatusUpdate
 
 
-async def get_notes(skip: int, limit: int, db: Session) -> List[Note]:
-    return db.query(Note).offset(skip).limit(limit).all()
+async def get_notes(skip: int, limit: int, db: AsyncSession) -> List[Note]:
+    return (await db.execute(select(Note).offset(skip).limit(limit))).scalars().all()
 
 
-async def get_note(note_id: int, db: Session) -> Note:
-    return db.query(Note).filter(Note.id == note_id).first()
+async def get_note(note_id: int, db: AsyncSession) -> Note:
+    return (await db.execute(select(Note).filter(Note.id == note_id))).scalars().first()
 
 
-async def create_note(body: NoteModel, db: Session) -> Note:
-    tags = db.query(Tag).filter(Tag.id.in_(body.tags)).all()
+async def create_note(body: NoteModel, db: AsyncSession) -> Note:
+    tags = (await db.execute(select(Tag).filter(Tag.id.in_(body.tags)))).scalars().all()
     note = Note(title=body.title, description=body.description, tags=tags)
     db.add(note)
-    db.commit()
-    db.refresh(note)
+    await db.commit()
+    await db.refresh(note)
     return note
 
 
-async def remove_note(note_id: int, db: Session) -> Note | None:
-    note = db.query(Note).filter(Note.id == note_id).first()
+async def remove_note(note_id: int, db: AsyncSession) -> Note | None:
+    note = await get_note(note_id, db)
     if note:
-        db.delete(note)
-        db.commit()
+        await db.delete(note)
+        await db.commit()
     return note
 
 
-async def update_note(note_id: int, body: NoteUpdate, db: Session) -> Note | None:
-    note = db.query(Note).filter(Note.id == note_id).first()
+async def update_note(note_id: int, body: NoteUpdate, db: AsyncSession) -> Note | None:
+    note = await get_note(note_id, db)
     if note:
-        tags = db.query(Tag).filter(Tag.id.in_(body.tags)).all()
+        tags = (await db.execute(select(Tag).filter(Tag.id.in_(body.tags)))).scalars().all()
         note.title = body.title
         note.description = body.description
         note.done = body.done
         note.tags = tags
-        db.commit()
+        await db.commit()
     return note
 
 
-async def update_status_note(note_id: int, body: NoteStatusUpdate, db: Session) -> Note | None:
-    note = db.query(Note).filter(Note.id == note_id).first()
+async def update_status_note(note_id: int, body: NoteStatusUpdate, db: AsyncSession) -> Note | None:
+    note = await get_note(note_id, db)
     if note:
         note.done = body.done
-        db.commit()
+        await db.commit()
     return note
-    
\ No newline at end of file
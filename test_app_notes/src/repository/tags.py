@@ -1,39 +1,39 @@
 from typing import List
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Tag
 from src.schemas import TagModel
 
 
-async def get_tags(skip: int, limit: int, db: Session) -> List[Tag]:
-    return db.query(Tag).offset(skip).limit(limit).all()
+async def get_tags(skip: int, limit: int, db: AsyncSession) -> List[Tag]:
+    return (await db.execute(select(Tag).offset(skip).limit(limit))).scalars().all()
 
 
-async def get_tag(tag_id: int, db: Session) -> Tag:
-    return db.query(Tag).filter(Tag.id == tag_id).first()
+async def get_tag(tag_id: int, db: AsyncSession) -> Tag:
+    return (await db.execute(select(Tag).filter(Tag.id == tag_id))).scalars().first()
 
 
-async def create_tag(body: TagModel, db: Session) -> Tag:
+async def create_tag(body: TagModel, db: AsyncSession) -> Tag:
     tag = Tag(name=body.name)
     db.add(tag)
-    db.commit()
-    db.refresh(tag)
+    await db.commit()
+    await db.refresh(tag)
     return tag
 
 
-async def update_tag(tag_id: int, body: TagModel, db: Session) -> Tag | None:
-    tag = db.query(Tag).filter(Tag.id == tag_id).first()
+async def update_tag(tag_id: int, body: TagModel, db: AsyncSession) -> Tag | None:
+    tag = await get_tag(tag_id, db)
     if tag:
-        tag .name = body.name
-        db.commit()
+        tag.name = body.name
+        await db.commit()
     return tag
 
 
-async def remove_tag(tag_id: int, db: Session)  -> Tag | None:
-    tag = db.query(Tag).filter(Tag.id == tag_id).first()
+async def remove_tag(tag_id: int, db: AsyncSession) -> Tag | None:
+    tag = await get_tag(tag_id, db)
     if tag:
-        db.delete(tag)
-        db.commit()
+        await db.delete(tag)
+        await db.commit()
     return tag
-    
\ No newline at end of file
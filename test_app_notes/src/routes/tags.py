@@ -1,7 +1,7 @@
 from typing import List
 
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.schemas import TagModel, TagResponse
@@ -11,13 +11,13 @@ router = APIRouter(prefix='/tags', tags=["tags"])
 
 
 @router.get("/", response_model=List[TagResponse])
-async def read_tags(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def read_tags(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     tags = await repository_tags.get_tags(skip, limit, db)
     return tags
 
 
 @router.get("/{tag_id}", response_model=TagResponse)
-async def read_tag(tag_id: int, db: Session = Depends(get_db)):
+async def read_tag(tag_id: int, db: AsyncSession = Depends(get_db)):
     tag = await repository_tags.get_tag(tag_id, db)
     if tag is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tag not found")
@@ -25,12 +25,12 @@ async def read_tag(tag_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/", response_model=TagResponse)
-async def create_tag(body: TagModel, db: Session = Depends(get_db)):
+async def create_tag(body: TagModel, db: AsyncSession = Depends(get_db)):
     return await repository_tags.create_tag(body, db)
 
 
 @router.put("/{tag_id}", response_model=TagResponse)
-async def update_tag(body: TagModel, tag_id: int, db: Session = Depends(get_db)):
+async def update_tag(body: TagModel, tag_id: int, db: AsyncSession = Depends(get_db)):
     tag = await repository_tags.update_tag(tag_id, body, db)
     if tag is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tag not found")
@@ -38,7 +38,7 @@ async def update_tag(body: TagModel, tag_id: int, db: Session = Depends(get_db))
 
 
 @router.delete("/{tag_id}", response_model=TagResponse)
-async def remove_tag(tag_id: int, db: Session = Depends(get_db)):
+async def remove_tag(tag_id: int, db: AsyncSession = Depends(get_db)):
     tag = await repository_tags.remove_tag(tag_id, db)
     if tag is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tag not found")